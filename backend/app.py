@@ -1,13 +1,30 @@
-from flask import Flask, Response, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, abort, g
 import cv2
 import numpy as np
-from ultralytics import YOLO
+from pipeline import FramePipeline
+from frame_sources import CameraManager
+from motion import MotionGate
+from roi import parse_roi, crop_to_roi, roi_pixels, roi_image_size, to_frame_coords
+from cart_store import CartStore, DEFAULT_CART_ID, empty_snapshot, empty_state
+from cart_log import CartLog
+from batching import BatchScheduler, QueueFull
+from postprocess import ClassLookup, filter_detections, CONF
+from inference import load_detector, default_model_path
+from inference_pool import InferencePool
+from config import load_config, save_config, IS_MAC
+from tracking import ProductTracker, states_to_boxes
+from fusion import ViewFusion
+from metrics import Registry
+from search import SearchIndex
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import nullcontext
+from functools import partial
 import json
 import time
 import re
 import threading
 import os
-import platform
+import atexit
 import logging
 try:
     import psutil
@@ -19,25 +36,31 @@ except ImportError:
 template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../frontend/templates"))
 static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../frontend/static"))
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
+# The legacy cart routes (/cart, /events, ...) fill in cart_id=DEFAULT_CART_ID; without this
+# /carts/default/... would be answered with a 308 to them, an extra round trip per request
+app.url_map.redirect_defaults = False
 
 
-# Load YOLOv11 model
-try:
-    model_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "yolo", "best.pt")
-    print(f"Attempting To Load Model From: {model_path}")
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"YOLO Model Not Found At {model_path}")
-    model = YOLO(model_path)
-    # Set device for YOLO (if supported)
-    try:
-        model.to(YOLO_DEVICE)
-        print(f"YOLO Model loaded on device: {YOLO_DEVICE}")
-    except Exception as e:
-        print(f"Could not set YOLO device: {e}")
-    print("YOLO Model Loaded successfully")
-except Exception as e:
-    print(f"Error Loading YOLO Model: {e}")
-    raise
+# Settings: defaults, backend/config.json, then SMART_TROLLEY_* environment variables
+config = load_config()
+
+# Prometheus metrics served by /metrics; pipeline, camera and process values
+# are read at scrape time by the collectors registered further down
+metrics = Registry()
+metrics.histogram("http_request_duration_seconds", "Time to build the response per endpoint (streams: until the stream starts).")
+metrics.counter("http_requests_total", "HTTP requests by endpoint, method and status.")
+metrics.counter("cart_operations_total", "Cart changes by operation (detections included).")
+
+# YOLOv11 model, loaded by load_model() once the HTTP server is already up.
+# config["inference_backend"] picks PyTorch (best.pt) or an optimized CPU export
+# made by yolo/export_model.py (onnx, openvino)
+INFERENCE_BACKEND = config["inference_backend"]
+yolo_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "yolo")
+model_path = config["model_path"] or default_model_path(INFERENCE_BACKEND, yolo_dir)
+model = None
+class_lookup = None
+model_ready = threading.Event()
+startup_state = {"model": "loading", "error": None, "started_at": time.time(), "ready_at": None}
 
 # Load products.json
 try:
@@ -49,71 +72,66 @@ except Exception as e:
     print(f"Error Loading products.json: {e}")
     raise
 
-# Cart state
-cart = []
-# Prompt queue for duplicate detections
-prompt_queue = []
-
-# Webcam capture
-camera = None
-def init_camera(max_retries=3, retry_delay=0.3):
-    global camera
-    for attempt in range(max_retries):
-        for cam_index in [0, 1]:  # Try both index 0 and 1
-            try:
-                if camera is not None:
-                    logging.info(f"Releasing camera before re-init (attempt {attempt+1}, index {cam_index})")
-                    camera.release()
-                logging.info(f"Trying to initialize camera at index {cam_index} (attempt {attempt+1})")
-                camera = cv2.VideoCapture(cam_index)
-                if camera.isOpened():
-                    logging.info(f"Camera initialized successfully at index {cam_index}, attempt {attempt+1}")
-                    import time as _time
-                    _time.sleep(0.5)
-                    for i in range(5):
-                        ret, frame = camera.read()
-                        if ret and frame is not None:
-                            logging.info(f"First frame read successfully after {i+1} tries at index {cam_index}")
-                            return True
-                        _time.sleep(0.2)
-                    logging.warning(f"Failed to read first frame after camera initialization at index {cam_index}")
-                    camera.release()
-                    camera = None
-                    continue
-                else:
-                    logging.warning(f"Camera not opened at index {cam_index}")
-            except Exception as e:
-                logging.error(f"Error Initializing Webcam (Attempt {attempt + 1}/{max_retries}, index {cam_index}): {e}")
-        if attempt < max_retries - 1:
-            time.sleep(retry_delay)
-    logging.error("Failed To Initialize Webcam After All Retries (all indices)")
-    camera = None
-    return False
-
-# Initialize camera on startup
-init_camera()
-
-# Camera control
-camera_active = False
-frame_buffer = None
-buffer_lock = threading.Lock()
-last_detection_time = 0
-debounce_interval = 5  # seconds
-frame_count = 0
-processing_thread = None
-# Platform-specific performance tuning
-IS_MAC = platform.system() == 'Darwin'
+# Autocomplete index over the product names, rebuilt when products.json changes
+search_index = SearchIndex(products)
+SEARCH_LIMIT = 20
+CATALOG_CHECK_SECONDS = 5
+catalog_state = {"mtime": os.path.getmtime(products_path), "checked_at": time.time()}
+catalog_lock = threading.Lock()
+
+def refresh_catalog():
+    """Reload products.json and rebuild the search index if the file changed (checked every few seconds)."""
+    if time.time() - catalog_state["checked_at"] < CATALOG_CHECK_SECONDS:
+        return
+    with catalog_lock:
+        if time.time() - catalog_state["checked_at"] < CATALOG_CHECK_SECONDS:
+            return
+        catalog_state["checked_at"] = time.time()
+        try:
+            mtime = os.path.getmtime(products_path)
+            if mtime == catalog_state["mtime"]:
+                return
+            with open(products_path, "r") as f:
+                catalog = json.load(f)
+        except Exception as e:
+            print(f"Error reloading products.json, keeping the current catalog: {e}")
+            return
+        # Removed products stay resolvable for carts and detections; only the current ones are searchable
+        products.update(catalog)
+        search_index.rebuild(catalog)
+        catalog_state["mtime"] = mtime
+        print(f"Product catalog reloaded: {len(catalog)} products")
+
+CART_ETAG_PREFIX = f"{int(startup_state['started_at'] * 1000):x}"
+# Cart state, one cart per trolley id. Carts survive restarts: every change
+# goes to a write-ahead log under cart_dir (group-committed, see cart_log.py)
+# unless cart_durability is "off"
+if config["cart_durability"] == "off":
+    cart_log = None
+else:
+    cart_dir = config["cart_dir"] or os.path.join(os.path.dirname(base_dir), "data", "carts")
+    cart_log = CartLog(cart_dir, durability=config["cart_durability"])
+    atexit.register(cart_log.close)
+cart_store = CartStore(log=cart_log)
+# Trolley whose cart receives the detections from this process' camera
+CAMERA_CART_ID = config["trolley_id"] or DEFAULT_CART_ID
+# Server-sent events: client reconnect delay and idle keepalive interval
+SSE_RETRY_MS = 2000
+SSE_KEEPALIVE_SECONDS = 15
+
+# Cameras of this trolley: the "cameras" list of config.json, or one camera
+# from the source and roi settings (see CameraView below)
+camera_specs = config["cameras"] or [{"source": config["source"], "roi": config["roi"]}]
+
+# Platform-specific performance tuning (defaults in config.py)
 if IS_MAC:
     print("Optimizing for Mac: High FPS, GPU, no frame skip")
-    CONFIG_FPS = 30
-    frame_skip = 1
-    YOLO_DEVICE = 'mps'  # Metal Performance Shaders (Apple GPU)
     TIMEOUT_SECONDS = 60 * 60 * 24  # 24 hours
 else:
-    CONFIG_FPS = 4
-    frame_skip = 3
-    YOLO_DEVICE = 'cpu'
     TIMEOUT_SECONDS = 60  # 60 seconds for safety on Lenovo
+CONFIG_FPS = config["fps"]
+frame_skip = config["frame_skip"]
+YOLO_DEVICE = config["device"]
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
@@ -171,222 +189,256 @@ def normalize_class_name(class_name):
     print(f"Misidentified Product: {class_name} (Not In products.json)")
     return None
 
-def process_frame(frame):
-    global frame_buffer, buffer_lock
+DETECTION_CONF = config["conf"]
+IMAGE_SIZE = config["imgsz"]
+WARMUP_IMAGE_SIZE = 512
+
+def load_model():
+    """Load the YOLO model, resolve its classes and run one warm-up inference."""
+    global model, class_lookup
+    print(f"Attempting To Load {INFERENCE_BACKEND} Model From: {model_path}")
+    # Several cameras get a worker each by default, so they don't take turns on one model
+    workers = config["inference_workers"]
+    if workers is None:
+        workers = len(views) if len(views) > 1 else 0
+    if workers:
+        # Worker processes, each with its own copy of the model (see inference_pool.py)
+        loaded = InferencePool(INFERENCE_BACKEND, model_path, YOLO_DEVICE, IMAGE_SIZE, DETECTION_CONF,
+                               lean=config["lean_inference"], workers=workers)
+        atexit.register(loaded.close)
+    else:
+        loaded = load_detector(INFERENCE_BACKEND, model_path, YOLO_DEVICE, IMAGE_SIZE, DETECTION_CONF,
+                               lean=config["lean_inference"])
+    # Every model class resolved to its product once, instead of per box and frame
+    lookup = ClassLookup(loaded.names, normalize_class_name)
+    # The first inference allocates buffers and picks kernels; pay for it before the first real frame
+    start_time = time.time()
+    loaded.predict([np.zeros((WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)])
+    print(f"Warm-up inference took {time.time() - start_time:.2f}s")
+    model, class_lookup = loaded, lookup
+    model_ready.set()
+    print("YOLO Model Loaded successfully")
+
+# The YOLO predictor is not thread safe; the camera pipelines and /detect share it
+# (an inference pool is, and runs their frames in parallel)
+model_lock = threading.Lock()
+
+def model_guard():
+    return nullcontext() if getattr(model, "thread_safe", False) else model_lock
+
+def process_frame(frame, view=None):
+    """
+    Run YOLO on the camera ROI of one frame of `view` (default: the first
+    camera); returns the (N, 6) detection array in full-frame coordinates or
+    None on failure.
+    """
+    view = view or views[0]
+    if model is None:
+        return None
+    if frame is None or frame.size == 0:
+        print("Invalid frame, skipping YOLO processing")
+        return None
     try:
-        if frame is None or frame.size == 0:
-            print("Invalid frame, skipping YOLO processing")
-            return
         start_time = time.time()
-        results = model(frame, conf=0.5, imgsz=512, batch=1, verbose=False)
-        if CPU_MONITORING:
-            cpu_percent = psutil.cpu_percent()
-            print(f"CPU usage during inference: {cpu_percent}%")
-        with buffer_lock:
-            frame_buffer = (results, frame)
-        detections = [(r.names[int(box.cls)], float(box.conf)) for r in results for box in r.boxes]
-        print(f"YOLO results: {detections if detections else 'No detections'}, inference time: {time.time() - start_time:.2f}s")
+        region, offset = crop_to_roi(frame, view.roi)
+        imgsz = roi_image_size(region.shape, frame.shape, IMAGE_SIZE)
+        with model_guard():
+            dets = to_frame_coords(model.predict([region], imgsz=imgsz)[0], offset)
+        print(f"YOLO results: {len(dets)} detection(s), inference time: {time.time() - start_time:.2f}s")
+        return dets
     except Exception as e:
         print(f"YOLO inference error: {e}")
-        with buffer_lock:
-            frame_buffer = (None, frame)
+        return None
+
+def detections_to_products(dets):
+    """Normalized products found in one image's detection array."""
+    dets, cls_ids, _ = filter_detections(dets, class_lookup, DETECTION_CONF)
+    boxes = dets[:, :4].astype(int).tolist()
+    return [{
+        "name": product_name,
+        "class_name": class_name,
+        "confidence": round(conf, 4),
+        "bbox": box,
+        "price": products[product_name]['price']
+    } for product_name, class_name, conf, box in zip(
+        class_lookup.products[cls_ids], class_lookup.class_names[cls_ids], dets[:, CONF].tolist(), boxes)]
 
-def generate_frames():
-    global camera_active, frame_buffer, camera, last_detection_time, frame_count, processing_thread, camera_ready
-    last_detected = {}
-    no_detection_start = None
+def detect_batch(frames):
     start_time = time.time()
-    frame_interval = 1.0 / CONFIG_FPS
-    camera_lock = threading.Lock()
-    
-    # Check if camera is ready before starting
-    if not camera_ready:
-        logging.warning("Camera not ready, returning empty frames")
-        while True:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + b'' + b'\r\n')
-            time.sleep(0.1)
-    
-    while True:
-        frame_start = time.time()
-        try:
-            with camera_lock:
-                if not camera_active or not camera or not camera.isOpened() or not camera_ready:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + b'' + b'\r\n')
-                    time.sleep(0.1)
-                    continue
-                
-                # Safety check for camera object
-                if camera is None:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + b'' + b'\r\n')
-                    time.sleep(0.1)
-                    continue
-                
-                ret, frame = camera.read()
-                if not ret or frame is None:
-                    logging.warning("Failed to read frame from camera")
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + b'' + b'\r\n')
-                    time.sleep(0.1)
-                    continue
-        except Exception as e:
-            logging.error(f"Camera read error: {e}")
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + b'' + b'\r\n')
-            time.sleep(0.1)
-            continue
-            
-        frame_count += 1
-        if frame_count % frame_skip == 0:
-            if processing_thread is None or not processing_thread.is_alive():
-                def process_and_log(frame):
-                    t0 = time.time()
-                    process_frame(frame)
-                    t1 = time.time()
-                    logging.info(f"Frame processed in {t1-t0:.3f}s")
-                processing_thread = threading.Thread(target=process_and_log, args=(frame,))
-                processing_thread.start()
-            else:
-                logging.info("Previous processing thread still running, skipping inference")
-        
-        with buffer_lock:
-            if frame_buffer is None:
-                ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-                if not ret:
-                    logging.error("Failed to encode frame")
-                    continue
-                frame = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-                continue
-            results, processed_frame = frame_buffer
-        
-        if results is None:
-            ret, buffer = cv2.imencode('.jpg', processed_frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-            if not ret:
-                logging.error("Failed to encode frame")
-                continue
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-            continue
-        
-        detected = False
-        current_time = time.time()
-        if current_time - last_detection_time < debounce_interval:
-            ret, buffer = cv2.imencode('.jpg', processed_frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-            if not ret:
-                logging.error("Failed to encode frame")
-                continue
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-            continue
-        
-        for r in results:
-            boxes = r.boxes
-            for box in boxes:
-                cls_name = r.names[int(box.cls)]
-                conf = float(box.conf)
-                product_name = normalize_class_name(cls_name)
-                if not product_name or product_name not in products:
-                    print(f"Invalid product detected: {cls_name} (conf={conf})")
-                    continue
-                detected = True
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                
-                label = f"{product_name} ({conf:.2f})"
-                cv2.rectangle(processed_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(processed_frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                
-                if cls_name in last_detected and current_time - last_detected[cls_name] < 2:
-                    continue
-                last_detected[cls_name] = current_time
-                last_detection_time = current_time
-                
-                for item in cart:
-                    if item['name'] == product_name:
-                        # Do not increment quantity here; prompt user via modal
-                        prompt_queue.append({
-                            "action": "prompt",
-                            "item": {
-                                "id": item['id'],
-                                "name": product_name,
-                                "price": products[product_name]['price'],
-                                "description": products[product_name]['description'],
-                                "quantity": item['quantity']
-                            }
-                        })
-                        print(f"Prompting for duplicate: {product_name} (conf={conf}, current quantity={item['quantity']})")
-                        break
-                else:
-                    new_item = {
-                        "id": len(cart),
-                        "name": product_name,
-                        "price": products[product_name]['price'],
-                        "description": products[product_name]['description'],
-                        "quantity": 1
-                    }
-                    cart.append(new_item)
-                    prompt_queue.append({
-                        "action": "add",
-                        "item": new_item
-                    })
-                    print(f"Added to cart: {product_name} (conf={conf})")
-
-        if not detected:
-            if no_detection_start is None:
-                no_detection_start = current_time
-            elif current_time - no_detection_start > 10:
-                cv2.putText(processed_frame, "No products detected", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    with model_guard():
+        results = model.predict(frames)
+    print(f"Batched inference of {len(frames)} image(s) took {time.time() - start_time:.2f}s")
+    return [detections_to_products(dets) for dets in results]
+
+# Micro-batching for POST /detect: requests arriving within DETECT_MAX_WAIT
+# seconds of each other share one inference call
+DETECT_MAX_BATCH = 8
+DETECT_MAX_WAIT = 0.02  # seconds
+DETECT_MAX_QUEUE = 64
+DETECT_TIMEOUT = 5  # seconds
+detect_scheduler = BatchScheduler(detect_batch, max_batch_size=DETECT_MAX_BATCH,
+                                  max_wait=DETECT_MAX_WAIT, max_queue=DETECT_MAX_QUEUE)
+
+# Detection -> cart state, owned by each camera pipeline's inference stage. Items
+# are counted once per SORT track (in camera frames) instead of by wall-clock
+# debounce, and with several cameras once per item across views (fusion.py).
+TRACK_MAX_AGE = 20
+TRACK_MIN_HITS = 3
+
+def handle_results(dets, frame, frame_index, reused=False, view=None):
+    """
+    Update the tracks of `view` (default: the first camera) and the cart from
+    one inference result and return the overlay to draw. `reused` results
+    (motion gate closed) only keep the tracks alive.
+    """
+    view = view or views[0]
+    overlay = {"tracks": None, "message": None}
+    if dets is None:
+        return overlay
+
+    current_time = time.time()
+    dets, cls_ids, rejected = filter_detections(dets, class_lookup, DETECTION_CONF)
+    if rejected and not reused:
+        print(f"Ignored {rejected} detection(s) of classes not in products.json")
+    confirmed, overlay["tracks"] = view.tracker.update(dets, cls_ids, frame_index, vote=not reused)
+    # Keep inferring until every new track has enough detections to be counted
+    view.motion_gate.hold_open = view.tracker.pending
+    confirmed = [(track_id, class_lookup.products[cls_id], conf) for track_id, cls_id, conf in confirmed]
+    if fusion is not None:
+        # Items another camera already counted are linked, not added again
+        confirmed = fusion.update(view.name, confirmed, view.tracker.counted)
+
+    for track_id, product_name, conf in confirmed:
+        prompt = cart_store.get(CAMERA_CART_ID).add_detection(product_name, products[product_name])
+        metrics.inc("cart_operations_total", op=f"detect_{prompt['action']}")
+        if prompt["action"] == "prompt":
+            print(f"Prompting for duplicate: {product_name} ({view.name} track {track_id}, conf={conf:.2f}, current quantity={prompt['item']['quantity']})")
         else:
-            no_detection_start = None
+            print(f"Added to cart: {product_name} ({view.name} track {track_id}, conf={conf:.2f})")
 
-        ret, buffer = cv2.imencode('.jpg', processed_frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-        if not ret:
-            logging.error("Failed to encode frame")
-            continue
-        frame = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+    if len(dets) == 0:
+        if view.no_detection_start is None:
+            view.no_detection_start = current_time
+        elif current_time - view.no_detection_start > 10:
+            overlay["message"] = "No products detected"
+    else:
+        view.no_detection_start = None
+    return overlay
 
-        # Control frame rate
-        elapsed = time.time() - frame_start
-        if elapsed < frame_interval:
-            time.sleep(frame_interval - elapsed)
+def draw_overlay(frame, overlay, frame_index, view=None):
+    view = view or views[0]
+    tracks = overlay["tracks"]
+    if tracks is not None and len(tracks["ids"]):
+        # Kalman prediction covers the frames captured since the last inference
+        boxes = states_to_boxes(tracks["states"], frame_index - tracks["frame"]).astype(int).tolist()
+        for (x1, y1, x2, y2), cls_id, conf in zip(boxes, tracks["class_ids"].tolist(), tracks["scores"].tolist()):
+            label = f"{class_lookup.products[cls_id]} ({conf:.2f})"
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    if overlay["message"]:
+        cv2.putText(frame, overlay["message"], (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    if view.roi is not None:
+        x1, y1, x2, y2 = roi_pixels(view.roi, frame.shape)
+        cv2.rectangle(frame, (x1, y1), (x2 - 1, y2 - 1), (200, 200, 200), 1)
+    return frame
+
+def gate_frame(frame, view):
+    # Only changes inside the basket region count (not hands or shelves around it)
+    return view.motion_gate(crop_to_roi(frame, view.roi)[0])
+
+class CameraView:
+    """
+    One camera of the trolley and everything kept per view: its frame source
+    (webcam, video file, image directory or network stream, see
+    frame_sources.make_source, opened and reconnected in a background thread),
+    basket ROI, product tracker, motion gate and its own capture -> inference
+    -> encode pipeline, shared by the /video_feed clients of this camera.
+    Cameras run their pipelines side by side.
+    """
+
+    def __init__(self, index, spec):
+        self.index = index
+        self.name = spec.get("name") or f"cam{index}"
+        self.camera = CameraManager(spec["source"])
+        # (x1, y1, x2, y2) fractions of the frame; only this region goes through inference (None: whole frame)
+        self.roi = parse_roi(spec.get("roi"))
+        self.tracker = ProductTracker(max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS, iou_threshold=0.3)
+        # Motion gate: inference runs only when the basket view changes (plus a
+        # periodic refresh); otherwise the last results are reused
+        self.motion_gate = MotionGate(sensitivity=config["motion_sensitivity"],
+                                      refresh_seconds=config["motion_refresh_seconds"])
+        self.no_detection_start = None
+        self.pipeline = FramePipeline(
+            read_frame=self.camera.read,
+            infer=partial(process_frame, view=self),
+            on_results=partial(handle_results, view=self),
+            render=partial(draw_overlay, view=self),
+            fps=CONFIG_FPS,
+            frame_skip=frame_skip,
+            gate=partial(gate_frame, view=self) if config["motion_gate"] else None,
+        )
+
+views = [CameraView(index, spec) for index, spec in enumerate(camera_specs)]
+fusion = ViewFusion() if len(views) > 1 else None
+# The first camera under the names used before cameras were configurable
+camera, pipeline = views[0].camera, views[0].pipeline
+product_tracker, motion_gate = views[0].tracker, views[0].motion_gate
+
+def find_view(value):
+    """Camera by ?camera= name or index (default: the first one), or None."""
+    if value is None:
+        return views[0]
+    for view in views:
+        if value in (view.name, str(view.index)):
+            return view
+    return None
 
 @app.route('/')
 def index():
     print("Index requested")
+    cart_id = request.args.get('trolley', DEFAULT_CART_ID)
+    if not CartStore.valid_id(cart_id):
+        abort(404)
     try:
-        return render_template('index.html')
+        return render_template('index.html', cart_id=cart_id)
     except Exception as e:
         print(f"TEMPLATE LOAD ERROR: ", str(e))
         return jsonify({"success": False, "error": f"failed to render index: {str(e)}"}), 500
 
-camera_ready = False
 @app.route('/video_feed')
 def video_feed():
-    global camera_ready
+    """
+    MJPEG preview of ?camera= (name or index, default the first camera).
+    ?tier=0..3 picks the starting size/quality (0 = full) and ?adaptive=0 pins
+    it; otherwise the tier follows the client's throughput.
+    """
     print("Video feed requested")
-    import time as _time
-    # Wait until camera_ready is True (max 5 seconds)
-    for _ in range(50):
-        if camera_ready:
-            break
-        _time.sleep(0.1)
-    if not camera_ready:
-        print("Camera not ready after waiting in /video_feed.")
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
-
-@app.route('/prompt', methods=['GET'])
-def get_prompt():
-    global prompt_queue
+    view = find_view(request.args.get('camera'))
+    if view is None:
+        abort(404)
+    tier = request.args.get('tier', 0, type=int)
+    adaptive = request.args.get('adaptive', '1') != '0'
+    return Response(view.pipeline.stream(tier=tier, adaptive=adaptive), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def get_cart_or_404(cart_id):
+    """The cart to change, created if needed."""
+    if not CartStore.valid_id(cart_id):
+        abort(404)
+    return cart_store.get(cart_id)
+
+def find_cart_or_404(cart_id):
+    """The cart to read or None if it doesn't exist (reads as empty); never creates one."""
+    if not CartStore.valid_id(cart_id):
+        abort(404)
+    return cart_store.find(cart_id)
+
+@app.route('/prompt', methods=['GET'], defaults={'cart_id': DEFAULT_CART_ID})
+@app.route('/carts/<cart_id>/prompt', methods=['GET'])
+def get_prompt(cart_id):
+    cart = find_cart_or_404(cart_id)
     try:
-        if prompt_queue:
-            prompt = prompt_queue.pop(0)
+        prompt = cart.pop_prompt() if cart is not None else None
+        if prompt:
             print(f"Serving prompt: {prompt}")
             return jsonify(prompt)
         return jsonify({"action": "none"})
@@ -394,232 +446,424 @@ def get_prompt():
         print(f"Error in get_prompt: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/cart', methods=['GET'])
-def get_cart():
-    print("Cart request received")
+@app.route('/events', methods=['GET'], defaults={'cart_id': DEFAULT_CART_ID})
+@app.route('/carts/<cart_id>/events', methods=['GET'])
+def cart_events(cart_id):
+    """Server-sent events stream of cart changes and detection prompts."""
+    cart = find_cart_or_404(cart_id)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        last_id = None
+    print(f"Event stream requested for {cart_id} (last event id: {last_id})")
+
+    def stream(cart, last_id):
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        if last_id is None:
+            pending = [cart.current_state() if cart is not None else empty_state()]
+        else:
+            pending = []
+        while True:
+            for event_id, event_type, data in pending:
+                yield f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+                last_id = event_id
+            if cart is None:
+                # Until the first change creates the cart there is nothing to stream but its creation
+                cart = cart_store.wait_for(cart_id, timeout=SSE_KEEPALIVE_SECONDS)
+                pending = cart.events_since(last_id, timeout=0) if cart is not None else []
+            else:
+                pending = cart.events_since(last_id, timeout=SSE_KEEPALIVE_SECONDS)
+            if not pending:
+                yield ": keepalive\n\n"
+
+    return Response(stream(cart, last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/cart', methods=['GET'], defaults={'cart_id': DEFAULT_CART_ID})
+@app.route('/carts/<cart_id>', methods=['GET'])
+def get_cart(cart_id):
+    """Cart snapshot with an ETag; polls with a matching If-None-Match get an empty 304."""
+    cart = find_cart_or_404(cart_id)
     try:
-        item_count = sum(item['quantity'] for item in cart)
-        response = jsonify({
-            "cart": cart,
-            "total": sum(item['price'] * item['quantity'] for item in cart),
-            "item_count": item_count
-        })
-        print("Cart response:", response.get_data(as_text=True))
-        return response
+        if cart is not None:
+            version, body = cart.encoded_snapshot()
+        else:
+            version, body = 0, json.dumps(empty_snapshot())
+        response = Response(body, mimetype='application/json')
+        # Versions restart with the process, so the ETag carries the start time too
+        response.set_etag(f"{CART_ETAG_PREFIX}-{version}")
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     except Exception as e:
         print(f"Error in get_cart: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/cart/add', methods=['POST'])
-def add_item():
+@app.route('/cart/add', methods=['POST'], defaults={'cart_id': DEFAULT_CART_ID})
+@app.route('/carts/<cart_id>/add', methods=['POST'])
+def add_item(cart_id):
     print("Add item requested")
+    cart = get_cart_or_404(cart_id)
     try:
         data = request.json
         product_name = data['name']
         if product_name in products:
-            for item in cart:
-                if item['name'] == product_name:
-                    item['quantity'] += 1
-                    print(f"Incremented quantity for {product_name}")
-                    return jsonify({"success": True})
-            cart.append({
-                "id": len(cart),
-                "name": product_name,
-                "price": products[product_name]['price'],
-                "description": products[product_name]['description'],
-                "quantity": 1
-            })
-            print(f"Added new item: {product_name}")
+            _, created = cart.add_product(product_name, products[product_name])
+            metrics.inc("cart_operations_total", op="add")
+            if created:
+                print(f"Added new item: {product_name}")
+            else:
+                print(f"Incremented quantity for {product_name}")
             return jsonify({"success": True})
         return jsonify({"success": False})
     except Exception as e:
         print(f"Error in add_item: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/cart/update/<int:item_id>', methods=['POST'])
-def update_item(item_id):
+@app.route('/cart/update/<int:item_id>', methods=['POST'], defaults={'cart_id': DEFAULT_CART_ID})
+@app.route('/carts/<cart_id>/update/<int:item_id>', methods=['POST'])
+def update_item(cart_id, item_id):
     print(f"Update item {item_id} requested")
+    cart = find_cart_or_404(cart_id)
     try:
         data = request.json
         action = data.get('action')
-        for item in cart:
-            if item['id'] == item_id:
-                if action == 'increment':
-                    item['quantity'] += 1
-                elif action == 'decrement' and item['quantity'] > 1:
-                    item['quantity'] -= 1
-                elif action == 'remove':
-                    cart.remove(item)
-                return jsonify({"success": True})
-        return jsonify({"success": False})
+        updated = cart is not None and cart.update_item(item_id, action)
+        if updated:
+            metrics.inc("cart_operations_total", op=action if action in ('increment', 'decrement', 'remove') else "update")
+        return jsonify({"success": updated})
     except Exception as e:
         print(f"Error in update_item: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/cart/remove/<int:item_id>', methods=['POST'])
-def remove_item(item_id):
+@app.route('/cart/remove/<int:item_id>', methods=['POST'], defaults={'cart_id': DEFAULT_CART_ID})
+@app.route('/carts/<cart_id>/remove/<int:item_id>', methods=['POST'])
+def remove_item(cart_id, item_id):
     print(f"Remove item {item_id} requested")
+    cart = find_cart_or_404(cart_id)
     try:
-        global cart
-        cart = [item for item in cart if item['id'] != item_id]
+        # Removing an item that is already gone still succeeds, but only a real removal is counted
+        if cart is not None and cart.remove_item(item_id):
+            metrics.inc("cart_operations_total", op="remove")
         return jsonify({"success": True})
     except Exception as e:
         print(f"Error in remove_item: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/cart/clear', methods=['POST'])
-def clear_cart():
+@app.route('/cart/clear', methods=['POST'], defaults={'cart_id': DEFAULT_CART_ID})
+@app.route('/carts/<cart_id>/clear', methods=['POST'])
+def clear_cart(cart_id):
     print("Clear cart requested")
+    cart = find_cart_or_404(cart_id)
     try:
-        global cart
-        cart = []
+        if cart is not None:
+            cart.clear()
+        metrics.inc("cart_operations_total", op="clear")
         return jsonify({"success": True})
     except Exception as e:
         print(f"Error in clear_cart: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/detect', methods=['POST'])
+def detect():
+    """
+    Detect products in one or more JPEG/PNG images: either a raw image body or a
+    multipart form with one or more `image` files. Returns one result per image.
+    """
+    if not model_ready.is_set():
+        return jsonify({"success": False, "error": "Model is still loading"}), 503
+    try:
+        if request.files:
+            blobs = [f.read() for f in request.files.getlist('image')]
+        else:
+            blobs = [request.get_data()]
+        frames = [cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR) for blob in blobs if blob]
+        if not frames or any(frame is None for frame in frames):
+            return jsonify({"success": False, "error": "Expected one or more encoded images"}), 400
+
+        futures = []
+        try:
+            for frame in frames:
+                futures.append(detect_scheduler.submit(frame))
+        except QueueFull:
+            for fut in futures:
+                fut.cancel()
+            return jsonify({"success": False, "error": "Detector busy, retry later"}), 503
+        deadline = time.time() + DETECT_TIMEOUT
+        try:
+            results = [fut.result(timeout=max(0, deadline - time.time())) for fut in futures]
+        except FutureTimeout:
+            for fut in futures:
+                fut.cancel()
+            return jsonify({"success": False, "error": "Detection timed out"}), 504
+        return jsonify({"success": True, "results": [{"products": r} for r in results]})
+    except Exception as e:
+        print(f"Error in detect: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/search', methods=['GET'])
 def search_products():
-    print("Search requested")
+    """Products matching ?query= (prefix, substring or a typo away), best first, at most ?limit=."""
     try:
-        query = request.args.get('query', '').lower().strip()
-        print(f"Search query received: {query}")
+        query = request.args.get('query', '').strip()
+        limit = min(max(request.args.get('limit', SEARCH_LIMIT, type=int), 1), 100)
         if not query:
             return jsonify([])
+        refresh_catalog()
         suggestions = [
-            {"name": name, "price": details['price'], "description": details['description']}
-            for name, details in products.items()
-            if query in name.lower()
+            {"name": name, "price": products[name]['price'], "description": products[name]['description']}
+            for name in search_index.search(query, limit)
         ]
-        print(f"Search results: {suggestions}")
         return jsonify(suggestions)
     except Exception as e:
         print(f"Error in search_products: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/checkout', methods=['GET', 'POST'])
-def checkout():
+@app.route('/checkout', methods=['GET', 'POST'], defaults={'cart_id': DEFAULT_CART_ID})
+@app.route('/carts/<cart_id>/checkout', methods=['GET', 'POST'])
+def checkout(cart_id):
     print("Checkout requested")
+    cart = find_cart_or_404(cart_id)
     try:
         if request.method == 'POST':
-            global cart
-            cart = []  # Clear cart after successful payment
+            if cart is not None:
+                cart.clear()  # Clear cart after successful payment
+            metrics.inc("cart_operations_total", op="checkout")
             return jsonify({"success": True, "message": "Payment successful! Thank You For Shopping."})
-        return render_template('checkout.html', cart=cart, total=sum(item['price'] * item['quantity'] for item in cart))
+        snapshot = cart.snapshot() if cart is not None else empty_snapshot()
+        return render_template('checkout.html', cart=snapshot['cart'], total=snapshot['total'], cart_id=cart_id)
     except Exception as e:
         print(f"Error in checkout: {e}")
         return jsonify({"success": False, "error": f"Failed to render checkout: {str(e)}"}), 500
 
 @app.route('/camera/start', methods=['POST'])
 def start_camera():
-    global camera, camera_active, camera_ready, processing_thread, frame_buffer
+    """Start the camera pipelines; sources open (or keep retrying) in the background, see /camera/status."""
     print("Start camera requested")
     try:
-        # Ensure clean state before starting
-        camera_ready = False
-        camera_active = False
-        processing_thread = None
-        with buffer_lock:
-            frame_buffer = None
-        
-        # Try to initialize camera and read first frame before returning success
-        if not init_camera():
-            camera_active = False
-            camera_ready = False
-            if camera is not None:
-                try:
-                    camera.release()
-                except Exception as e:
-                    logging.error(f"Error releasing camera after failed init: {e}")
-                camera = None
-            return jsonify({"success": False, "error": "Cannot Access Webcam"})
-        
-        # Wait for first frame to be available (up to 2 seconds, 10 tries)
-        import time as _time
-        for i in range(10):
-            if camera is not None:
-                ret, frame = camera.read()
-                if ret and frame is not None:
-                    print(f"First frame available after {i+1} tries.")
-                    camera_active = True
-                    camera_ready = True
-                    return jsonify({"success": True})
-            _time.sleep(0.2)
-        
-        print("Failed to get first frame after camera initialization in /camera/start.")
-        camera_active = False
-        camera_ready = False
-        if camera is not None:
-            try:
-                camera.release()
-            except Exception as e:
-                logging.error(f"Error releasing camera after failed first frame: {e}")
-            camera = None
-        return jsonify({"success": False, "error": "Camera initialized but failed to get first frame."})
+        if fusion is not None and not any(view.pipeline.running for view in views):
+            fusion.reset()
+        for view in views:
+            view.camera.start()
+            if not view.pipeline.running:
+                view.tracker.reset()
+                view.motion_gate.reset()
+                view.pipeline.start()
+        return jsonify({"success": True, "status": camera_status_body()})
     except Exception as e:
         print(f"Error in start_camera: {e}")
-        camera_active = False
-        camera_ready = False
-        if camera is not None:
-            try:
-                camera.release()
-            except Exception as e2:
-                logging.error(f"Error releasing camera after exception: {e2}")
-            camera = None
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/camera/stop', methods=['POST'])
 def stop_camera():
-    global camera_active, camera, processing_thread, camera_ready, frame_buffer, frame_count
     logging.info("Stop camera requested")
-    
-    # Immediately reset flags to stop all operations
-    camera_active = False
-    camera_ready = False
-    
-    # Clear frame buffer (it's a tuple, not a dict)
-    with buffer_lock:
-        frame_buffer = None
-    
-    # Stop processing thread with timeout
-    if processing_thread and processing_thread.is_alive():
-        try:
-            processing_thread.join(timeout=2.0)
-            logging.info("Processing thread stopped successfully")
-        except Exception as e:
-            logging.error(f"Error joining processing thread: {e}")
-    
-    # Add small delay to ensure all operations are complete
-    time.sleep(0.1)
-    
-    # Release camera with defensive approach
-    if camera is not None:
-        try:
-            # First try to read one frame to ensure camera is responsive
-            ret, _ = camera.read()
-            if not ret:
-                logging.warning("Camera was not responding before release")
-        except Exception as e:
-            logging.warning(f"Error reading from camera before release: {e}")
-        
-        try:
-            camera.release()
-            logging.info("Camera released successfully")
-        except Exception as e:
-            logging.error(f"Error releasing camera: {e}")
-        finally:
-            camera = None
-    
-    # Reset all global variables
-    camera_active = False
-    camera_ready = False
-    processing_thread = None
-    frame_buffer = None
-    frame_count = 0
-    
+    # Stop the capture/inference/encode threads before releasing the sources
+    for view in views:
+        view.pipeline.stop(timeout=2.0)
+    for view in views:
+        view.camera.stop()
     logging.info("Camera stop completed")
     return jsonify({'success': True})
 
-if __name__ == '__main__':
+def camera_status_body():
+    # The first camera's status at the top level, as with a single camera
+    cameras = []
+    for view in views:
+        status = view.camera.status()
+        status["pipeline_running"] = view.pipeline.running
+        cameras.append(dict(status, name=view.name))
+    return dict(cameras[0], cameras=cameras)
+
+@app.route('/camera/status', methods=['GET'])
+def camera_status():
+    """Frame source state (opening, open, retrying, reconnecting, ...), attempts and last error, per camera."""
+    return jsonify(camera_status_body())
+
+@app.route('/camera/roi', methods=['GET', 'POST'])
+def camera_region():
+    """
+    GET: the region of interest of ?camera= (default the first camera). POST
+    {"roi": [x1, y1, x2, y2]} with fractions of the frame (or null for the
+    whole frame) sets it and saves it to config.json.
+    """
+    view = find_view(request.args.get('camera'))
+    if view is None:
+        return jsonify({"success": False, "error": "Unknown camera"}), 404
+    if request.method == 'GET':
+        return jsonify({"roi": view.roi, "camera": view.name})
+    try:
+        data = request.get_json(silent=True) or {}
+        if 'roi' not in data:
+            return jsonify({"success": False, "error": "Expected a JSON body with \"roi\""}), 400
+        roi = parse_roi(data['roi'])
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    try:
+        if config["cameras"]:
+            cameras = [dict(spec) for spec in config["cameras"]]
+            cameras[view.index]["roi"] = list(roi) if roi else None
+            save_config({"cameras": cameras})
+            config["cameras"] = cameras
+        else:
+            save_config({"roi": list(roi) if roi else None})
+    except Exception as e:
+        print(f"Error saving ROI: {e}")
+        return jsonify({"success": False, "error": f"ROI not saved: {str(e)}"}), 500
+    view.roi = roi
+    print(f"Camera {view.name} ROI set to {roi}")
+    return jsonify({"success": True, "roi": roi, "camera": view.name})
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving HTTP."""
+    return jsonify({"status": "ok", "uptime": round(time.time() - startup_state["started_at"], 3)})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: the model is loaded and warmed up."""
+    ready = model_ready.is_set()
+    body = {
+        "ready": ready,
+        "model": startup_state["model"],
+        "camera": camera.status()["state"],
+        "cameras": {view.name: view.camera.status()["state"] for view in views},
+        "error": startup_state["error"],
+        "startup_seconds": round(startup_state["ready_at"] - startup_state["started_at"], 3) if ready else None
+    }
+    return jsonify(body), (200 if ready else 503)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.endpoint or "unmatched"
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - started, endpoint=endpoint)
+        metrics.inc("http_requests_total", endpoint=endpoint, method=request.method, status=str(response.status_code))
+    return response
+
+@metrics.collector
+def collect_pipeline():
+    # Every series is labelled with the camera its pipeline belongs to
+    stage_seconds, frames, overruns, encode_dropped, running, clients = {}, {}, {}, {}, {}, {}
+    for view in views:
+        pipeline, cam = view.pipeline, ("camera", view.name)
+        stats = pipeline.stats
+        stage_seconds.update({(cam, ("stage", stage)): h for stage, h in stats.histograms.items()})
+        frames.update({(cam, ("event", event)): n for event, n in stats.lifetime_totals().items()})
+        overruns[(cam,)] = pipeline.to_infer.dropped_total
+        encode_dropped[(cam,)] = pipeline.captured.dropped_total
+        running[(cam,)] = int(pipeline.running)
+        clients.update({(cam, ("tier", str(tier))): n for tier, n in enumerate(pipeline.subscribers)})
+    yield ("pipeline_stage_seconds", "histogram", "Latency of each pipeline stage.", stage_seconds)
+    yield ("pipeline_frames_total", "counter",
+           "Pipeline frame events: captured, skipped (frame_skip), gated (motion gate), inferred, encoded, "
+           "unwatched (no viewer), read_failures, stream_skipped (frames a slow viewer never got).", frames)
+    yield ("inference_overruns_total", "counter",
+           "Sampled frames replaced before inference could take them (inference slower than the sample rate).",
+           overruns)
+    yield ("encode_dropped_frames_total", "counter", "Captured frames replaced before the encode stage took them.",
+           encode_dropped)
+    yield ("pipeline_running", "gauge", "1 while the capture/inference/encode threads run.", running)
+    yield ("stream_clients", "gauge", "Preview stream clients per tier.", clients)
+    if fusion is not None:
+        yield ("fusion_merged_total", "counter",
+               "Confirmed tracks linked to an item another camera already counted.", {(): fusion.merged})
+
+@metrics.collector
+def collect_camera():
+    up, states, reconnects, frames = {}, {}, {}, {}
+    for view in views:
+        status, cam = view.camera.status(), ("camera", view.name)
+        up[(cam,)] = int(status["state"] == "open")
+        states.update({(cam, ("state", state)): int(status["state"] == state)
+                       for state in ("stopped", "opening", "open", "retrying", "reconnecting", "finished")})
+        reconnects[(cam,)] = status["reconnects"]
+        frames[(cam,)] = status["frames"]
+    yield ("camera_up", "gauge", "1 while the frame source is open.", up)
+    yield ("camera_state", "gauge", "Current frame source state.", states)
+    yield ("camera_reconnects_total", "counter", "Times a live frame source stopped delivering frames.", reconnects)
+    yield ("camera_frames_total", "counter", "Frames read from the frame source.", frames)
+
+if CPU_MONITORING:
+    process = psutil.Process()
+    process.cpu_percent(None)  # the first call only sets the baseline
+
+@metrics.collector
+def collect_process():
+    yield ("info", "gauge", "Trolley id, inference backend and device of this process.",
+           {(("trolley_id", CAMERA_CART_ID), ("backend", INFERENCE_BACKEND), ("device", YOLO_DEVICE)): 1})
+    yield ("model_ready", "gauge", "1 once the model is loaded and warmed up.", {(): int(model_ready.is_set())})
+    yield ("carts", "gauge", "Carts held in memory.", {(): len(cart_store)})
+    yield ("search_cache_total", "counter", "Search queries answered from the cache (hit) or the index (miss).",
+           {(("result", "hit"),): search_index.hits, (("result", "miss"),): search_index.misses})
+    if cart_log is not None:
+        yield ("cart_log_records_total", "counter", "Cart changes written to the cart log.", {(): cart_log.records})
+        yield ("cart_log_commits_total", "counter", "Cart log fsyncs (each commits a group of changes).",
+               {(): cart_log.commits})
+    if isinstance(model, InferencePool):
+        yield ("inference_workers", "gauge", "Inference worker processes running.",
+               {(): model.running})
+        yield ("inference_worker_restarts_total", "counter", "Inference workers restarted after exiting.",
+               {(): model.restarts})
+    if CPU_MONITORING:
+        with process.oneshot():
+            cpu, rss, threads = process.cpu_percent(None), process.memory_info().rss, process.num_threads()
+        yield ("process_cpu_percent", "gauge", "CPU use of this process since the previous scrape (100 = one core).",
+               {(): cpu})
+        yield ("process_resident_memory_bytes", "gauge", "Resident memory of this process.", {(): rss})
+        yield ("process_threads", "gauge", "Threads of this process.", {(): threads})
+        yield ("system_cpu_percent", "gauge", "Host CPU use since the previous scrape.", {(): psutil.cpu_percent(None)})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def run_startup(raise_errors=False):
+    try:
+        load_model()
+        startup_state["model"] = "ready"
+        startup_state["ready_at"] = time.time()
+    except Exception as e:
+        print(f"Error Loading YOLO Model: {e}")
+        startup_state["model"] = "error"
+        startup_state["error"] = str(e)
+        if raise_errors:
+            raise
+    # Open the cameras early so the devices are warm when /camera/start is called
+    for view in views:
+        view.camera.start()
+
+# "background" binds the HTTP port immediately and loads the model and camera
+# in a thread (watch /readyz); "blocking" loads everything before serving
+STARTUP_MODE = config["startup"]
+PORT = int(config["port"])
+if STARTUP_MODE == "blocking":
+    run_startup(raise_errors=True)
+else:
+    threading.Thread(target=run_startup, name="startup", daemon=True).start()
+
+# "threaded" serves each request (and each open stream) on its own thread;
+# "async" serves the streams from one event loop (async_server.py, needs aiohttp)
+SERVER_MODE = config["server"]
+
+def serve(host='localhost'):
+    if SERVER_MODE == "async":
+        try:
+            from async_server import AsyncServer
+        except ImportError as e:
+            print(f"Async server unavailable ({e}), install aiohttp; using the threaded server")
+        else:
+            AsyncServer(app, [view.pipeline for view in views], cart_store, metrics=metrics, workers=config["async_workers"],
+                        sse_retry_ms=SSE_RETRY_MS, sse_keepalive_seconds=SSE_KEEPALIVE_SECONDS,
+                        camera_names=[view.name for view in views]).run(host, PORT)
+            return
     from werkzeug.serving import run_simple
-    run_simple('localhost', 8080, app, threaded=True)
\ No newline at end of file
+    run_simple(host, PORT, app, threaded=True)
+
+if __name__ == '__main__':
+    serve()
\ No newline at end of file
@@ -0,0 +1,283 @@
+"""
+asyncio serving mode ("server": "async" in config, or SMART_TROLLEY_SERVER=async).
+
+The preview (/video_feed) and cart event (/events) streams are served by
+coroutines on one aiohttp event loop, so an idle viewer costs a socket and a
+small task instead of an OS thread parked in a generator. They are woken by
+the pipeline's encode thread and by cart changes through Broadcast, never by
+polling. Every other route still goes through the Flask app, called as WSGI
+on a small thread pool, so request handling (and anything blocking in it,
+/detect waiting for the model, checkout templates) stays off the loop.
+"""
+import asyncio
+import io
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from cart_store import CartStore, DEFAULT_CART_ID, empty_state
+from pipeline import AdaptiveQuality, EMPTY_PART, mjpeg_part
+
+# Headers aiohttp sets itself from the body it sends
+HOP_HEADERS = {"content-length", "transfer-encoding", "connection", "keep-alive"}
+# Request bodies /detect accepts (several camera images in one multipart form)
+MAX_BODY_BYTES = 32 * 1024 * 1024
+
+
+class Broadcast:
+    """
+    Wakes every coroutine waiting on it. publish() may be called from any
+    thread; waiters run on the loop and only pay for a future while waiting.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self._waiters = set()
+
+    def publish(self):
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, set()
+        for fut in waiters:
+            if not fut.done():
+                fut.set_result(None)
+
+    async def wait(self, timeout):
+        """True when woken, False on timeout."""
+        fut = self.loop.create_future()
+        self._waiters.add(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiters.discard(fut)
+
+
+def wsgi_environ(request, body):
+    # PEP 3333: the path is the raw bytes decoded as latin-1
+    path = request.path.encode("utf-8").decode("latin-1")
+    host, _, port = (request.host or "localhost").partition(":")
+    environ = {
+        "REQUEST_METHOD": request.method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": request.query_string,
+        "SERVER_NAME": host,
+        "SERVER_PORT": port or ("443" if request.secure else "80"),
+        "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+        "REMOTE_ADDR": request.remote or "",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": request.scheme,
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in request.headers.items():
+        key = name.upper().replace("-", "_")
+        if key == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif key != "CONTENT_LENGTH":
+            key = "HTTP_" + key
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_wsgi(wsgi_app, environ):
+    """Run a WSGI app to completion; returns (status, headers, body)."""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"], response["headers"] = status, headers
+        return lambda data: None
+
+    result = wsgi_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return int(response["status"].split(" ", 1)[0]), response["headers"], body
+
+
+class AsyncServer:
+    """
+    aiohttp front for the Flask app: native streaming handlers for the preview
+    and cart event streams, everything else forwarded to `flask_app`.
+    `pipelines` has one camera pipeline per camera, in camera index order.
+    """
+
+    def __init__(self, flask_app, pipelines, cart_store, metrics=None, workers=16,
+                 sse_retry_ms=2000, sse_keepalive_seconds=15, camera_names=None):
+        self.flask_app = flask_app
+        self.pipelines = list(pipelines)
+        self.camera_names = list(camera_names or [])
+        self.cart_store = cart_store
+        self.metrics = metrics
+        self.workers = workers
+        self.sse_retry_ms = sse_retry_ms
+        self.sse_keepalive_seconds = sse_keepalive_seconds
+        self.executor = None
+        self.loop = None
+        self.frames = []        # per pipeline, Broadcast per stream tier
+        self.cart_feeds = {}    # cart id -> Broadcast
+        self.carts_created = None   # Broadcast of new carts, for streams of carts that don't exist yet
+
+    def _count(self, endpoint, status):
+        if self.metrics is not None:
+            self.metrics.inc("http_requests_total", endpoint=endpoint, method="GET", status=str(status))
+
+    async def _on_startup(self, aiohttp_app):
+        self.loop = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="wsgi")
+        for pipeline in self.pipelines:
+            broadcasts = [Broadcast(self.loop) for _ in pipeline.outputs]
+            for output, broadcast in zip(pipeline.outputs, broadcasts):
+                output.add_listener(broadcast.publish)
+            self.frames.append(broadcasts)
+        self.carts_created = Broadcast(self.loop)
+        self.cart_store.listeners.append(lambda cart: self.carts_created.publish())
+
+    async def _on_cleanup(self, aiohttp_app):
+        self.executor.shutdown(wait=False)
+
+    def _cart_feed(self, cart):
+        feed = self.cart_feeds.get(cart.id)
+        if feed is None:
+            feed = self.cart_feeds[cart.id] = Broadcast(self.loop)
+            cart.listeners.append(feed.publish)
+        return feed
+
+    async def video_feed(self, request):
+        """MJPEG preview, same parameters and tier adaptation as the threaded /video_feed."""
+        camera = request.query.get("camera")
+        if camera is None:
+            index = 0
+        elif camera in self.camera_names:
+            index = self.camera_names.index(camera)
+        elif camera.isdigit() and int(camera) < len(self.pipelines):
+            index = int(camera)
+        else:
+            raise web.HTTPNotFound()
+        pipeline, frames = self.pipelines[index], self.frames[index]
+        try:
+            tier = int(request.query.get("tier", 0))
+        except ValueError:
+            tier = 0
+        tier = min(max(0, tier), len(pipeline.tiers) - 1)
+        quality = AdaptiveQuality(tier, len(pipeline.tiers) - 1, 1.0 / pipeline.fps,
+                                  adaptive=request.query.get("adaptive", "1") != "0")
+        response = web.StreamResponse(headers={"Content-Type": "multipart/x-mixed-replace; boundary=frame"})
+        await response.prepare(request)
+        self._count("video_feed", 200)
+        pipeline.subscribe(tier, 1)
+        seq = 0
+        last_jpeg = None
+        try:
+            while True:
+                last_seq = seq
+                seq, jpeg = pipeline.outputs[tier].wait_newer(seq, timeout=0)
+                if jpeg is None:
+                    if not await frames[tier].wait(0.5):
+                        # Nothing new, as the threaded stream: keep writing so a client that left is noticed
+                        await response.write(mjpeg_part(last_jpeg) if pipeline.running and last_jpeg is not None
+                                             else EMPTY_PART)
+                    continue
+                if last_seq and seq - last_seq > 1:
+                    pipeline.stats.count("stream_skipped", seq - last_seq - 1)
+                last_jpeg = jpeg
+                # write() returns once the transport has taken the chunk (it waits
+                # for the send buffer to drain), so this is the client's consumption time
+                sent = time.monotonic()
+                await response.write(mjpeg_part(jpeg))
+                new_tier = quality.update(time.monotonic() - sent)
+                if new_tier != tier:
+                    logging.info(f"Stream client moved from tier {tier} to {new_tier} "
+                                 f"(send time {quality.send_time * 1000:.0f} ms)")
+                    pipeline.subscribe(new_tier, 1)
+                    pipeline.subscribe(tier, -1)
+                    tier, seq = new_tier, 0
+        except ConnectionError:
+            pass
+        finally:
+            pipeline.subscribe(tier, -1)
+        return response
+
+    async def cart_events(self, request):
+        """Server-sent events of one cart, as the threaded /events."""
+        cart_id = request.match_info.get("cart_id", DEFAULT_CART_ID)
+        if not CartStore.valid_id(cart_id):
+            raise web.HTTPNotFound()
+        # Read-only: a cart that doesn't exist streams as empty until a change creates it
+        cart = self.cart_store.find(cart_id)
+        last_event_id = request.headers.get("Last-Event-ID") or request.query.get("last_event_id")
+        try:
+            last_id = int(last_event_id) if last_event_id is not None else None
+        except ValueError:
+            last_id = None
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                               "X-Accel-Buffering": "no"})
+        await response.prepare(request)
+        self._count("cart_events", 200)
+        try:
+            await response.write(f"retry: {self.sse_retry_ms}\n\n".encode())
+            if last_id is None:
+                pending = [cart.current_state() if cart is not None else empty_state()]
+            else:
+                pending = []
+            while cart is None:
+                for event_id, event_type, data in pending:
+                    await response.write(f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n".encode())
+                    last_id = event_id
+                pending = []
+                cart = self.cart_store.find(cart_id)
+                if cart is None and not await self.carts_created.wait(self.sse_keepalive_seconds):
+                    await response.write(b": keepalive\n\n")
+            feed = self._cart_feed(cart)
+            while True:
+                for event_id, event_type, data in pending:
+                    await response.write(f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n".encode())
+                    last_id = event_id
+                # Never blocks: the cart lock is only held to copy the new events
+                pending = cart.events_since(last_id, timeout=0)
+                if pending:
+                    continue
+                if not await feed.wait(self.sse_keepalive_seconds):
+                    await response.write(b": keepalive\n\n")
+                pending = cart.events_since(last_id, timeout=0)
+        except ConnectionError:
+            pass
+        return response
+
+    async def forward(self, request):
+        """Any other route: the Flask app, on the thread pool."""
+        body = await request.read()
+        environ = wsgi_environ(request, body)
+        status, headers, body = await self.loop.run_in_executor(self.executor, call_wsgi, self.flask_app, environ)
+        response = web.Response(status=status, body=body)
+        for name, value in headers:
+            if name.lower() not in HOP_HEADERS:
+                response.headers.add(name, value)
+        return response
+
+    def make_app(self):
+        aiohttp_app = web.Application(client_max_size=MAX_BODY_BYTES)
+        aiohttp_app.on_startup.append(self._on_startup)
+        aiohttp_app.on_cleanup.append(self._on_cleanup)
+        aiohttp_app.router.add_get("/video_feed", self.video_feed)
+        aiohttp_app.router.add_get("/events", self.cart_events)
+        aiohttp_app.router.add_get("/carts/{cart_id}/events", self.cart_events)
+        aiohttp_app.router.add_route("*", "/{tail:.*}", self.forward)
+        return aiohttp_app
+
+    def run(self, host, port):
+        print(f"Serving on http://{host}:{port} (async, {self.workers} worker threads)")
+        web.run_app(self.make_app(), host=host, port=port, print=None)
@@ -0,0 +1,67 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFull(Exception):
+    pass
+
+
+class BatchScheduler:
+    """
+    Collects single requests into batches for one batched call.
+
+    A batch is dispatched as soon as it holds `max_batch_size` items or
+    `max_wait` seconds after its first item arrived, whichever comes first, so
+    a lone request never waits longer than `max_wait` for company. The queue is
+    bounded: when it is full, submit() raises QueueFull instead of letting
+    latency grow without limit.
+
+    run_batch(items) -> list of results, one per item, in the same order.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait=0.02, max_queue=64, name="batch-scheduler"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future))
+        except queue.Full:
+            raise QueueFull("Batch queue is full")
+        return future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Callers that already gave up (cancelled futures) are dropped here
+        return [(item, fut) for item, fut in batch if fut.set_running_or_notify_cancel()]
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                results = self.run_batch([item for item, _ in batch])
+                for (_, fut), result in zip(batch, results):
+                    fut.set_result(result)
+            except Exception as e:
+                logging.error(f"Batch of {len(batch)} failed: {e}")
+                for _, fut in batch:
+                    fut.set_exception(e)
@@ -0,0 +1,104 @@
+"""
+Cart store throughput benchmark.
+
+Runs a mix of cart operations (add, increment, snapshot, prompt) from a pool of
+threads spread over N trolleys and reports operations per second for each N.
+With --durability sync or async the carts are backed by a CartLog in a
+temporary directory (or --dir); writes/s then counts cart changes made durable
+and fsyncs/s how many group commits they took.
+
+    python backend/benchmarks/bench_cart_store.py --carts 1 10 100 500 --threads 16
+    python backend/benchmarks/bench_cart_store.py --durability sync --carts 1 10 100 --threads 1 16 64
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from cart_store import CartStore  # noqa: E402
+from cart_log import CartLog  # noqa: E402
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+with open(os.path.join(project_root, 'backend', 'products.json'), 'r') as f:
+    products = json.load(f)
+product_names = list(products)
+
+
+def worker(store, cart_ids, stop, counts, index, seed):
+    rng = random.Random(seed)
+    ops = writes = 0
+    while not stop.is_set():
+        cart = store.get(rng.choice(cart_ids))
+        r = rng.random()
+        name = rng.choice(product_names)
+        if r < 0.4:
+            cart.snapshot()
+        elif r < 0.6:
+            cart.add_product(name, products[name])
+            writes += 1
+        elif r < 0.8:
+            writes += cart.add_detection(name, products[name])["action"] == "add"
+        elif r < 0.95:
+            writes += cart.update_item(rng.randrange(8), rng.choice(['increment', 'decrement']))
+        else:
+            cart.pop_prompt()
+        ops += 1
+    counts[index] = (ops, writes)
+
+
+def run(n_carts, n_threads, duration, durability="off", directory=None):
+    log = CartLog(directory, durability=durability) if durability != "off" else None
+    store = CartStore(log=log)
+    cart_ids = [f"trolley-{i}" for i in range(n_carts)]
+    stop = threading.Event()
+    counts = [(0, 0)] * n_threads
+    threads = [threading.Thread(target=worker, args=(store, cart_ids, stop, counts, i, i)) for i in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if log is not None:
+        log.close()
+    return {
+        "ops_per_sec": round(sum(ops for ops, _ in counts) / elapsed),
+        "writes_per_sec": round(sum(writes for _, writes in counts) / elapsed),
+        "fsyncs_per_sec": round(log.commits / elapsed) if log else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cart store throughput benchmark")
+    parser.add_argument("--carts", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--threads", type=int, nargs="+", default=[16])
+    parser.add_argument("--durability", choices=["off", "async", "sync"], default="off",
+                        help="Back the carts with a write-ahead log")
+    parser.add_argument("--dir", default=None, help="Cart log directory; default a temporary one per run")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per run")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.carts:
+        for threads in args.threads:
+            with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+                result = run(n, threads, args.duration, args.durability, directory)
+            result.update({"carts": n, "threads": threads, "durability": args.durability})
+            results.append(result)
+            if not args.json:
+                print(f"{n:>6} carts  {threads:>3} threads  {result['ops_per_sec']:>12,} ops/s  "
+                      f"{result['writes_per_sec']:>10,} writes/s  {result['fsyncs_per_sec']:>8,} fsyncs/s")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Offline replay benchmark of the live detection pipeline: recorded videos or
+image directories are fed through the app's own capture -> inference ->
+overlay -> encode pipeline (process_frame, handle_results, draw_overlay) with a
+file-backed camera in place of the webcam.
+
+Reports per-stage latency percentiles, sustained FPS, skipped and dropped
+frames, and detection-to-cart latency (first capture of a track to its cart
+add), as JSON to compare across commits and hardware.
+
+    python backend/benchmarks/bench_pipeline.py recordings/aisle.mp4 recordings/frames/ --output results.json
+    python backend/benchmarks/bench_pipeline.py recordings/aisle.mp4 --backend onnx --fps 15 --frame-skip 1
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from functools import partial
+
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, backend_dir)
+
+BENCH_CART_ID = "bench"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=backend_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def wait_until_idle(pipeline, source, timeout, settle=0.5):
+    """Wait for the source to run out, then for the inference and encode stages to go quiet."""
+    deadline = time.monotonic() + timeout
+    while not source.finished and time.monotonic() < deadline:
+        time.sleep(0.05)
+    last, last_change = None, time.monotonic()
+    while time.monotonic() < deadline:
+        counters = pipeline.stats.summary()["counters"]
+        current = (counters.get("inferred", 0), counters.get("encoded", 0))
+        if current != last:
+            last, last_change = current, time.monotonic()
+        elif time.monotonic() - last_change >= settle:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def watch(pipeline, viewing):
+    for _ in pipeline.stream():
+        if not viewing.is_set():
+            break
+
+
+def replay(app, path, fps, frame_skip, timeout, motion_gate):
+    from frame_sources import file_source
+    from pipeline import FramePipeline, latency_summary
+
+    source = file_source(path)
+    if not source.open():
+        raise RuntimeError(f"Cannot open {path}")
+
+    capture_times = {}   # frame index -> capture time
+    first_seen = {}      # track id -> capture time of the first frame it was matched on
+    cart_latencies = []
+
+    def read_frame():
+        frame = source.read()
+        if frame is not None:
+            capture_times[len(capture_times) + 1] = time.monotonic()
+        return frame
+
+    # Replayed as the first camera: its ROI, tracker and motion gate, as app.views builds them
+    view = app.views[0]
+
+    def on_results(dets, frame, frame_index, reused):
+        counted = set(view.tracker.counted)
+        overlay = app.handle_results(dets, frame, frame_index, reused, view=view)
+        added_at = time.monotonic()
+        tracks = overlay["tracks"]
+        if tracks is not None:
+            for track_id in tracks["ids"].tolist():
+                first_seen.setdefault(track_id, capture_times[frame_index])
+        for track_id in view.tracker.counted - counted:
+            cart_latencies.append(added_at - first_seen.get(track_id, capture_times[frame_index]))
+        return overlay
+
+    view.tracker.reset()
+    view.motion_gate.reset()
+    app.cart_store.get(BENCH_CART_ID).clear()
+    pipeline = FramePipeline(read_frame=read_frame, infer=partial(app.process_frame, view=view),
+                             on_results=on_results, render=partial(app.draw_overlay, view=view),
+                             fps=fps, frame_skip=frame_skip,
+                             gate=partial(app.gate_frame, view=view) if motion_gate else None)
+    pipeline.stats.max_samples = 1000000
+    pipeline.start()
+    # One preview client, as on the trolley screen; nothing is rendered or encoded without one
+    viewing = threading.Event()
+    viewing.set()
+    viewer = threading.Thread(target=watch, args=(pipeline, viewing), daemon=True)
+    viewer.start()
+    completed = wait_until_idle(pipeline, source, timeout)
+    summary = pipeline.summary()
+    viewing.clear()
+    pipeline.stop()
+    viewer.join(timeout=2)
+    source.release()
+
+    cart = app.cart_store.get(BENCH_CART_ID).snapshot()
+    summary.update({
+        "input": path,
+        "completed": completed,
+        "frames": len(capture_times),
+        "detection_to_cart": latency_summary(cart_latencies),
+        "cart": {item["name"]: item["quantity"] for item in cart["cart"]},
+    })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay benchmark of the detection pipeline")
+    parser.add_argument("inputs", nargs="+", help="Video files or directories of images")
+    parser.add_argument("--backend", default=None, help="Inference backend (torch, onnx, openvino); default from config")
+    parser.add_argument("--model", default=None, help="Model path; default from config")
+    parser.add_argument("--fps", type=float, default=None, help="Capture rate; default from config")
+    parser.add_argument("--frame-skip", type=int, default=None, help="Run inference every Nth frame; default from config")
+    parser.add_argument("--no-motion-gate", action="store_true", help="Run inference on every sampled frame")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds allowed per input")
+    parser.add_argument("--output", default=None, help="Write the JSON results to this file")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    os.environ["SMART_TROLLEY_STARTUP"] = "blocking"
+    os.environ["SMART_TROLLEY_ID"] = BENCH_CART_ID
+    # Replayed detections shouldn't land in (or wait on) the persistent carts
+    os.environ["SMART_TROLLEY_CART_DURABILITY"] = "off"
+    if args.backend:
+        os.environ["SMART_TROLLEY_BACKEND"] = args.backend
+    if args.model:
+        os.environ["SMART_TROLLEY_MODEL"] = os.path.abspath(args.model)
+
+    # The app prints per frame; keep stdout for the results
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import app
+        # Frames come from the replayed files, not the configured camera
+        for view in app.views:
+            view.camera.stop()
+        logging.getLogger().setLevel(logging.WARNING)
+        fps = args.fps or app.CONFIG_FPS
+        frame_skip = args.frame_skip or app.frame_skip
+        motion_gate = app.config["motion_gate"] and not args.no_motion_gate
+        runs = [replay(app, os.path.abspath(path), fps, frame_skip, args.timeout, motion_gate)
+                for path in args.inputs]
+
+    result = {
+        "commit": git_commit(),
+        "host": {"platform": platform.platform(), "machine": platform.machine(),
+                 "cpus": os.cpu_count(), "python": platform.python_version()},
+        "backend": app.INFERENCE_BACKEND,
+        "model": app.model_path,
+        "fps": fps,
+        "frame_skip": frame_skip,
+        "motion_gate": motion_gate,
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['backend']} on {result['host']['machine']} ({result['host']['cpus']} CPUs), "
+          f"commit {result['commit']}, fps={fps}, frame_skip={frame_skip}, motion_gate={motion_gate}")
+    for run in runs:
+        print(f"\n{run['input']}: {run['frames']} frames in {run['elapsed_s']:.1f}s"
+              f"{'' if run['completed'] else ' (timed out)'}")
+        print(f"  fps: captured {run['fps']['captured']}, inferred {run['fps']['inferred']}, "
+              f"encoded {run['fps']['encoded']}")
+        print(f"  skipped {run['counters'].get('skipped', 0)}, gated {run['counters'].get('gated', 0)}, "
+              f"dropped before inference "
+              f"{run['dropped']['inference']}, before encode {run['dropped']['encode']}")
+        for stage, stats in list(run["stages"].items()) + [("detection_to_cart", run["detection_to_cart"])]:
+            if stats["count"]:
+                print(f"  {stage:<18} p50 {stats['p50_ms']:8.2f} ms  p90 {stats['p90_ms']:8.2f} ms  "
+                      f"p99 {stats['p99_ms']:8.2f} ms  (n={stats['count']})")
+        print(f"  cart: {run['cart']}")
+
+
+if __name__ == "__main__":
+    main()
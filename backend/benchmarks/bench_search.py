@@ -0,0 +1,122 @@
+"""
+Product search benchmark.
+
+Builds the search index over a synthetic catalog of N product names (made from
+the words of products.json plus random brand-like words), then replays
+autocomplete sessions: every prefix of a query as it is typed, some with a typo.
+Reports the index build time and per-keystroke latency percentiles with an
+empty cache, with a warm cache, and for the old substring scan.
+
+    python backend/benchmarks/bench_search.py --skus 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from pipeline import latency_summary  # noqa: E402
+from search import SearchIndex  # noqa: E402
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+with open(os.path.join(project_root, 'backend', 'products.json'), 'r') as f:
+    products = json.load(f)
+catalog_words = sorted({word for name in products for word in name.split()})
+SIZES = ["50g", "100g", "200g", "500g", "1kg", "250ml", "1l", "Pack of 2", "Family Pack"]
+
+
+def random_word(rng):
+    syllables = ["ka", "ri", "mo", "ta", "ne", "su", "la", "vi", "do", "pa", "chi", "ro", "ge", "ba", "ni"]
+    return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def make_catalog(n, seed=0):
+    rng = random.Random(seed)
+    brands = [random_word(rng) for _ in range(max(50, n // 10))] + catalog_words
+    names = set(products)
+    while len(names) < n:
+        words = [rng.choice(brands)] + [rng.choice(catalog_words if rng.random() < 0.5 else brands)
+                                        for _ in range(rng.randint(1, 3))]
+        names.add(" ".join(words + [rng.choice(SIZES)]))
+    return sorted(names)
+
+
+def typo(rng, word):
+    if len(word) < 5:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]  # swap two neighbouring letters
+
+
+def sessions(names, count, seed=1):
+    """Queries as typed: every prefix of 1-2 words of a catalog name, a quarter with a typo."""
+    rng = random.Random(seed)
+    keystrokes = []
+    for _ in range(count):
+        words = rng.choice(names).split()[:rng.randint(1, 2)]
+        if rng.random() < 0.25:
+            words[-1] = typo(rng, words[-1])
+        query = " ".join(words)
+        keystrokes.extend(query[:i] for i in range(1, len(query) + 1))
+    return keystrokes
+
+
+def substring_scan(names, query):
+    query = query.lower().strip()
+    return [name for name in names if query in name.lower()]
+
+
+def timed(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append(time.perf_counter() - start)
+    return latency_summary(samples)
+
+
+def run(n, n_sessions, limit):
+    names = make_catalog(n)
+    queries = sessions(names, n_sessions)
+    start = time.perf_counter()
+    # Cache every replayed query, so the cached pass measures hits only
+    index = SearchIndex(names, cache_size=len(queries))
+    build = time.perf_counter() - start
+
+    def cold(query):
+        index._cache.clear()
+        index.search(query, limit)
+
+    result = {"skus": n, "tokens": len(index._index["tokens"]), "build_s": round(build, 3),
+              "keystrokes": len(queries), "cold": timed(cold, queries)}
+    timed(lambda q: index.search(q, limit), queries)  # fill the cache
+    result["cached"] = timed(lambda q: index.search(q, limit), queries)
+    result["substring_scan"] = timed(lambda q: substring_scan(names, q), queries[:500])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Product search benchmark")
+    parser.add_argument("--skus", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--sessions", type=int, default=200, help="Typed queries per catalog size")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = [run(n, args.sessions, args.limit) for n in args.skus]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(f"{r['skus']:>7} SKUs ({r['tokens']} tokens), index built in {r['build_s']:.2f}s, "
+              f"{r['keystrokes']} keystrokes")
+        for name in ("cold", "cached", "substring_scan"):
+            s = r[name]
+            print(f"  {name:<15} p50 {s['p50_ms']:8.3f} ms  p90 {s['p90_ms']:8.3f} ms  "
+                  f"p99 {s['p99_ms']:8.3f} ms  max {s['max_ms']:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Startup-time benchmark: launches backend/app.py and measures how long it takes
+until /healthz answers (HTTP port bound) and until /readyz reports ready
+(model loaded and warmed up). Exits non-zero when a limit is exceeded, so it
+can run in CI to catch cold start regressions.
+
+The app runs with the settings of config.json, except that it reads frames
+from a still image (or --source) instead of the cameras and keeps carts in
+memory, so runs never touch the webcam or the carts in data/carts.
+
+    python backend/benchmarks/bench_startup.py --runs 3 --max-healthz 2 --max-readyz 30
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, backend_dir)
+project_root = os.path.dirname(backend_dir)
+
+from config import CONFIG_PATH  # noqa: E402
+
+
+def wait_for(url, deadline, proc):
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"app.py exited with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{url} not ready before timeout")
+
+
+def isolated_env(workdir, source):
+    """Environment for app.py: config.json without its cameras, frames from `source`, carts in memory only."""
+    config = {}
+    if os.path.exists(CONFIG_PATH):
+        with open(CONFIG_PATH, "r") as f:
+            config = json.load(f)
+    config.pop("cameras", None)
+    if source is None:
+        frames_dir = os.path.join(workdir, "frames")
+        os.makedirs(frames_dir, exist_ok=True)
+        shutil.copy(os.path.join(project_root, "yolo", "Maggi.jpg"), frames_dir)
+        source = f"images:{frames_dir}"
+    config_path = os.path.join(workdir, "config.json")
+    with open(config_path, "w") as f:
+        json.dump(config, f)
+    return dict(os.environ, SMART_TROLLEY_CONFIG=config_path, SMART_TROLLEY_SOURCE=source,
+                SMART_TROLLEY_CART_DURABILITY="off", SMART_TROLLEY_CART_DIR=os.path.join(workdir, "carts"))
+
+
+def measure(port, timeout, mode, base_env):
+    env = dict(base_env, SMART_TROLLEY_PORT=str(port), SMART_TROLLEY_STARTUP=mode)
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=backend_dir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = start + timeout
+        healthz = wait_for(f"http://localhost:{port}/healthz", deadline, proc) - start
+        readyz = wait_for(f"http://localhost:{port}/readyz", deadline, proc) - start
+        return healthz, readyz
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Smart trolley startup-time benchmark")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--mode", choices=["background", "blocking"], default="background")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait per run")
+    parser.add_argument("--max-healthz", type=float, default=None, help="Fail if median time to /healthz exceeds this")
+    parser.add_argument("--max-readyz", type=float, default=None, help="Fail if median time to /readyz exceeds this")
+    parser.add_argument("--source", default=None,
+                        help="Frame source for the app (see frame_sources.make_source); default a still image")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = isolated_env(workdir, args.source)
+        runs = [measure(args.port, args.timeout, args.mode, env) for _ in range(args.runs)]
+    result = {
+        "mode": args.mode,
+        "runs": args.runs,
+        "healthz_s": round(statistics.median(r[0] for r in runs), 3),
+        "readyz_s": round(statistics.median(r[1] for r in runs), 3),
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{args.mode}: /healthz after {result['healthz_s']:.3f}s, /readyz after {result['readyz_s']:.3f}s "
+              f"(median of {args.runs})")
+
+    failed = False
+    if args.max_healthz is not None and result["healthz_s"] > args.max_healthz:
+        print(f"FAIL: /healthz took {result['healthz_s']:.3f}s > {args.max_healthz}s")
+        failed = True
+    if args.max_readyz is not None and result["readyz_s"] > args.max_readyz:
+        print(f"FAIL: /readyz took {result['readyz_s']:.3f}s > {args.max_readyz}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+SORT tracker benchmark: per-frame cost of Sort (one KalmanFilter per track)
+versus VectorizedSort (stacked arrays) as the number of objects grows, plus a
+check that both return the same tracks for the same detections.
+
+    python backend/benchmarks/bench_tracker.py --objects 10 50 100 300 --frames 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sort.sort import Sort, VectorizedSort, KalmanBoxTracker  # noqa: E402
+from filterpy.kalman import KalmanFilter  # noqa: E402,F401  (Sort imports it lazily; keep that out of the timings)
+
+
+def synthetic_sequence(n_objects, n_frames, seed=0):
+    """Boxes drifting on a grid with jitter, occasional misses and false positives."""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n_objects)))
+    origin = np.stack(np.meshgrid(np.arange(side), np.arange(side)), -1).reshape(-1, 2)[:n_objects] * 60.
+    velocity = rng.uniform(-1, 1, size=(n_objects, 2))
+    frames = []
+    for f in range(n_frames):
+        centre = origin + velocity * f + rng.normal(0, 1.0, size=(n_objects, 2))
+        boxes = np.concatenate((centre - 20, centre + 20, rng.uniform(0.5, 1, size=(n_objects, 1))), axis=1)
+        boxes = boxes[rng.random(n_objects) > 0.1]
+        if rng.random() < 0.2:
+            c = rng.uniform(0, side * 60, size=2)
+            boxes = np.concatenate((boxes, [[c[0] - 15, c[1] - 15, c[0] + 15, c[1] + 15, 0.6]]))
+        frames.append(boxes)
+    return frames
+
+
+def run(tracker_cls, frames, max_age, min_hits):
+    KalmanBoxTracker.count = 0
+    tracker = tracker_cls(max_age=max_age, min_hits=min_hits, iou_threshold=0.3)
+    outputs = []
+    start = time.perf_counter()
+    for dets in frames:
+        outputs.append(tracker.update(dets))
+    return (time.perf_counter() - start) / len(frames), outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SORT tracker benchmark")
+    parser.add_argument("--objects", type=int, nargs="+", default=[10, 50, 100, 300])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--max_age", type=int, default=20)
+    parser.add_argument("--min_hits", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.objects:
+        frames = synthetic_sequence(n, args.frames)
+        t_sort, out_sort = run(Sort, frames, args.max_age, args.min_hits)
+        t_vec, out_vec = run(VectorizedSort, frames, args.max_age, args.min_hits)
+        identical = all(a.shape == b.shape and np.array_equal(a[:, 4], b[:, 4]) and np.allclose(a, b)
+                        for a, b in zip(out_sort, out_vec))
+        results.append({"objects": n, "sort_ms": round(t_sort * 1000, 3),
+                        "vectorized_ms": round(t_vec * 1000, 3), "identical": identical})
+        if not args.json:
+            print(f"{n:>5} objects  Sort {t_sort * 1000:8.3f} ms/frame  "
+                  f"VectorizedSort {t_vec * 1000:8.3f} ms/frame  x{t_sort / t_vec:5.1f}  identical={identical}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
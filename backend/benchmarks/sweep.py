@@ -0,0 +1,373 @@
+"""
+Operating point sweep: input size, confidence threshold, inference backend and
+frame skip, measured for accuracy and latency on this machine.
+
+For every backend and imgsz the model runs once over the validation split of
+data.yaml (YOLO labels, see yolo/coco_to_yolo.py) at a low confidence, and
+mAP50, mAP50-95, precision, recall and F1 are derived for every confidence
+threshold from those detections. Latency is timed separately at each
+threshold (NMS cost depends on it), one image per call as the app makes
+them, over a sample of the validation images and session frames. Recorded sessions (videos or image directories, as in
+bench_pipeline.py) are replayed through the app's ROI crop, class lookup and
+product tracker for every conf and frame_skip, and the products counted are
+compared with the session's expected cart, a `<session>.cart.json` next to
+it such as {"Maggi Noodles": 2}.
+
+Every combination gets an accuracy (cart accuracy with sessions, otherwise
+mAP50) and a cost (p90 inference latency / frame_skip, in ms per captured
+frame). The report lists the Pareto frontier of the two, and the best
+combination whose inference keeps up with --fps is written as a config file
+the app loads with SMART_TROLLEY_CONFIG=<file> (or copy it to backend/config.json).
+
+    python backend/benchmarks/sweep.py --backends torch onnx --imgsz 320 416 512 640
+    python backend/benchmarks/sweep.py --sessions recordings/aisle.mp4 --fps 10 --recommend recommended.json
+"""
+import argparse
+import contextlib
+import glob
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+import yaml
+
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, backend_dir)
+project_root = os.path.dirname(backend_dir)
+yolo_dir = os.path.join(project_root, 'yolo')
+
+from config import CONFIG_PATH, load_config  # noqa: E402
+from inference import default_model_path, load_detector  # noqa: E402
+from pipeline import latency_summary  # noqa: E402
+from postprocess import ClassLookup, filter_detections  # noqa: E402
+from roi import crop_to_roi, parse_roi, roi_image_size, to_frame_coords  # noqa: E402
+from tracking import ProductTracker  # noqa: E402
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+# Detections for the accuracy curves are collected once at this confidence; higher thresholds are
+# filtered from them. Never used for timing: NMS at this threshold is much slower than at the real ones
+MIN_CONF = 0.01
+# Frames kept in memory to time inference at each threshold
+TIMING_FRAMES = 100
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def box_iou(a, b):
+    """IoU matrix of (N, 4) and (M, 4) [x1, y1, x2, y2] boxes."""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def read_labels(image_path, shape):
+    """(M, 5) [cls, x1, y1, x2, y2] ground truth of an image from its YOLO label file (images/ -> labels/)."""
+    parts = image_path.split(os.sep)
+    parts[len(parts) - 1 - parts[::-1].index("images")] = "labels"
+    path = os.path.splitext(os.sep.join(parts))[0] + ".txt"
+    if not os.path.exists(path):
+        return np.zeros((0, 5))
+    labels = np.loadtxt(path, ndmin=2).reshape(-1, 5)
+    h, w = shape[:2]
+    xc, yc, bw, bh = labels[:, 1] * w, labels[:, 2] * h, labels[:, 3] * w, labels[:, 4] * h
+    return np.stack([labels[:, 0], xc - bw / 2, yc - bh / 2, xc + bw / 2, yc + bh / 2], axis=1)
+
+
+def match(dets, gt):
+    """
+    (N, 10) true-positive flags of detections (sorted by confidence, descending)
+    at each IoU threshold: greedy, each ground-truth box matched at most once.
+    Greedy in confidence order means dropping low-confidence detections never
+    changes the matches of the others, so one matching serves every threshold.
+    """
+    tp = np.zeros((len(dets), len(IOU_THRESHOLDS)), dtype=bool)
+    if not len(dets) or not len(gt):
+        return tp
+    iou = box_iou(dets[:, :4], gt[:, 1:])
+    iou[dets[:, 5][:, None] != gt[:, 0][None, :]] = 0
+    for t, threshold in enumerate(IOU_THRESHOLDS):
+        taken = np.zeros(len(gt), dtype=bool)
+        for i in range(len(dets)):
+            candidates = np.where(~taken & (iou[i] >= threshold), iou[i], 0)
+            j = candidates.argmax()
+            if candidates[j] > 0:
+                taken[j] = True
+                tp[i, t] = True
+    return tp
+
+
+def average_precision(tp, n_gt):
+    """COCO-style 101-point interpolated AP per IoU threshold of (N, 10) tp flags sorted by confidence."""
+    if not n_gt:
+        return np.full(tp.shape[1], np.nan)
+    if not len(tp):
+        return np.zeros(tp.shape[1])
+    tpc = np.cumsum(tp, axis=0)
+    recall = tpc / n_gt
+    precision = tpc / np.arange(1, len(tp) + 1)[:, None]
+    # Precision envelope (monotonically decreasing), sampled at 101 recall points
+    precision = np.flip(np.maximum.accumulate(np.flip(precision, axis=0), axis=0), axis=0)
+    points = np.linspace(0, 1, 101)
+    ap = np.zeros(tp.shape[1])
+    for t in range(tp.shape[1]):
+        idx = np.searchsorted(recall[:, t], points, side="left")
+        sampled = np.where(idx < len(tp), precision[np.minimum(idx, len(tp) - 1), t], 0)
+        ap[t] = sampled.mean()
+    return ap
+
+
+def detection_metrics(records, conf):
+    """mAP50, mAP50-95, precision, recall and F1 of validation records at one confidence threshold."""
+    scores = np.concatenate([r["dets"][:, 4] for r in records]) if records else np.zeros(0)
+    classes = np.concatenate([r["dets"][:, 5] for r in records]) if records else np.zeros(0)
+    tp = np.concatenate([r["tp"] for r in records]) if records else np.zeros((0, len(IOU_THRESHOLDS)), bool)
+    gt_classes = np.concatenate([r["gt"][:, 0] for r in records]) if records else np.zeros(0)
+    keep = scores >= conf
+    scores, classes, tp = scores[keep], classes[keep], tp[keep]
+    aps = []
+    for cls in np.unique(gt_classes):
+        mine = classes == cls
+        order = np.argsort(-scores[mine], kind="stable")
+        aps.append(average_precision(tp[mine][order], int(np.count_nonzero(gt_classes == cls))))
+    aps = np.array(aps) if aps else np.zeros((1, len(IOU_THRESHOLDS)))
+    n_tp = int(tp[:, 0].sum())
+    precision = n_tp / len(tp) if len(tp) else 0.0
+    recall = n_tp / len(gt_classes) if len(gt_classes) else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"map50": round(float(np.nanmean(aps[:, 0])), 4), "map50_95": round(float(np.nanmean(aps)), 4),
+            "precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+
+
+def validation_images(data_yaml, split, limit):
+    with open(data_yaml, 'r') as f:
+        data = yaml.safe_load(f)
+    images_dir = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(data_yaml)), data[split]))
+    paths = sorted(p for p in glob.glob(os.path.join(images_dir, "**", "*"), recursive=True)
+                   if p.lower().endswith(IMAGE_EXTENSIONS))
+    return paths[:limit] if limit else paths
+
+
+def evaluate_validation(detector, paths, samples, max_samples):
+    """Detections and matches of the detector over the validation images; the first images go to `samples`."""
+    records = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"⚠️ Could Not Load Image: {path}")
+            continue
+        if len(samples) < max_samples:
+            samples.append((image, None))
+        dets = detector.predict([image])[0]
+        dets = dets[np.argsort(-dets[:, 4], kind="stable")]
+        gt = read_labels(path, image.shape)
+        records.append({"dets": dets, "gt": gt, "tp": match(dets, gt)})
+    return records
+
+
+def session_frames(path, skips, roi, detector, imgsz, samples, max_samples):
+    """
+    Detections (at MIN_CONF, as the app's process_frame) of the frames any
+    frame_skip would infer; the first ROI crops go to `samples`.
+    """
+    from frame_sources import file_source
+    source = file_source(path)
+    if not source.open():
+        raise RuntimeError(f"Cannot open {path}")
+    dets, index = {}, 0
+    while True:
+        frame = source.read()
+        if frame is None:
+            if source.finished:
+                break
+            continue
+        index += 1
+        if not any(index % skip == 0 for skip in skips):
+            continue
+        region, offset = crop_to_roi(frame, roi)
+        size = roi_image_size(region.shape, frame.shape, imgsz)
+        if len(samples) < max_samples:
+            samples.append((region, size))
+        dets[index] = to_frame_coords(detector.predict([region], imgsz=size)[0], offset)
+    source.release()
+    return dets, index
+
+
+def time_inference(detector, samples, conf):
+    """Per-call latency of the detector over the sampled frames with its threshold at `conf`."""
+    detector.conf = conf
+    latencies = []
+    try:
+        for frame, imgsz in samples:
+            start = time.perf_counter()
+            detector.predict([frame], imgsz=imgsz)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        detector.conf = MIN_CONF
+    return latencies
+
+
+def replay_cart(frame_dets, frames, lookup, conf, skip):
+    """Products counted by the tracker when inferring every `skip`th frame at `conf`."""
+    tracker = ProductTracker()
+    cart = {}
+    for index in range(skip, frames + 1, skip):
+        dets, cls_ids, _ = filter_detections(frame_dets[index], lookup, conf)
+        confirmed, _ = tracker.update(dets, cls_ids, index)
+        for _, cls_id, _ in confirmed:
+            product = lookup.products[cls_id]
+            cart[product] = cart.get(product, 0) + 1
+    return cart
+
+
+def cart_accuracy(counted, expected):
+    """1 - (wrong, missing and extra items) / expected items, at least 0."""
+    errors = sum(abs(counted.get(p, 0) - expected.get(p, 0)) for p in set(counted) | set(expected))
+    return max(0.0, 1.0 - errors / max(1, sum(expected.values())))
+
+
+def pareto(points):
+    """Points not dominated by any other (higher accuracy and lower cost), by cost."""
+    frontier = []
+    for p in sorted(points, key=lambda p: (p["cost_ms"], -p["accuracy"])):
+        if not frontier or p["accuracy"] > frontier[-1]["accuracy"]:
+            frontier.append(p)
+    return frontier
+
+
+def app_product_resolver(backend, model):
+    """The app's class name -> product mapping (importing app, as bench_pipeline.py does)."""
+    os.environ["SMART_TROLLEY_STARTUP"] = "blocking"
+    os.environ["SMART_TROLLEY_CART_DURABILITY"] = "off"
+    os.environ["SMART_TROLLEY_BACKEND"] = backend
+    os.environ["SMART_TROLLEY_MODEL"] = os.path.abspath(model)
+    # Left open: loggers set up during the import (ultralytics) keep writing to it
+    devnull = open(os.devnull, "w")
+    with contextlib.redirect_stdout(devnull):
+        import app
+        # Frames come from the sessions, not the configured cameras
+        for view in app.views:
+            view.camera.stop()
+    logging.getLogger().setLevel(logging.WARNING)
+    return app.normalize_class_name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=os.path.join(yolo_dir, 'data.yaml'))
+    parser.add_argument("--split", default="val")
+    parser.add_argument("--max-images", type=int, default=500, help="Validation images to use (0: all)")
+    parser.add_argument("--sessions", nargs="*", default=[], help="Recorded videos or image directories")
+    parser.add_argument("--backends", nargs="+", default=["torch"])
+    parser.add_argument("--model", default=None, help="Model path for a single backend; default best.pt or its export")
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[320, 416, 512, 640])
+    parser.add_argument("--conf", type=float, nargs="+", default=[0.25, 0.35, 0.5, 0.65])
+    parser.add_argument("--frame-skip", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--timing-frames", type=int, default=TIMING_FRAMES,
+                        help="Validation images and session frames timed at each conf")
+    parser.add_argument("--fps", type=float, default=None, help="Capture rate to keep up with; default from config")
+    parser.add_argument("--device", default=None, help="Default from config")
+    parser.add_argument("--output", default=None, help="Write every result as JSON to this file")
+    parser.add_argument("--recommend", default="recommended_config.json",
+                        help="Config file with the recommended settings")
+    args = parser.parse_args()
+
+    config = load_config()
+    fps = args.fps or config["fps"]
+    device = args.device or config["device"]
+    roi = parse_roi(config["roi"])
+    paths = validation_images(args.data, args.split, args.max_images)
+    expected = {}
+    for session in args.sessions:
+        with open(session.rstrip("/\\") + ".cart.json", "r") as f:
+            expected[session] = json.load(f)
+    if args.model and len(args.backends) > 1:
+        parser.error("--model needs a single --backends entry")
+    models = {backend: args.model or default_model_path(backend, yolo_dir) for backend in args.backends}
+    for backend, model in list(models.items()):
+        if not os.path.exists(model):
+            print(f"⚠️ Skipping {backend}: {model} not found (see yolo/export_model.py)")
+            del models[backend]
+    resolve = app_product_resolver(*next(iter(models.items()))) if args.sessions and models else None
+    print(f"{len(paths)} validation image(s), {len(args.sessions)} session(s), target {fps} fps on {device}")
+
+    points = []
+    for backend, model in models.items():
+        measured = set()
+        for imgsz in args.imgsz:
+            detector = load_detector(backend, model, device, imgsz, MIN_CONF)
+            if getattr(detector, "fixed_size", False):
+                # Static exports keep the size they were exported with
+                imgsz = detector.imgsz[0] if isinstance(detector.imgsz, tuple) else detector.imgsz
+            if imgsz in measured:
+                continue
+            measured.add(imgsz)
+            detector.predict([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)])  # warm-up
+            # Session crops first, as the app infers them; validation images fill the rest
+            samples = []
+            sessions = {s: session_frames(s, args.frame_skip, roi, detector, imgsz, samples, args.timing_frames)
+                        for s in args.sessions}
+            records = evaluate_validation(detector, paths, samples, args.timing_frames)
+            lookup = ClassLookup(detector.names, resolve) if resolve else None
+            for conf in args.conf:
+                latency = latency_summary(time_inference(detector, samples, conf))
+                print(f"{backend} imgsz={imgsz} conf={conf}: p50 {latency.get('p50_ms', 0):.1f} ms, "
+                      f"p90 {latency.get('p90_ms', 0):.1f} ms per inference")
+                metrics = detection_metrics(records, conf) if records else {}
+                for skip in args.frame_skip:
+                    point = {"inference_backend": backend, "imgsz": imgsz, "conf": conf, "frame_skip": skip,
+                             "latency": latency, "detection": metrics,
+                             "cost_ms": round(latency.get("p90_ms", 0) / skip, 3),
+                             # Inference must finish before the next sampled frame arrives
+                             "keeps_up": latency.get("p90_ms", 0) <= skip * 1000 / fps}
+                    if sessions:
+                        carts = {s: replay_cart(d, frames, lookup, conf, skip) for s, (d, frames) in sessions.items()}
+                        accuracies = [cart_accuracy(carts[s], expected[s]) for s in carts]
+                        point["carts"] = carts
+                        point["cart_accuracy"] = round(float(np.mean(accuracies)), 4)
+                    point["accuracy"] = point.get("cart_accuracy", metrics.get("map50", 0.0))
+                    points.append(point)
+    if not points:
+        print("❌ Nothing was measured")
+        return
+
+    frontier = pareto(points)
+    feasible = [p for p in frontier if p["keeps_up"]]
+    best = max(feasible or frontier, key=lambda p: (p["accuracy"], -p["cost_ms"]))
+    accuracy_name = "cart accuracy" if args.sessions else "mAP50"
+    print(f"\nPareto frontier ({accuracy_name} vs inference ms per captured frame):")
+    for p in frontier:
+        print(f"  {p['inference_backend']:<8} imgsz={p['imgsz']:<4} conf={p['conf']:<5} frame_skip={p['frame_skip']}  "
+              f"{accuracy_name} {p['accuracy']:.3f}  cost {p['cost_ms']:7.2f} ms"
+              f"{'' if p['keeps_up'] else f'  (too slow for {fps} fps)'}")
+
+    recommended = {"inference_backend": best["inference_backend"], "imgsz": best["imgsz"], "conf": best["conf"],
+                   "fps": fps, "frame_skip": best["frame_skip"]}
+    if args.model:
+        recommended["model_path"] = os.path.abspath(args.model)
+    # The current config.json with the recommended settings, so the file can replace it
+    saved = {}
+    if os.path.exists(CONFIG_PATH):
+        with open(CONFIG_PATH, "r") as f:
+            saved = json.load(f)
+    with open(args.recommend, "w") as f:
+        json.dump(dict(saved, **recommended), f, indent=2)
+    print(f"\nRecommended: {recommended}"
+          f"{'' if best['keeps_up'] else ' (no combination keeps up; lower --fps)'} -> {args.recommend}")
+    print(f"Start the app with SMART_TROLLEY_CONFIG={args.recommend} or copy it to backend/config.json")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"host": {"platform": platform.platform(), "machine": platform.machine(),
+                                "cpus": os.cpu_count(), "python": platform.python_version()},
+                       "device": device, "fps": fps, "validation_images": len(paths), "sessions": expected,
+                       "frontier": frontier, "recommended": recommended, "points": points}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
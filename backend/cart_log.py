@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+import re
+import threading
+
+SNAPSHOT_FILE = "snapshot.json"
+WAL_PATTERN = re.compile(r"^wal-(\d{8})\.log$")
+# Compact the log into a new snapshot once it grows past this
+COMPACT_BYTES = 4 * 1024 * 1024
+DURABILITY_MODES = ("sync", "async")
+RETRY_SECONDS = 1.0
+
+
+def _state(value):
+    # Logs written before next_id was kept hold just the item list
+    return {"items": value} if isinstance(value, list) else value
+
+
+def _fsync_dir(path):
+    # Makes a rename or a new file in the directory itself durable (no-op where unsupported)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class CartLog:
+    """
+    Write-ahead log of cart contents: every change appends the cart's full
+    state (items and next item id) as one JSON line, so recovery is "last
+    record per cart wins"
+    and a torn final line only loses that one change. Once the log passes
+    `compact_bytes` the latest state of every cart is written to
+    snapshot.json and a new log file is started.
+
+    One writer thread does all file I/O with group commit: records appended
+    while it is busy are written and fsynced together, so a burst of changes
+    costs one fsync, not one each. With durability "sync" wait() returns once
+    a record is on disk; with "async" it returns at once and the writer
+    commits in the background (a crash can lose the last few milliseconds).
+    """
+
+    def __init__(self, directory, durability="sync", compact_bytes=COMPACT_BYTES):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown cart durability {durability!r}, expected one of {DURABILITY_MODES}")
+        self.directory = directory
+        self.durability = durability
+        self.compact_bytes = compact_bytes
+        self.states = {}        # cart id -> state, as of the last committed record
+        self.generation = 0
+        self.records = 0
+        self.commits = 0
+        self.error = None
+        self._file = None
+        self._cond = threading.Condition()
+        self._pending = []
+        self._appended = 0      # sequence number of the last appended record
+        self._durable = 0       # ... and of the last one on disk
+        self._closing = False
+        self._stopped = False   # the writer has exited; nothing appended after this reaches disk
+        self._thread = None
+
+    def _wal_path(self, generation):
+        return os.path.join(self.directory, f"wal-{generation:08d}.log")
+
+    def _wal_generations(self):
+        return sorted(int(m.group(1)) for m in map(WAL_PATTERN.match, os.listdir(self.directory)) if m)
+
+    def open(self):
+        """Recover every cart from the snapshot and logs, compact them, and start the writer. Returns {cart id: state}."""
+        os.makedirs(self.directory, exist_ok=True)
+        states, first = {}, 0
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "r") as f:
+                snapshot = json.load(f)
+            states, first = snapshot["carts"], snapshot["next_wal"]
+            states = {cart_id: _state(state) for cart_id, state in states.items()}
+        generations = self._wal_generations()
+        replayed = 0
+        for generation in generations:
+            if generation < first:
+                continue
+            with open(self._wal_path(generation), "r") as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Only the record being written when the process died can be torn
+                        logging.warning(f"Ignoring unreadable cart log record {self._wal_path(generation)}:{line_number}")
+                        break
+                    states[record["cart"]] = _state(record.get("state", record.get("items")))
+                    replayed += 1
+        self.states = states
+        self.generation = max(generations + [first])
+        # Start from a fresh snapshot so recovery never replays these logs again
+        self._compact()
+        logging.info(f"Recovered {len(states)} cart(s) from {self.directory} ({replayed} log record(s))")
+        self._thread = threading.Thread(target=self._run, name="cart-log", daemon=True)
+        self._thread.start()
+        return dict(states)
+
+    def append(self, cart_id, state):
+        """Queue the new state of a cart (JSON-serializable, not modified afterwards); returns the sequence number to wait() for."""
+        with self._cond:
+            self._appended += 1
+            self._pending.append((cart_id, state))
+            self._cond.notify_all()
+            return self._appended
+
+    def wait(self, seq, timeout=None):
+        """
+        Block until record `seq` is on disk (durability "sync" only). Raises
+        OSError if it isn't: the log can't be written, was closed first, or
+        `timeout` passed.
+        """
+        if self.durability != "sync" or seq is None:
+            return
+        with self._cond:
+            self._cond.wait_for(lambda: self._durable >= seq or self.error is not None or self._stopped, timeout)
+            if self._durable < seq:
+                reason = self.error or ("log closed" if self._stopped else "timed out")
+                raise OSError(f"Cart log write failed: {reason}")
+
+    def close(self):
+        """Commit everything still queued and stop the writer."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        with self._cond:
+            # Waiters on records the writer didn't commit fail instead of blocking
+            self._stopped = True
+            self._cond.notify_all()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closing)
+                batch, self._pending = self._pending, []
+                last = self._appended
+                if not batch and self._closing:
+                    self._stopped = True
+                    self._cond.notify_all()
+                    return
+            data = "".join(json.dumps({"cart": cart_id, "state": state}, separators=(",", ":")) + "\n"
+                           for cart_id, state in batch).encode()
+            position = self._file.tell()
+            try:
+                self._file.write(data)
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                logging.error(f"Cart log write failed, retrying: {e}")
+                if self._closing:
+                    with self._cond:
+                        self.error = str(e)
+                        self._stopped = True
+                        self._cond.notify_all()
+                    return
+                try:
+                    # Drop a partial write so the log doesn't end in a torn record
+                    self._file.truncate(position)
+                    self._file.seek(position)
+                except OSError:
+                    pass
+                with self._cond:
+                    self.error = str(e)
+                    self._pending[:0] = batch
+                    self._cond.notify_all()
+                    self._cond.wait(RETRY_SECONDS)
+                continue
+            for cart_id, state in batch:
+                self.states[cart_id] = state
+            with self._cond:
+                self.records += len(batch)
+                self.commits += 1
+                self._durable = last
+                self.error = None
+                self._cond.notify_all()
+            if self._file.tell() >= self.compact_bytes:
+                try:
+                    self._compact()
+                except OSError as e:
+                    logging.error(f"Cart log compaction failed: {e}")
+
+    def _compact(self):
+        """Write the current states as the snapshot and switch to a new, empty log file."""
+        generation = self.generation + 1
+        new_file = open(self._wal_path(generation), "ab", buffering=0)
+        # Emptied carts stay while they have handed out ids, so ids are never reused after a restart
+        snapshot = {"next_wal": generation,
+                    "carts": {cart_id: state for cart_id, state in self.states.items()
+                              if state["items"] or state.get("next_id")}}
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        _fsync_dir(self.directory)
+        if self._file is not None:
+            self._file.close()
+        self._file, self.generation = new_file, generation
+        # Logs before the new snapshot are covered by it
+        for old in self._wal_generations():
+            if old < generation:
+                os.remove(self._wal_path(old))
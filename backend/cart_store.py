@@ -0,0 +1,309 @@
+import json
+import re
+import threading
+from collections import deque
+
+DEFAULT_CART_ID = "default"
+CART_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+MAX_PENDING_PROMPTS = 50
+# Events kept per cart so reconnecting clients can resume from Last-Event-ID
+MAX_EVENTS = 200
+
+
+def empty_snapshot():
+    """What a cart that doesn't exist yet reads as (version 0, before any change)."""
+    return {"cart": [], "total": 0, "item_count": 0, "version": 0}
+
+
+def empty_state():
+    """current_state() of a cart that doesn't exist yet."""
+    return (0, "cart", json.dumps(empty_snapshot()))
+
+
+class Cart:
+    """
+    Shopping cart of a single trolley. Every method takes the cart's own lock,
+    so different trolleys never contend with each other.
+
+    Items are indexed by id and by product name; ids are never reused, and the
+    total and item count are kept up to date on every change instead of being
+    summed per request. `version` increases with every change; the serialized
+    snapshot is cached per version and shared by /cart, its ETag and the event
+    stream.
+
+    With a CartLog every change is logged; mutators return once the change is
+    durable, waiting for the log's group commit after releasing the lock so
+    other changes to the cart can join the same commit.
+    """
+
+    def __init__(self, cart_id, log=None, state=None):
+        self.id = cart_id
+        self.log = log
+        self.lock = threading.RLock()
+        self.items = {}     # id -> item, in the order they were added
+        self.by_name = {}   # product name -> id
+        self.next_id = 0
+        self.total = 0
+        self.item_count = 0
+        self.version = 0
+        self._encoded = None  # (version, JSON snapshot)
+        if state:
+            for item in state["items"]:
+                self._insert(dict(item))
+            self.next_id = max(self.next_id, state.get("next_id", 0))
+        # Prompts for the trolley screen (new item added / duplicate detected) not yet
+        # delivered to it, as (event_id, prompt): served by /prompt, dropped once an event stream sends them
+        self.prompts = deque(maxlen=MAX_PENDING_PROMPTS)
+        # Change feed for push clients: (event_id, event_type, json_data)
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.event_id = 0
+        self.changed = threading.Condition(self.lock)
+        # Called with no arguments after every event, e.g. to wake async streams
+        self.listeners = []
+
+    def _insert(self, item):
+        self.items[item['id']] = item
+        self.by_name[item['name']] = item['id']
+        self.next_id = max(self.next_id, item['id'] + 1)
+        self.total += item['price'] * item['quantity']
+        self.item_count += item['quantity']
+
+    def _find(self, item_id=None, name=None):
+        if name is not None:
+            item_id = self.by_name.get(name)
+        return self.items.get(item_id)
+
+    def _new_item(self, name, product):
+        item = {
+            "id": self.next_id,
+            "name": name,
+            "price": product['price'],
+            "description": product['description'],
+            "quantity": 1
+        }
+        self._insert(item)
+        return item
+
+    def _set_quantity(self, item, quantity):
+        delta = quantity - item['quantity']
+        item['quantity'] = quantity
+        self.total += item['price'] * delta
+        self.item_count += delta
+
+    def _remove(self, item):
+        del self.items[item['id']]
+        del self.by_name[item['name']]
+        self.total -= item['price'] * item['quantity']
+        self.item_count -= item['quantity']
+
+    def _snapshot(self):
+        return {
+            "cart": [dict(item) for item in self.items.values()],
+            "total": self.total,
+            "item_count": self.item_count,
+            "version": self.version,
+        }
+
+    def snapshot(self):
+        with self.lock:
+            return self._snapshot()
+
+    def _encoded_snapshot(self):
+        if self._encoded is None or self._encoded[0] != self.version:
+            self._encoded = (self.version, json.dumps(self._snapshot()))
+        return self._encoded[1]
+
+    def encoded_snapshot(self):
+        """(version, snapshot as JSON); serialized once per version."""
+        with self.lock:
+            return self.version, self._encoded_snapshot()
+
+    def _publish(self, event_type, data):
+        # Serialized once here, shared by every subscriber
+        self.event_id += 1
+        self.events.append((self.event_id, event_type, data if isinstance(data, str) else json.dumps(data)))
+        self.changed.notify_all()
+        for listener in self.listeners:
+            listener()
+
+    def _cart_changed(self):
+        """Publish the new contents; returns the log sequence number to _wait_durable() for."""
+        self.version += 1
+        self._publish("cart", self._encoded_snapshot())
+        if not self.log:
+            return None
+        return self.log.append(self.id, {"items": [dict(item) for item in self.items.values()],
+                                         "next_id": self.next_id})
+
+    def _wait_durable(self, seq):
+        if self.log and seq is not None:
+            self.log.wait(seq)
+
+    def current_state(self):
+        """The cart snapshot as an event, sent to clients when they first connect."""
+        with self.lock:
+            return (self.event_id, "cart", self._encoded_snapshot())
+
+    def events_since(self, last_id, timeout=None):
+        """
+        Wait until there are events newer than `last_id` and return them. A client
+        that fell behind the retained history gets the prompts still retained plus
+        a fresh cart snapshot; one from before a restart only gets the snapshot.
+        """
+        with self.lock:
+            if last_id > self.event_id:
+                return [self.current_state()]
+            self.changed.wait_for(lambda: self.event_id > last_id, timeout)
+            if self.event_id <= last_id:
+                return []
+            pending = [e for e in self.events if e[0] > last_id]
+            if not pending or pending[0][0] != last_id + 1:
+                pending = [e for e in pending if e[1] != "cart"]
+                pending.append(self.current_state())
+            # The screen got these prompts from the stream; /prompt pollers must not show them again
+            delivered = max((e[0] for e in pending if e[1] == "prompt"), default=0)
+            while self.prompts and self.prompts[0][0] <= delivered:
+                self.prompts.popleft()
+            return pending
+
+    def add_product(self, name, product):
+        """Add one unit of a product (manual add from search)."""
+        with self.lock:
+            item = self._find(name=name)
+            if item is not None:
+                self._set_quantity(item, item['quantity'] + 1)
+                created = False
+            else:
+                item, created = self._new_item(name, product), True
+            seq = self._cart_changed()
+        self._wait_durable(seq)
+        return item, created
+
+    def add_detection(self, name, product):
+        """
+        Handle a product detected by the camera: new products are added, products
+        already in the cart only raise a prompt so the shopper can confirm.
+        """
+        seq = None
+        with self.lock:
+            item = self._find(name=name)
+            if item is not None:
+                # Do not increment quantity here; prompt user via modal
+                prompt = {
+                    "action": "prompt",
+                    "item": {
+                        "id": item['id'],
+                        "name": name,
+                        "price": product['price'],
+                        "description": product['description'],
+                        "quantity": item['quantity']
+                    }
+                }
+            else:
+                prompt = {"action": "add", "item": dict(self._new_item(name, product))}
+            # Prompt first so the screen can animate the new item when the cart arrives
+            self._publish("prompt", prompt)
+            self.prompts.append((self.event_id, prompt))
+            if prompt["action"] == "add":
+                seq = self._cart_changed()
+        self._wait_durable(seq)
+        return prompt
+
+    def update_item(self, item_id, action):
+        with self.lock:
+            item = self._find(item_id=item_id)
+            if item is None:
+                return False
+            if action == 'increment':
+                self._set_quantity(item, item['quantity'] + 1)
+            elif action == 'decrement' and item['quantity'] > 1:
+                self._set_quantity(item, item['quantity'] - 1)
+            elif action == 'remove':
+                self._remove(item)
+            else:
+                # Nothing changed (decrement at 1, unknown action): keep the version, ETag and log as they are
+                return True
+            seq = self._cart_changed()
+        self._wait_durable(seq)
+        return True
+
+    def remove_item(self, item_id):
+        with self.lock:
+            item = self._find(item_id=item_id)
+            if item is None:
+                return False
+            self._remove(item)
+            seq = self._cart_changed()
+        self._wait_durable(seq)
+        return True
+
+    def clear(self):
+        with self.lock:
+            # Ids keep counting up, so a stale id from before the clear never hits a new item
+            self.items, self.by_name = {}, {}
+            self.total = self.item_count = 0
+            seq = self._cart_changed()
+        self._wait_durable(seq)
+
+    def pop_prompt(self):
+        with self.lock:
+            return self.prompts.popleft()[1] if self.prompts else None
+
+
+class CartStore:
+    """
+    Carts keyed by trolley id. The store lock is only held to look up or create
+    a cart. With a CartLog the carts are recovered from it on start and every
+    change is logged.
+
+    Only get() creates carts, and only changes should use it: read-only
+    requests use find(), so looking at a cart id never adds it to the store.
+    """
+
+    def __init__(self, log=None):
+        self._carts = {}
+        self._lock = threading.Lock()
+        self._created = threading.Condition(self._lock)
+        # Called with the new cart after one is created, e.g. to wake async event streams
+        self.listeners = []
+        self.log = log
+        if log is not None:
+            for cart_id, state in log.open().items():
+                self._carts[cart_id] = Cart(cart_id, log, state)
+
+    @staticmethod
+    def valid_id(cart_id):
+        return bool(CART_ID_PATTERN.fullmatch(cart_id or ""))
+
+    def get(self, cart_id):
+        cart = self._carts.get(cart_id)
+        if cart is not None:
+            return cart
+        if not self.valid_id(cart_id):
+            raise ValueError(f"Invalid cart id: {cart_id!r}")
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is not None:
+                return cart
+            cart = self._carts[cart_id] = Cart(cart_id, self.log)
+            self._created.notify_all()
+        for listener in self.listeners:
+            listener(cart)
+        return cart
+
+    def find(self, cart_id):
+        """The cart with this id, or None if it doesn't exist; never creates one."""
+        return self._carts.get(cart_id)
+
+    def wait_for(self, cart_id, timeout=None):
+        """Block until the cart exists (at most `timeout` seconds); returns it or None."""
+        with self._created:
+            self._created.wait_for(lambda: cart_id in self._carts, timeout)
+            return self._carts.get(cart_id)
+
+    def ids(self):
+        with self._lock:
+            return list(self._carts)
+
+    def __len__(self):
+        return len(self._carts)
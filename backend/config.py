@@ -0,0 +1,91 @@
+import json
+import os
+import platform
+
+CONFIG_PATH = os.environ.get(
+    "SMART_TROLLEY_CONFIG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"))
+
+IS_MAC = platform.system() == 'Darwin'
+
+# Platform-specific performance tuning: Apple GPU can run every frame, CPU hosts
+# need a lower FPS and frame skip
+DEFAULTS = {
+    "trolley_id": "default",
+    "port": 8080,
+    "startup": "background",        # background | blocking
+    "server": "threaded",           # threaded (werkzeug) | async (aiohttp event loop, see async_server.py)
+    "async_workers": 16,            # async server: threads for the Flask routes
+    "inference_backend": "torch",   # torch | onnx | openvino
+    "model_path": None,             # None: yolo/best.pt or its export for the backend
+    "source": "device:0,1",         # frame source, see frame_sources.make_source()
+    "cart_durability": "sync",      # sync (changes on disk before returning) | async | off (memory only)
+    "cart_dir": None,               # None: data/carts in the project root
+    "roi": None,                    # [x1, y1, x2, y2] fractions of the frame; None: whole frame
+    "cameras": None,                # several cameras: [{"source": ..., "roi": ..., "name": ...}]; None: source/roi
+    "device": "mps" if IS_MAC else "cpu",
+    "imgsz": 512,
+    "conf": 0.5,
+    "lean_inference": True,         # torch: run the model directly, not via the ultralytics predictor
+    "inference_workers": None,      # None: in-process, or a worker per camera if several; 0: in-process;
+                                    # N: N worker processes; -1: sized to the cores
+    "fps": 30 if IS_MAC else 4,
+    "frame_skip": 1 if IS_MAC else 3,
+    "motion_gate": True,            # skip inference while the basket view is static
+    "motion_sensitivity": 0.5,      # 0..1, higher reacts to smaller changes
+    "motion_refresh_seconds": 5.0,  # run inference at least this often anyway
+}
+
+# Environment variables override both the defaults and config.json
+ENV_OVERRIDES = {
+    "SMART_TROLLEY_ID": "trolley_id",
+    "SMART_TROLLEY_PORT": "port",
+    "SMART_TROLLEY_STARTUP": "startup",
+    "SMART_TROLLEY_SERVER": "server",
+    "SMART_TROLLEY_CART_DURABILITY": "cart_durability",
+    "SMART_TROLLEY_CART_DIR": "cart_dir",
+    "SMART_TROLLEY_BACKEND": "inference_backend",
+    "SMART_TROLLEY_MODEL": "model_path",
+    "SMART_TROLLEY_DEVICE": "device",
+    "SMART_TROLLEY_INFERENCE_WORKERS": "inference_workers",
+    "SMART_TROLLEY_SOURCE": "source",
+}
+
+# Settings whose default is None but whose environment value is not a string
+OPTIONAL_TYPES = {"inference_workers": int}
+
+
+def _coerce(key, value):
+    default = DEFAULTS.get(key)
+    if default is None and key in OPTIONAL_TYPES:
+        return OPTIONAL_TYPES[key](value)
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes")
+    if isinstance(default, (int, float)):
+        return type(default)(value)
+    return value
+
+
+def save_config(updates, path=CONFIG_PATH):
+    """Merge `updates` into config.json (defaults and environment overrides are not written)."""
+    saved = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            saved = json.load(f)
+    saved.update(updates)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(saved, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_config(path=CONFIG_PATH):
+    """Defaults, then config.json (if present), then SMART_TROLLEY_* environment variables."""
+    config = dict(DEFAULTS)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            config.update(json.load(f))
+    for env, key in ENV_OVERRIDES.items():
+        if env in os.environ:
+            config[key] = _coerce(key, os.environ[env])
+    return config
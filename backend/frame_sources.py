@@ -0,0 +1,314 @@
+import logging
+import os
+import threading
+import time
+
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+class DeviceSource:
+    """
+    Local camera. open() tries each device index in turn and keeps the first
+    one that delivers a frame.
+    """
+
+    def __init__(self, indices=(0, 1), first_frame_tries=5):
+        self.indices = list(indices)
+        self.first_frame_tries = first_frame_tries
+        self.capture = None
+        self.index = None
+        self.finished = False
+        self.fps = None
+
+    def open(self):
+        for index in self.indices:
+            logging.info(f"Trying to initialize camera at index {index}")
+            capture = cv2.VideoCapture(index)
+            if not capture.isOpened():
+                logging.warning(f"Camera not opened at index {index}")
+                capture.release()
+                continue
+            for i in range(self.first_frame_tries):
+                ret, frame = capture.read()
+                if ret and frame is not None:
+                    logging.info(f"First frame read successfully after {i+1} tries at index {index}")
+                    self.capture, self.index = capture, index
+                    return True
+                time.sleep(0.2)
+            logging.warning(f"Failed to read first frame after camera initialization at index {index}")
+            capture.release()
+        return False
+
+    def read(self):
+        if self.capture is None:
+            return None
+        ret, frame = self.capture.read()
+        return frame if ret else None
+
+    def release(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+
+class StreamSource:
+    """Network stream (RTSP, HTTP MJPEG, ...) read through OpenCV's FFmpeg backend."""
+
+    def __init__(self, url):
+        self.url = url
+        self.capture = None
+        self.finished = False
+        self.fps = None
+
+    def open(self):
+        self.capture = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
+        # Keep the decoder from queueing stale frames behind a slow pipeline
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return self.capture.isOpened()
+
+    def read(self):
+        if self.capture is None:
+            return None
+        ret, frame = self.capture.read()
+        return frame if ret else None
+
+    def release(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+
+class VideoFileSource:
+    """Frames of a recorded video file, in order; read() returns None once it is exhausted."""
+
+    def __init__(self, path):
+        self.path = path
+        self.capture = None
+        self.finished = False
+
+    def open(self):
+        self.capture = cv2.VideoCapture(self.path)
+        self.finished = False
+        return self.capture.isOpened()
+
+    @property
+    def fps(self):
+        fps = self.capture.get(cv2.CAP_PROP_FPS) if self.capture is not None else 0
+        return fps or None
+
+    def read(self):
+        if self.capture is None or self.finished:
+            return None
+        ret, frame = self.capture.read()
+        if not ret or frame is None:
+            self.finished = True
+            return None
+        return frame
+
+    def release(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+
+class ImageDirectorySource:
+    """Images of a directory in file name order, one frame each."""
+
+    def __init__(self, path):
+        self.path = path
+        self.files = []
+        self.position = 0
+        self.finished = False
+        self.fps = None
+
+    def open(self):
+        self.files = sorted(
+            os.path.join(self.path, name) for name in os.listdir(self.path)
+            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.position = 0
+        self.finished = not self.files
+        return bool(self.files)
+
+    def read(self):
+        while self.position < len(self.files):
+            frame = cv2.imread(self.files[self.position])
+            self.position += 1
+            if frame is not None:
+                return frame
+        self.finished = True
+        return None
+
+    def release(self):
+        self.files = []
+
+
+def file_source(path):
+    """Frame source for a video file or a directory of images."""
+    if os.path.isdir(path):
+        return ImageDirectorySource(path)
+    return VideoFileSource(path)
+
+
+def make_source(spec):
+    """
+    Frame source from a config string:
+      "device" or "device:0,1" - local cameras, first index that delivers a frame
+      "file:<path>"            - video file
+      "images:<dir>"           - directory of images
+      "rtsp://...", "http://..." (any URL) - network stream
+      "<path>"                 - video file or image directory
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "device":
+        return DeviceSource([int(i) for i in arg.split(",")] if arg else [0, 1])
+    if kind == "file":
+        return VideoFileSource(arg)
+    if kind == "images":
+        return ImageDirectorySource(arg)
+    if "://" in spec:
+        return StreamSource(spec)
+    return file_source(spec)
+
+
+class CameraManager:
+    """
+    Opens a frame source in a background thread and keeps it open: failed
+    opens and lost live sources are retried with exponential backoff. read()
+    never waits for (re)connection, it returns None until the source is open,
+    so neither request handlers nor the capture stage stall on a camera.
+
+    States: stopped, opening, open, retrying (waiting for the next attempt),
+    reconnecting (a live source stopped delivering frames), finished (a file
+    source reached its end).
+    """
+
+    def __init__(self, spec, initial_backoff=0.5, max_backoff=30.0, max_read_failures=10):
+        self.spec = spec
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_read_failures = max_read_failures
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.source = None
+        self.state = "stopped"
+        self.attempts = 0
+        self.reconnects = 0
+        self.frames = 0
+        self.failures = 0
+        self.last_error = None
+        self.retry_at = None
+        self.opened_at = None
+
+    def start(self):
+        """Begin opening the source in the background; no-op if already started."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            # Each run gets its own source and stop event, so a run stuck in a
+            # slow open() can be abandoned by stop() without racing a restart
+            self._stop, self._wake = threading.Event(), threading.Event()
+            self.source = make_source(self.spec)
+            self.state = "opening"
+            self.attempts = self.failures = 0
+            self.last_error = self.retry_at = None
+            self._thread = threading.Thread(target=self._run, args=(self.source, self._stop, self._wake),
+                                            name="camera-manager", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=2.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stop.set()
+            self._wake.set()
+            self.state = "stopped"
+            self.retry_at = None
+        if thread is not None:
+            thread.join(timeout=timeout)
+            if thread.is_alive():
+                logging.warning(f"Camera thread still opening {self.spec} after {timeout}s; it will release the source when done")
+
+    def read(self):
+        """Next frame, or None while the source is not open."""
+        # Reads happen outside self._lock so a slow network read never blocks status()
+        with self._read_lock:
+            with self._lock:
+                if self.state != "open":
+                    return None
+                source = self.source
+            frame = source.read()
+            with self._lock:
+                if frame is not None:
+                    self.failures = 0
+                    self.frames += 1
+                    return frame
+                if self.state != "open" or source is not self.source:
+                    return None
+                if source.finished:
+                    self.state = "finished"
+                    logging.info(f"Frame source {self.spec} finished")
+                    return None
+                self.failures += 1
+                if self.failures >= self.max_read_failures:
+                    logging.warning(f"Frame source {self.spec} stopped delivering frames, reconnecting")
+                    self.state = "reconnecting"
+                    self.reconnects += 1
+                    self._wake.set()
+                return None
+
+    def status(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "source": self.spec,
+                "attempts": self.attempts,
+                "reconnects": self.reconnects,
+                "frames": self.frames,
+                "last_error": self.last_error,
+                "retry_in": round(max(0.0, self.retry_at - time.time()), 2) if self.retry_at else None,
+                "open_since": self.opened_at if self.state == "open" else None,
+            }
+
+    def _run(self, source, stop, wake):
+        delay = self.initial_backoff
+        try:
+            while not stop.is_set():
+                with self._lock:
+                    needs_open = not stop.is_set() and self.state in ("opening", "retrying", "reconnecting")
+                if not needs_open:
+                    wake.wait()
+                    wake.clear()
+                    continue
+                with self._read_lock:
+                    source.release()
+                with self._lock:
+                    self.attempts += 1
+                try:
+                    ok = source.open()
+                    error = None if ok else "could not open source"
+                except Exception as e:
+                    ok, error = False, str(e)
+                with self._lock:
+                    if stop.is_set():
+                        break
+                    if ok:
+                        self.state = "open"
+                        self.failures = 0
+                        self.last_error = self.retry_at = None
+                        self.opened_at = time.time()
+                        delay = self.initial_backoff
+                        logging.info(f"Frame source {self.spec} opened after {self.attempts} attempt(s)")
+                        continue
+                    self.state = "retrying"
+                    self.last_error = error
+                    self.retry_at = time.time() + delay
+                logging.warning(f"Frame source {self.spec}: {error}; retrying in {delay:.1f}s")
+                stop.wait(delay)
+                delay = min(delay * 2, self.max_backoff)
+        finally:
+            with self._read_lock:
+                source.release()
@@ -0,0 +1,70 @@
+import threading
+import time
+
+# Seconds an item stays linkable after the last camera tracking it lost it
+# (e.g. a hand covers it in one view while another view confirms it)
+FUSION_WINDOW = 2.0
+
+
+class ViewFusion:
+    """
+    Counts each physical item once across the cameras of a trolley.
+
+    Every camera tracks products in its own image (ProductTracker) and reports
+    tracks as they are confirmed. Cameras are not calibrated to each other, so
+    views are matched by product: a track confirmed by one camera is linked to
+    an item of the same product that another camera is already tracking but
+    this one isn't, and only counted when there is no such item. The number of
+    items of a product is therefore the most any single camera sees at once,
+    and an item keeps its count while at least one view still tracks it (or
+    for `window` seconds after the last one lost it). A camera that hasn't
+    reported for `window` seconds (stopped or failing) no longer tracks anything.
+    """
+
+    def __init__(self, window=FUSION_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.items = []     # {"product", "tracks": {camera: track id}, "seen_at"}
+            self.reported = {}  # camera -> time of its last update
+            self.merged = 0     # confirmed tracks linked to an item another camera counted
+
+    def update(self, camera, confirmed, alive, now=None):
+        """
+        Params:
+          camera - name of the reporting camera
+          confirmed - [(track_id, product, score)] tracks this camera just confirmed
+          alive - ids of this camera's confirmed tracks still being tracked
+        Returns the entries of `confirmed` that are new items (to be counted).
+        """
+        now = time.monotonic() if now is None else now
+        alive = set(alive)
+        new_items = []
+        with self._lock:
+            self.reported[camera] = now
+            silent = {c for c, at in self.reported.items() if now - at > self.window}
+            for item in self.items:
+                if item["tracks"].get(camera, None) not in alive:
+                    item["tracks"].pop(camera, None)
+                for other in silent.intersection(item["tracks"]):
+                    del item["tracks"][other]
+                if item["tracks"]:
+                    item["seen_at"] = now
+            self.items = [item for item in self.items if item["tracks"] or now - item["seen_at"] <= self.window]
+            for entry in confirmed:
+                track_id, product = entry[0], entry[1]
+                candidates = [item for item in self.items
+                              if item["product"] == product and camera not in item["tracks"]]
+                if candidates:
+                    # Another view's item this camera isn't tracking yet: the same one, seen again
+                    item = max(candidates, key=lambda i: i["seen_at"])
+                    self.merged += 1
+                else:
+                    item = {"product": product, "tracks": {}, "seen_at": now}
+                    self.items.append(item)
+                    new_items.append(entry)
+                item["tracks"][camera] = track_id
+        return new_items
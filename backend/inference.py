@@ -0,0 +1,271 @@
+import ast
+import os
+
+import cv2
+import numpy as np
+
+from postprocess import to_array
+
+# Backend name -> default model file, relative to the yolo/ directory
+# (the exports are produced by yolo/export_model.py)
+BACKENDS = {
+    "torch": "best.pt",
+    "onnx": "best.onnx",
+    "openvino": "best_openvino_model",
+}
+
+# Letterbox padding colour and class offset for class-aware NMS, as in ultralytics
+PAD_VALUE = 114
+MAX_WH = 7680
+
+
+def default_model_path(backend, yolo_dir):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {sorted(BACKENDS)}")
+    return os.path.join(yolo_dir, BACKENDS[backend])
+
+
+class UltralyticsDetector:
+    """
+    Runs a model through ultralytics: the PyTorch best.pt or its OpenVINO export
+    (ultralytics drives the OpenVINO runtime itself for *_openvino_model dirs).
+    """
+
+    def __init__(self, path, device, imgsz, conf):
+        # ultralytics pulls in torch; importing it here keeps it off the server's startup path
+        from ultralytics import YOLO
+        self.model = YOLO(path, task="detect")
+        self.imgsz = imgsz
+        self.conf = conf
+        # Exports have a static input shape; only PyTorch models can change size per call
+        self.fixed_size = not path.endswith(".pt")
+        if path.endswith(".pt"):
+            try:
+                self.model.to(device)
+                print(f"YOLO Model loaded on device: {device}")
+            except Exception as e:
+                print(f"Could not set YOLO device: {e}")
+        self.names = self.model.names
+
+    def predict(self, frames, imgsz=None):
+        """(N, 6) [x1, y1, x2, y2, conf, cls] arrays, one per frame; imgsz overrides the input size of .pt models."""
+        imgsz = imgsz if imgsz and not self.fixed_size else self.imgsz
+        results = self.model(frames, conf=self.conf, imgsz=imgsz, batch=len(frames), verbose=False)
+        return [to_array(r) for r in results]
+
+
+class ArrayDetector:
+    """
+    Lean inference path shared by the ONNX Runtime and PyTorch detectors:
+    frames are letterboxed straight into preallocated buffers (a uint8 canvas
+    and the float32 NCHW input blob, one set per input shape, reused across
+    frames) and the raw YOLO head output is decoded into (N, 6) arrays with
+    NumPy and OpenCV NMS, without building ultralytics Results objects.
+
+    Not thread safe: the buffers are shared, callers serialize predict().
+    """
+
+    stride = 32
+    auto = False        # pad only to a multiple of stride instead of the full square (like ultralytics for .pt)
+    fixed_batch = None
+    fixed_size = False
+    max_buffers = 8
+
+    def __init__(self, imgsz, conf, iou=0.7, max_det=300):
+        self.imgsz = (imgsz, imgsz)
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self._buffers = {}
+        self._layouts = {}   # canvas shape -> (resized size, pad) last drawn on it
+
+    def _buffer(self, key, shape, dtype):
+        buf = self._buffers.get(key)
+        if buf is None:
+            if len(self._buffers) >= self.max_buffers:
+                # Input shapes changed (new camera, ROI); drop the old buffers
+                self._buffers.clear()
+                self._layouts.clear()
+            buf = self._buffers[key] = np.zeros(shape, dtype=dtype)
+        return buf
+
+    def _geometry(self, shape, size, auto):
+        """(padded input shape, resized (w, h), gain, (pad_x, pad_y)) of a letterbox, as in ultralytics."""
+        h, w = shape
+        out_h, out_w = size
+        gain = min(out_h / h, out_w / w)
+        new_w, new_h = int(round(w * gain)), int(round(h * gain))
+        dw, dh = out_w - new_w, out_h - new_h
+        if auto:
+            dw, dh = dw % self.stride, dh % self.stride
+        dw, dh = dw / 2, dh / 2
+        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        return (new_h + top + bottom, new_w + left + right), (new_w, new_h), gain, (left, top)
+
+    def _prepare(self, frames, size):
+        """Letterbox `frames` into the reused input blob; returns (blob, per-frame (gain, pad, shape))."""
+        auto = self.auto and len({f.shape for f in frames}) == 1
+        geometries = [self._geometry(f.shape[:2], size, auto) for f in frames]
+        input_shape = geometries[0][0]
+        batch = self.fixed_batch or len(frames)
+        blob = self._buffer(("blob", batch) + input_shape, (batch, 3) + input_shape, np.float32)
+        canvas = self._buffer(("canvas",) + input_shape, input_shape + (3,), np.uint8)
+        transforms = []
+        for i, (frame, (_, (new_w, new_h), gain, (left, top))) in enumerate(zip(frames, geometries)):
+            if self._layouts.get(input_shape) != ((new_w, new_h), (left, top)):
+                # Padding only needs repainting when the layout changes
+                canvas.fill(PAD_VALUE)
+                self._layouts[input_shape] = ((new_w, new_h), (left, top))
+            region = canvas[top:top + new_h, left:left + new_w]
+            if frame.shape[:2] == (new_h, new_w):
+                region[...] = frame
+            else:
+                cv2.resize(frame, (new_w, new_h), dst=region, interpolation=cv2.INTER_LINEAR)
+            # BGR HWC uint8 -> RGB CHW float32 in [0, 1], in place
+            np.copyto(blob[i], canvas[..., ::-1].transpose(2, 0, 1))
+            blob[i] *= 1 / 255.0
+            transforms.append((gain, (left, top), frame.shape[:2]))
+        return blob, transforms
+
+    def _decode(self, output, gain, pad, shape):
+        """(4 + nc, anchors) head output -> (N, 6) detections in original frame coordinates."""
+        preds = output.T
+        scores = preds[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(cls)), cls]
+        keep = conf >= self.conf
+        preds, cls, conf = preds[keep], cls[keep], conf[keep]
+        if not len(conf):
+            return np.empty((0, 6), dtype=np.float32)
+
+        xywh = preds[:, :4].copy()
+        xywh[:, :2] -= xywh[:, 2:] / 2  # centre -> top-left
+        # Offsetting each class keeps NMS from suppressing boxes of other classes
+        offset = xywh.copy()
+        offset[:, :2] += cls[:, None] * MAX_WH
+        idx = cv2.dnn.NMSBoxes(offset.tolist(), conf.tolist(), self.conf, self.iou)
+        idx = np.asarray(idx, dtype=np.intp).reshape(-1)[:self.max_det]
+
+        dets = np.empty((len(idx), 6), dtype=np.float32)
+        dets[:, :2] = xywh[idx, :2]
+        dets[:, 2:4] = xywh[idx, :2] + xywh[idx, 2:]
+        dets[:, :4] -= (pad[0], pad[1], pad[0], pad[1])
+        dets[:, :4] /= gain
+        h, w = shape
+        dets[:, [0, 2]] = dets[:, [0, 2]].clip(0, w)
+        dets[:, [1, 3]] = dets[:, [1, 3]].clip(0, h)
+        dets[:, 4] = conf[idx]
+        dets[:, 5] = cls[idx]
+        return dets
+
+    def _run(self, blob):
+        """Raw head output, (batch, 4 + nc, anchors)."""
+        raise NotImplementedError
+
+    def predict(self, frames, imgsz=None):
+        """
+        (N, 6) [x1, y1, x2, y2, conf, cls] arrays, one per frame; imgsz overrides
+        the input size of dynamic-shape models (static ones keep theirs).
+        """
+        size = (imgsz, imgsz) if imgsz and not self.fixed_size else self.imgsz
+        step = self.fixed_batch or len(frames)
+        results = []
+        for start in range(0, len(frames), step):
+            blob, transforms = self._prepare(frames[start:start + step], size)
+            outputs = self._run(blob)
+            results.extend(self._decode(out, *t) for out, t in zip(outputs, transforms))
+        return results
+
+
+class OnnxDetector(ArrayDetector):
+    """
+    Runs the ONNX export with onnxruntime alone, so neither torch nor
+    ultralytics is imported on the trolley.
+    """
+
+    def __init__(self, path, device, imgsz, conf, iou=0.7, max_det=300, threads=None):
+        super().__init__(imgsz, conf, iou, max_det)
+        import onnxruntime as ort
+        providers = ["CPUExecutionProvider"]
+        if device.startswith("cuda") and "CUDAExecutionProvider" in ort.get_available_providers():
+            providers.insert(0, "CUDAExecutionProvider")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=providers)
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Static exports fix batch and size; dynamic ones report symbolic dims
+        batch, _, height, width = model_input.shape
+        self.fixed_batch = batch if isinstance(batch, int) else None
+        self.fixed_size = isinstance(height, int) and isinstance(width, int)
+        if self.fixed_size:
+            self.imgsz = (height, width)
+        # ultralytics stores the class names as a dict literal in the model metadata
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(meta["names"]) if "names" in meta else {}
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class TorchDetector(ArrayDetector):
+    """
+    Runs best.pt's fused PyTorch module directly on the reused input blob,
+    skipping the ultralytics predictor (its per-call preprocessing and Results).
+    """
+
+    auto = True
+    fixed_size = False
+
+    def __init__(self, path, device, imgsz, conf, iou=0.7, max_det=300):
+        super().__init__(imgsz, conf, iou, max_det)
+        import torch
+        from ultralytics import YOLO
+        self.torch = torch
+        loaded = YOLO(path, task="detect")
+        self.names = loaded.names
+        self.device = torch.device(device)
+        # channels_last weights, as ultralytics' own predictor uses: faster convolutions on CPU
+        self.model = loaded.model.float().fuse().eval().to(self.device, memory_format=torch.channels_last)
+        self.stride = int(max(int(s) for s in self.model.stride))
+        self._device_inputs = {}
+        print(f"YOLO Model loaded on device: {device}")
+
+    def _run(self, blob):
+        torch = self.torch
+        with torch.inference_mode():
+            # On CPU the tensor shares the blob's memory; elsewhere copy into a reused device tensor
+            x = torch.from_numpy(blob)
+            if self.device.type != "cpu":
+                target = self._device_inputs.get(blob.shape)
+                if target is None:
+                    self._device_inputs.clear()
+                    target = self._device_inputs[blob.shape] = torch.empty(blob.shape, device=self.device)
+                x = target.copy_(x, non_blocking=True)
+            preds = self.model(x)
+            if isinstance(preds, (list, tuple)):
+                preds = preds[0]
+            return preds.float().cpu().numpy()
+
+
+def load_detector(backend, path, device, imgsz, conf, lean=True, threads=None):
+    """
+    Detector for the configured backend; every backend returns the same (N, 6)
+    arrays. `lean` runs PyTorch models through TorchDetector instead of the
+    ultralytics predictor; `threads` caps ONNX Runtime's intra-op threads.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"YOLO Model Not Found At {path}")
+    if backend == "onnx":
+        return OnnxDetector(path, device, imgsz, conf, threads=threads)
+    if backend == "torch" and lean:
+        try:
+            return TorchDetector(path, device, imgsz, conf)
+        except Exception as e:
+            print(f"Lean PyTorch inference unavailable ({e}), using the ultralytics predictor")
+    if backend in ("torch", "openvino"):
+        return UltralyticsDetector(path, device, imgsz, conf)
+    raise ValueError(f"Unknown inference backend {backend!r}, expected one of {sorted(BACKENDS)}")
@@ -0,0 +1,327 @@
+"""
+Multi-process inference ("inference_workers" in config).
+
+Each worker is a separate Python process running its own copy of the
+detector, so inference for several cameras and /detect requests runs in
+parallel instead of taking turns on the server's GIL and model lock.
+
+Frames are not pickled: every worker owns a shared-memory ring of frame
+slots, the server copies a frame into a free slot and sends the worker only
+(request id, slot, shape). The worker answers with the small (N, 6) detection
+array. Workers are started as plain `python inference_pool.py <fd>`
+subprocesses talking over a socketpair, because multiprocessing's spawn and
+forkserver modes re-import the server's main module (app.py) in the child.
+"""
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Connection, wait
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+# Frame slots per worker: frames that can be queued for it at once
+SLOTS_PER_WORKER = 4
+# Largest frame passed through shared memory (1080p BGR); larger ones are sent through the pipe
+MAX_FRAME_BYTES = 1920 * 1080 * 3
+# Threads each worker should get when the pool is sized from the core count
+THREADS_PER_WORKER = 2
+START_TIMEOUT = 300  # seconds, model load plus warm-up
+RESTART_DELAY = 1.0  # seconds between restarts of a crashed worker
+WARMUP_IMAGE_SIZE = 512
+
+
+def pool_size(requested, cores=None):
+    """Worker count for the `inference_workers` setting: a positive count as is, -1 sized to the host's cores."""
+    if requested > 0:
+        return requested
+    cores = cores or os.cpu_count() or 1
+    return max(1, cores // THREADS_PER_WORKER)
+
+
+def _attach(name):
+    shm = SharedMemory(name=name)
+    # The server owns the segment; keep this process' resource tracker from unlinking it on exit
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+class _Worker:
+    """Parent-side handle of one worker process: its connection, frame slots and requests in flight."""
+
+    def __init__(self, index, slots, slot_bytes):
+        self.index = index
+        self.shm = SharedMemory(create=True, size=slots * slot_bytes)
+        self.frames = np.ndarray((slots, slot_bytes), dtype=np.uint8, buffer=self.shm.buf)
+        self.free = list(range(slots))
+        self.in_flight = {}     # request id -> (slot or None, Future)
+        self.send_lock = threading.Lock()
+        self.process = None
+        self.conn = None
+        self.ready = False
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+        del self.frames
+        self.shm.close()
+        self.shm.unlink()
+
+
+class InferencePool:
+    """
+    Pool of detector processes with the detector interface (`names`,
+    `predict(frames, imgsz=None)`), safe to call from any number of threads.
+    submit() queues one frame on the least busy worker and returns a Future of
+    its (N, 6) detections; predict() spreads a list of frames over the workers
+    and waits for all of them. When every slot is taken, submit() blocks until
+    one frees up, which throttles the callers to what the workers can run.
+
+    A worker that dies fails its pending requests and is restarted.
+    """
+
+    thread_safe = True
+
+    def __init__(self, backend, path, device, imgsz, conf, lean=True, workers=-1,
+                 slots=SLOTS_PER_WORKER, slot_bytes=MAX_FRAME_BYTES, start_timeout=START_TIMEOUT):
+        self.options = {"backend": backend, "path": path, "device": device, "imgsz": imgsz,
+                        "conf": conf, "lean": lean}
+        self.size = pool_size(workers)
+        self.threads = max(1, (os.cpu_count() or 1) // self.size)
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.names = {}
+        self.restarts = 0
+        self._cond = threading.Condition()
+        self._next_id = 0
+        self._closing = False
+        self._workers = [_Worker(i, slots, slot_bytes) for i in range(self.size)]
+        try:
+            for worker in self._workers:
+                self._start(worker)
+            deadline = time.monotonic() + start_timeout
+            for worker in self._workers:
+                self._await_ready(worker, deadline - time.monotonic())
+        except Exception:
+            self.close()
+            raise
+        self._collector = threading.Thread(target=self._collect, name="inference-pool", daemon=True)
+        self._collector.start()
+        print(f"Inference pool ready: {self.size} worker(s), {self.threads} thread(s) each")
+
+    def _start(self, worker):
+        parent, child = socket.socketpair()
+        env = dict(os.environ)
+        # Read by OpenMP/MKL when torch loads, so workers don't each spin up a thread per core
+        env["OMP_NUM_THREADS"] = env["MKL_NUM_THREADS"] = str(self.threads)
+        try:
+            worker.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), str(child.fileno())],
+                                              pass_fds=[child.fileno()], env=env)
+        finally:
+            child.close()
+        worker.conn = Connection(parent.detach())
+        worker.conn.send(dict(self.options, shm=worker.shm.name, slots=self.slots,
+                              slot_bytes=self.slot_bytes, threads=self.threads))
+
+    def _await_ready(self, worker, timeout):
+        if not worker.conn.poll(max(0, timeout)):
+            raise TimeoutError(f"Inference worker {worker.index} did not start within the timeout")
+        kind, payload = worker.conn.recv()
+        if kind != "ready":
+            raise RuntimeError(f"Inference worker {worker.index} failed to start: {payload}")
+        self.names = payload
+        worker.ready = True
+
+    @property
+    def running(self):
+        """Workers currently ready for frames."""
+        return sum(w.ready for w in self._workers)
+
+    def submit(self, frame, imgsz=None):
+        """Future of the (N, 6) detections of one frame."""
+        frame = np.asarray(frame)
+        future = Future()
+        with self._cond:
+            while True:
+                if self._closing:
+                    raise RuntimeError("Inference pool is closed")
+                ready = [w for w in self._workers if w.ready]
+                if not ready:
+                    raise RuntimeError("No inference worker is running")
+                available = [w for w in ready if w.free]
+                if available:
+                    break
+                self._cond.wait()
+            worker = min(available, key=lambda w: len(w.in_flight))
+            self._next_id += 1
+            request_id = self._next_id
+            slot = worker.free.pop() if frame.nbytes <= self.slot_bytes else None
+            worker.in_flight[request_id] = (slot, future)
+        if slot is None:
+            message = (request_id, None, frame.shape, frame.dtype.str, imgsz, frame)
+        else:
+            # Writes through any strides (e.g. an ROI crop) straight into the slot
+            view = worker.frames[slot, :frame.nbytes].view(frame.dtype).reshape(frame.shape)
+            np.copyto(view, frame)
+            message = (request_id, slot, frame.shape, frame.dtype.str, imgsz, None)
+        try:
+            with worker.send_lock:
+                worker.conn.send(message)
+        except (OSError, ValueError) as e:
+            # The worker died; its restart fails the requests still in flight
+            self._finish(worker, request_id, error=f"Inference worker {worker.index} unavailable: {e}")
+        return future
+
+    def predict(self, frames, imgsz=None):
+        """(N, 6) [x1, y1, x2, y2, conf, cls] arrays, one per frame, computed in parallel across workers."""
+        futures = [self.submit(frame, imgsz) for frame in frames]
+        return [f.result() for f in futures]
+
+    def _finish(self, worker, request_id, dets=None, error=None):
+        with self._cond:
+            entry = worker.in_flight.pop(request_id, None)
+            if entry is None:
+                return
+            slot, future = entry
+            if slot is not None:
+                worker.free.append(slot)
+            self._cond.notify_all()
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(dets)
+
+    def _collect(self):
+        """Resolve futures from the workers' replies; restart workers whose connection drops."""
+        while not self._closing:
+            conns = {w.conn: w for w in self._workers if w.ready}
+            if not conns:
+                time.sleep(0.1)
+                continue
+            for conn in wait(list(conns), timeout=0.5):
+                worker = conns[conn]
+                try:
+                    request_id, dets, error = conn.recv()
+                except (EOFError, OSError):
+                    if not self._closing:
+                        self._lost(worker)
+                    continue
+                self._finish(worker, request_id, dets, error)
+
+    def _lost(self, worker):
+        """Fail the requests of a worker that died and restart it in the background."""
+        try:
+            code = worker.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            code = None
+        logging.error(f"Inference worker {worker.index} exited (code {code}), restarting")
+        with self._cond:
+            worker.ready = False
+            failed, worker.in_flight = worker.in_flight, {}
+            worker.free = list(range(self.slots))
+            self._cond.notify_all()
+        for slot, future in failed.values():
+            future.set_exception(RuntimeError(f"Inference worker {worker.index} exited"))
+        worker.conn.close()
+        threading.Thread(target=self._restart, args=(worker,), name=f"inference-restart-{worker.index}",
+                         daemon=True).start()
+
+    def _restart(self, worker):
+        while not self._closing:
+            time.sleep(RESTART_DELAY)
+            try:
+                self._start(worker)
+                self._await_ready(worker, START_TIMEOUT)
+            except Exception as e:
+                logging.error(f"Inference worker {worker.index} restart failed: {e}")
+                if worker.process is not None:
+                    worker.process.kill()
+                continue
+            with self._cond:
+                self.restarts += 1
+                self._cond.notify_all()
+            return
+
+    def close(self):
+        """Stop the workers and release their shared memory."""
+        with self._cond:
+            if self._closing:
+                return
+            self._closing = True
+            workers = self._workers
+            for worker in workers:
+                worker.ready = False
+            self._cond.notify_all()
+        for worker in workers:
+            try:
+                with worker.send_lock:
+                    worker.conn.send(None)
+            except (AttributeError, OSError, ValueError):
+                pass
+        for worker in workers:
+            if worker.process is not None:
+                try:
+                    worker.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+            for slot, future in worker.in_flight.values():
+                future.set_exception(RuntimeError("Inference pool is closed"))
+            worker.in_flight = {}
+            worker.close()
+
+
+def worker_main(fd):
+    """Worker process: load the detector, then run frames from shared memory until told to stop."""
+    # Ctrl-C reaches the whole process group; the server shuts workers down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    conn = Connection(fd)
+    options = conn.recv()
+    try:
+        import cv2
+        cv2.setNumThreads(options["threads"])
+        from inference import load_detector
+        detector = load_detector(options["backend"], options["path"], options["device"], options["imgsz"],
+                                 options["conf"], lean=options["lean"], threads=options["threads"])
+        if "torch" in sys.modules:
+            sys.modules["torch"].set_num_threads(options["threads"])
+        shm = _attach(options["shm"])
+        frames = np.ndarray((options["slots"], options["slot_bytes"]), dtype=np.uint8, buffer=shm.buf)
+        detector.predict([np.zeros((WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)])
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", detector.names))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        request_id, slot, shape, dtype, imgsz, frame = message
+        if frame is None:
+            dtype = np.dtype(dtype)
+            frame = frames[slot, :int(np.prod(shape)) * dtype.itemsize].view(dtype).reshape(shape)
+        try:
+            conn.send((request_id, detector.predict([frame], imgsz=imgsz)[0], None))
+        except Exception as e:
+            conn.send((request_id, None, f"{type(e).__name__}: {e}"))
+    del frames
+    shm.close()
+
+
+if __name__ == "__main__":
+    worker_main(int(sys.argv[1]))
@@ -0,0 +1,122 @@
+import threading
+from bisect import bisect_left
+
+# Histogram bucket upper bounds in seconds, from a fast JPEG encode to a stalled camera read
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative latency histogram (never reset, as Prometheus expects)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot: above the largest bucket
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """(cumulative count per bucket, +Inf included; sum; count)."""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for n in counts:
+            running += n
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """
+    Counters, gauges and histograms served by /metrics in the Prometheus text
+    format. Metrics are declared once; samples are keyed by their label values.
+    Collectors are called on every scrape for values that already live
+    elsewhere (pipeline stats, camera status, process CPU and memory) and
+    yield (name, kind, help, {((label, value), ...): value or Histogram}).
+    """
+
+    def __init__(self, prefix="smart_trolley_"):
+        self.prefix = prefix
+        self._families = {}  # name -> (kind, help, {label tuple: value or Histogram})
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _declare(self, name, kind, help):
+        with self._lock:
+            self._families.setdefault(name, (kind, help, {}))
+
+    def counter(self, name, help):
+        self._declare(name, "counter", help)
+
+    def gauge(self, name, help):
+        self._declare(name, "gauge", help)
+
+    def histogram(self, name, help):
+        self._declare(name, "histogram", help)
+
+    def inc(self, name, n=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            samples = self._families[name][2]
+            samples[key] = samples.get(key, 0) + n
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._families[name][2][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            samples = self._families[name][2]
+            histogram = samples.get(key)
+            if histogram is None:
+                histogram = samples[key] = Histogram()
+        histogram.observe(value)
+
+    def collector(self, fn):
+        """Register fn() as a collector; usable as a decorator."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        with self._lock:
+            families = [(name, kind, help, dict(samples)) for name, (kind, help, samples) in self._families.items()]
+        for collect in self._collectors:
+            families.extend((name, kind, help, dict(samples)) for name, kind, help, samples in collect())
+        lines = []
+        for name, kind, help, samples in families:
+            name = self.prefix + name
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples.items():
+                if kind == "histogram":
+                    cumulative, total, count = value.snapshot()
+                    for bound, n in zip(value.buckets + (float("inf"),), cumulative):
+                        lines.append(f"{name}_bucket{_labels(labels, [('le', _number(bound))])} {n}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,57 @@
+import time
+
+import cv2
+import numpy as np
+
+# Grey-level difference (after blurring) a pixel needs to count as changed;
+# below this is sensor noise and compression artefacts
+PIXEL_THRESHOLD = 20
+
+
+class MotionGate:
+    """
+    Decides whether a frame needs inference: only when it differs from the
+    frame inference last ran on, or when `refresh_seconds` have passed since.
+
+    Frames are compared downscaled to `width` pixels, grayscale and blurred,
+    so a check costs a fraction of a millisecond. `sensitivity` (0..1) sets the
+    share of changed pixels that counts as a change: 1 triggers on a few
+    pixels, 0 only when about 5% of the view changes. While `hold_open` is
+    set (e.g. a new product still needs confirming detections) every frame passes.
+    """
+
+    def __init__(self, sensitivity=0.5, refresh_seconds=5.0, width=64):
+        self.min_area = 0.001 + (1.0 - min(max(sensitivity, 0.0), 1.0)) * 0.05
+        self.refresh_seconds = refresh_seconds
+        self.width = width
+        self.reset()
+
+    def reset(self):
+        self.reference = None
+        self.hold_open = False
+        self.inferred_at = 0.0
+        self.last_change = 0.0
+
+    def _small(self, frame):
+        h, w = frame.shape[:2]
+        height = max(1, round(h * self.width / w))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def __call__(self, frame):
+        """True if `frame` should go through inference; it then becomes the new reference."""
+        small = self._small(frame)
+        now = time.monotonic()
+        if self.reference is None or self.reference.shape != small.shape:
+            changed = True
+        else:
+            diff = cv2.absdiff(small, self.reference)
+            self.last_change = float(np.count_nonzero(diff > PIXEL_THRESHOLD)) / diff.size
+            changed = self.last_change >= self.min_area
+        if changed or self.hold_open or now - self.inferred_at >= self.refresh_seconds:
+            self.reference = small
+            self.inferred_at = now
+            return True
+        return False
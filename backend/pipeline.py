@@ -0,0 +1,434 @@
+import threading
+import time
+import logging
+from collections import Counter, deque
+
+import cv2
+import numpy as np
+
+from metrics import Histogram
+
+# Multipart chunk sent while no frame is available, keeps the <img> stream open
+EMPTY_PART = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n\r\n'
+
+
+def mjpeg_part(jpeg):
+    return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+
+
+class LatestFrame:
+    """
+    Single-slot buffer between pipeline stages. Writers never block and always
+    overwrite the slot (latest frame wins); readers wait for something newer.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._taken = 0
+        self.dropped = 0
+        self.dropped_total = 0  # since process start, for /metrics
+        self._listeners = []
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None and self._taken < self._seq:
+                # The consuming stage never saw the previous item
+                self.dropped += 1
+                self.dropped_total += 1
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
+        for listener in self._listeners:
+            listener()
+
+    def add_listener(self, fn):
+        """Call fn() after every put(), on the writer's thread (e.g. to wake an event loop)."""
+        self._listeners.append(fn)
+
+    def take(self, timeout=None):
+        """Consume the newest item (single consumer stages). Returns None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._taken < self._seq and self._item is not None, timeout):
+                return None
+            self._taken = self._seq
+            return self._item
+
+    def wait_newer(self, seq, timeout=None):
+        """Return (seq, item) for the newest item after `seq` (fan-out readers), or (seq, None) on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > seq and self._item is not None, timeout):
+                return seq, None
+            return self._seq, self._item
+
+    def peek(self):
+        with self._cond:
+            return self._item
+
+    def clear(self):
+        with self._cond:
+            self._item = None
+            self._taken = self._seq
+
+
+# Preview stream tiers, (scale, JPEG quality) from best to cheapest. Each frame
+# is encoded once per tier that has at least one client.
+STREAM_TIERS = ((1.0, 80), (0.75, 65), (0.5, 50), (0.35, 40))
+
+
+class AdaptiveQuality:
+    """
+    Stream tier of one client, picked from how long its frames take to send.
+
+    A generator resumes once the server has handed the previous chunk to the
+    socket, so the time spent in `yield` is the client's consumption time. When
+    it stays above `slow` of the frame interval the client moves to a smaller,
+    lower quality tier; when it stays below `fast` for a while it moves back up.
+    An upgrade that has to be undone doubles the wait before the next one, so a
+    client on a marginal link doesn't flap between two tiers.
+    """
+
+    def __init__(self, tier, max_tier, frame_interval, adaptive=True, alpha=0.3,
+                 slow=0.8, fast=0.25, downgrade_after=3, upgrade_after=30):
+        self.tier = tier
+        self.max_tier = max_tier
+        self.frame_interval = frame_interval
+        self.adaptive = adaptive
+        self.alpha = alpha
+        self.slow = slow
+        self.fast = fast
+        self.downgrade_after = downgrade_after
+        self.upgrade_after = upgrade_after
+        self.send_time = None
+        self._slow_frames = 0
+        self._fast_frames = 0
+        self._upgrade_wait = upgrade_after
+        self._last_change = None
+
+    def update(self, send_seconds):
+        """Record one frame's send time; returns the tier for the next frame."""
+        if self.send_time is None:
+            self.send_time = send_seconds
+        else:
+            self.send_time += self.alpha * (send_seconds - self.send_time)
+        if not self.adaptive:
+            return self.tier
+        if self.send_time > self.slow * self.frame_interval:
+            self._slow_frames += 1
+            self._fast_frames = 0
+        elif self.send_time < self.fast * self.frame_interval:
+            self._fast_frames += 1
+            self._slow_frames = 0
+        else:
+            self._slow_frames = self._fast_frames = 0
+        if self._slow_frames >= self.downgrade_after and self.tier < self.max_tier:
+            if self._last_change == "up":
+                self._upgrade_wait = min(self._upgrade_wait * 2, self.upgrade_after * 16)
+            self.tier += 1
+            self._slow_frames = 0
+            self._last_change = "down"
+        elif self._fast_frames >= self._upgrade_wait and self.tier > 0:
+            self.tier -= 1
+            self._fast_frames = 0
+            self._last_change = "up"
+        return self.tier
+
+
+def latency_summary(seconds):
+    """Count, mean and percentiles in milliseconds of latency samples given in seconds."""
+    values = np.asarray(seconds, dtype=float) * 1000
+    if not len(values):
+        return {"count": 0}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p90_ms": round(float(p90), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+class StageStats:
+    """
+    Latency samples per pipeline stage (the most recent `max_samples` of each)
+    and frame counters. Stages record seconds; summary() reports milliseconds.
+
+    reset() starts a new measurement window; `histograms` and `totals` keep
+    counting across resets (pipeline restarts) for /metrics.
+    """
+
+    STAGES = ("capture", "gate", "inference", "results", "render", "encode", "end_to_end")
+
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.histograms = {stage: Histogram() for stage in self.STAGES}
+        self.totals = Counter()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.samples = {stage: deque(maxlen=self.max_samples) for stage in self.STAGES}
+            self.counters = Counter()
+            self.started_at = time.monotonic()
+            self.last_at = self.started_at
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+            self.last_at = time.monotonic()
+        self.histograms[stage].observe(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+            self.totals[name] += n
+
+    def lifetime_totals(self):
+        with self._lock:
+            return dict(self.totals)
+
+    def summary(self):
+        with self._lock:
+            samples = {stage: np.array(values) for stage, values in self.samples.items()}
+            counters = dict(self.counters)
+            # Active time: up to the last recorded sample, not to when the summary is taken
+            elapsed = self.last_at - self.started_at
+        stages = {stage: latency_summary(values) for stage, values in samples.items() if len(values)}
+        return {"elapsed_s": round(elapsed, 3), "stages": stages, "counters": counters}
+
+
+class FramePipeline:
+    """
+    Long-lived capture -> inference -> encode pipeline shared by every /video_feed client.
+
+    Each stage runs in its own thread and hands work to the next one through a
+    LatestFrame, so a slow stage drops stale frames instead of queueing them.
+    The camera is read once per frame and inference runs once per `frame_skip`
+    frames no matter how many clients are subscribed.
+
+    read_frame() -> frame or None
+    infer(frame) -> results
+    on_results(results, frame, frame_index, reused) -> overlay  (runs once per sampled frame)
+    render(frame, overlay, frame_index) -> frame                (draws the latest overlay)
+    gate(frame) -> bool    (optional; False skips inference and passes the last
+                            results again with reused=True)
+
+    frame_index counts captured frames, so stages can tell how many frames
+    passed between an inference and the frame being drawn. `stats` collects
+    per-stage latencies and frame counters (see summary()).
+
+    Frames are rendered and JPEG-encoded once, and only while someone watches:
+    once per stream tier that has subscribers, whatever the number of clients.
+    """
+
+    def __init__(self, read_frame, infer, on_results, render, fps, frame_skip, tiers=STREAM_TIERS, gate=None):
+        self.read_frame = read_frame
+        self.infer = infer
+        self.on_results = on_results
+        self.render = render
+        self.fps = fps
+        self.frame_skip = max(1, int(frame_skip))
+        self.tiers = tiers
+        self.gate = gate
+        self._last_results = None
+
+        self.captured = LatestFrame()   # capture -> encode
+        self.to_infer = LatestFrame()   # capture -> inference
+        self.overlay = LatestFrame()    # inference -> encode
+        self.outputs = [LatestFrame() for _ in tiers]  # encode -> subscribers, JPEG bytes per tier
+        self.subscribers = [0] * len(tiers)
+        self._subscribers_lock = threading.Lock()
+
+        self.frame_count = 0
+        self.stats = StageStats()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return bool(self._threads) and not self._stop.is_set()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self.frame_count = 0
+            self._last_results = None
+            self.stats.reset()
+            for buf in (self.captured, self.to_infer, self.overlay, *self.outputs):
+                buf.clear()
+                buf.dropped = 0
+            self._threads = [
+                threading.Thread(target=self._capture_loop, name="pipeline-capture", daemon=True),
+                threading.Thread(target=self._inference_loop, name="pipeline-inference", daemon=True),
+                threading.Thread(target=self._encode_loop, name="pipeline-encode", daemon=True),
+            ]
+            for t in self._threads:
+                t.start()
+            logging.info("Frame pipeline started")
+
+    def stop(self, timeout=2.0):
+        with self._lock:
+            self._stop.set()
+            for t in self._threads:
+                t.join(timeout=timeout)
+                if t.is_alive():
+                    logging.warning(f"Pipeline thread {t.name} did not stop within {timeout}s")
+            self._threads = []
+            for buf in (self.captured, self.to_infer, self.overlay, *self.outputs):
+                buf.clear()
+            logging.info("Frame pipeline stopped")
+
+    def _capture_loop(self):
+        frame_interval = 1.0 / self.fps
+        while not self._stop.is_set():
+            frame_start = time.monotonic()
+            try:
+                frame = self.read_frame()
+            except Exception as e:
+                logging.error(f"Camera read error: {e}")
+                frame = None
+            if frame is None:
+                self.stats.count("read_failures")
+                self._stop.wait(0.1)
+                continue
+            captured_at = time.monotonic()
+            self.stats.record("capture", captured_at - frame_start)
+            self.stats.count("captured")
+            self.frame_count += 1
+            self.captured.put((self.frame_count, frame, captured_at))
+            if self.frame_count % self.frame_skip == 0:
+                self.to_infer.put((self.frame_count, frame, captured_at))
+            else:
+                self.stats.count("skipped")
+            elapsed = time.monotonic() - frame_start
+            if elapsed < frame_interval:
+                self._stop.wait(frame_interval - elapsed)
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            item = self.to_infer.take(timeout=0.1)
+            if item is None:
+                continue
+            frame_index, frame, captured_at = item
+            t0 = time.monotonic()
+            try:
+                if self.gate is not None and self._last_results is not None:
+                    run = self.gate(frame)
+                    self.stats.record("gate", time.monotonic() - t0)
+                    if not run:
+                        # Nothing changed: keep the tracks alive on the previous results
+                        self.overlay.put(self.on_results(self._last_results, frame, frame_index, True))
+                        self.stats.count("gated")
+                        continue
+                elif self.gate is not None:
+                    self.gate(frame)  # first frame: becomes the gate's reference
+                t1 = time.monotonic()
+                results = self.infer(frame)
+                t2 = time.monotonic()
+                self._last_results = results
+                self.overlay.put(self.on_results(results, frame, frame_index, False))
+                self.stats.record("inference", t2 - t1)
+                self.stats.record("results", time.monotonic() - t2)
+                self.stats.count("inferred")
+            except Exception as e:
+                logging.error(f"Inference stage error: {e}")
+            logging.info(f"Frame processed in {time.monotonic() - t0:.3f}s")
+
+    def _encode_loop(self):
+        while not self._stop.is_set():
+            item = self.captured.take(timeout=0.1)
+            if item is None:
+                continue
+            with self._subscribers_lock:
+                tiers = [tier for tier, count in enumerate(self.subscribers) if count]
+            if not tiers:
+                # Nobody is watching: skip the overlay and JPEG work entirely
+                self.stats.count("unwatched")
+                continue
+            frame_index, frame, captured_at = item
+            overlay = self.overlay.peek()
+            if overlay:
+                t0 = time.monotonic()
+                # The same frame may still be in use by the inference stage
+                frame = self.render(frame.copy(), overlay, frame_index)
+                self.stats.record("render", time.monotonic() - t0)
+            t0 = time.monotonic()
+            for tier in tiers:
+                scale, quality = self.tiers[tier]
+                image = frame if scale == 1.0 else cv2.resize(frame, None, fx=scale, fy=scale,
+                                                             interpolation=cv2.INTER_AREA)
+                ret, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+                if not ret:
+                    logging.error("Failed to encode frame")
+                    continue
+                self.outputs[tier].put(buffer.tobytes())
+            now = time.monotonic()
+            self.stats.record("encode", now - t0)
+            self.stats.record("end_to_end", now - captured_at)
+            self.stats.count("encoded")
+
+    def subscribe(self, tier, delta):
+        """Add (delta=1) or remove (-1) a client of a stream tier; only subscribed tiers are encoded."""
+        with self._subscribers_lock:
+            self.subscribers[tier] += delta
+            if not self.subscribers[tier]:
+                # Nobody reads this tier until it is subscribed again; don't serve a stale frame then
+                self.outputs[tier].clear()
+
+    def summary(self):
+        """Stage latency percentiles, frame counters and dropped frames per hand-off buffer."""
+        summary = self.stats.summary()
+        summary["dropped"] = {
+            "inference": self.to_infer.dropped,  # sampled frames replaced before inference took them
+            "encode": self.captured.dropped,     # captured frames replaced before encoding
+        }
+        elapsed = summary["elapsed_s"]
+        counters = summary["counters"]
+        summary["fps"] = {
+            "captured": round(counters.get("captured", 0) / elapsed, 2) if elapsed else 0.0,
+            "inferred": round(counters.get("inferred", 0) / elapsed, 2) if elapsed else 0.0,
+            "encoded": round(counters.get("encoded", 0) / elapsed, 2) if elapsed else 0.0,
+        }
+        return summary
+
+    def stream(self, tier=0, adaptive=True):
+        """
+        MJPEG generator for one client. Every client reads the same encoded
+        frames; a client that falls behind skips to the newest frame instead of
+        queueing, and (if adaptive) is moved to a cheaper tier.
+        """
+        tier = min(max(0, tier), len(self.tiers) - 1)
+        quality = AdaptiveQuality(tier, len(self.tiers) - 1, 1.0 / self.fps, adaptive=adaptive)
+        self.subscribe(tier, 1)
+        seq = 0
+        last_jpeg = None
+        try:
+            while True:
+                last_seq = seq
+                seq, jpeg = self.outputs[tier].wait_newer(seq, timeout=0.5)
+                if jpeg is None:
+                    # Nothing new (stopped, source finished or reconnecting): keep writing, the
+                    # last frame while running, so a client that left is noticed and released
+                    yield mjpeg_part(last_jpeg) if self.running and last_jpeg is not None else EMPTY_PART
+                    continue
+                if last_seq and seq - last_seq > 1:
+                    self.stats.count("stream_skipped", seq - last_seq - 1)
+                last_jpeg = jpeg
+                sent = time.monotonic()
+                yield mjpeg_part(jpeg)
+                new_tier = quality.update(time.monotonic() - sent)
+                if new_tier != tier:
+                    logging.info(f"Stream client moved from tier {tier} to {new_tier} "
+                                 f"(send time {quality.send_time * 1000:.0f} ms)")
+                    self.subscribe(new_tier, 1)
+                    self.subscribe(tier, -1)
+                    tier, seq = new_tier, 0
+        finally:
+            self.subscribe(tier, -1)
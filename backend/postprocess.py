@@ -0,0 +1,49 @@
+import numpy as np
+
+# Columns of a detection array, as in ultralytics' boxes.data
+X1, Y1, X2, Y2, CONF, CLS = range(6)
+
+
+class ClassLookup:
+    """
+    Class id -> product name table, resolved once when the model is loaded so the
+    per-frame path never touches class name strings.
+    """
+
+    def __init__(self, names, resolve):
+        """
+        names   - model.names, {class_id: class_name}
+        resolve - class_name -> product name or None
+        """
+        size = max(names) + 1 if names else 0
+        self.class_names = np.empty(size, dtype=object)
+        self.products = np.empty(size, dtype=object)
+        for class_id, class_name in names.items():
+            self.class_names[class_id] = class_name
+            self.products[class_id] = resolve(class_name)
+        self.valid = np.array([p is not None for p in self.products], dtype=bool)
+
+    def __len__(self):
+        return len(self.valid)
+
+
+def to_array(result):
+    """(N, 6) float32 [x1, y1, x2, y2, conf, cls] array from one ultralytics Results."""
+    data = result.boxes.data
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    return np.asarray(data, dtype=np.float32).reshape(-1, 6)
+
+
+def filter_detections(dets, lookup, conf_threshold):
+    """
+    Keep the detections above `conf_threshold` whose class maps to a product.
+    Returns (kept detections, their class ids as ints, number rejected as unknown).
+    """
+    dets = np.asarray(dets, dtype=np.float32).reshape(-1, 6)
+    cls = dets[:, CLS].astype(np.intp)
+    known = (cls >= 0) & (cls < len(lookup))
+    known[known] = lookup.valid[cls[known]]
+    keep = known & (dets[:, CONF] >= conf_threshold)
+    rejected = int(np.count_nonzero(~known))
+    return dets[keep], cls[keep], rejected
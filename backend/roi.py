@@ -0,0 +1,58 @@
+import math
+
+# Smallest inference size for a cropped region; YOLO strides need multiples of 32
+MIN_IMAGE_SIZE = 160
+STRIDE = 32
+
+
+def parse_roi(value):
+    """
+    Region of interest as (x1, y1, x2, y2) fractions of the frame, or None for
+    the whole frame. Raises ValueError for anything else.
+    """
+    if value is None:
+        return None
+    try:
+        x1, y1, x2, y2 = (float(v) for v in value)
+    except (TypeError, ValueError):
+        raise ValueError("roi must be [x1, y1, x2, y2] fractions of the frame, or null")
+    if not (0.0 <= x1 < x2 <= 1.0 and 0.0 <= y1 < y2 <= 1.0):
+        raise ValueError("roi must satisfy 0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1")
+    return (x1, y1, x2, y2)
+
+
+def roi_pixels(roi, shape):
+    """Pixel box (x1, y1, x2, y2) of `roi` in a frame of `shape`."""
+    h, w = shape[:2]
+    if roi is None:
+        return 0, 0, w, h
+    x1, y1, x2, y2 = roi
+    return (int(x1 * w), int(y1 * h), max(int(x1 * w) + 1, int(round(x2 * w))),
+            max(int(y1 * h) + 1, int(round(y2 * h))))
+
+
+def crop_to_roi(frame, roi):
+    """(view of the region, (x, y) offset of the region in the frame)."""
+    if roi is None:
+        return frame, (0, 0)
+    x1, y1, x2, y2 = roi_pixels(roi, frame.shape)
+    return frame[y1:y2, x1:x2], (x1, y1)
+
+
+def roi_image_size(crop_shape, frame_shape, imgsz):
+    """
+    Inference size that keeps the crop at the pixel scale the full frame would
+    get at `imgsz`: same object sizes for the model, fewer pixels to process.
+    """
+    ratio = max(crop_shape[:2]) / max(frame_shape[:2])
+    size = math.ceil(imgsz * ratio / STRIDE) * STRIDE
+    return min(imgsz, max(MIN_IMAGE_SIZE, size))
+
+
+def to_frame_coords(dets, offset):
+    """Shift (N, 6) detections of a crop back to full-frame coordinates, in place."""
+    x, y = offset
+    if x or y:
+        dets[:, [0, 2]] += x
+        dets[:, [1, 3]] += y
+    return dets
@@ -0,0 +1,242 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+import numpy as np
+
+TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+# Score of a query term matching a name token, by kind of match
+EXACT, PREFIX, SUBSTRING, FUZZY = 3.0, 2.0, 1.0, 0.8
+FUZZY_PENALTY = 0.3  # per edit
+MAX_FUZZY_CANDIDATES = 50
+
+
+def normalize(text):
+    return " ".join(TOKEN_SPLIT.split(text.lower())).strip()
+
+
+def max_edits(term):
+    """Typos tolerated in a term: none for short ones, one from 4 characters, two from 8."""
+    return 0 if len(term) < 4 else 1 if len(term) < 8 else 2
+
+
+def edit_distance(a, b, limit):
+    """
+    Edit distance of a and b counting a swap of neighbouring letters as one
+    typo (optimal string alignment), or limit + 1 once it must exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def trigrams(token, padded=True):
+    token = f" {token} " if padded else token
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class SearchIndex:
+    """
+    Product name search for autocomplete over large catalogs.
+
+    Names are split into lowercase tokens. Unique tokens are kept sorted with
+    their postings (product ids) concatenated in the same order, so every
+    token starting with a prefix is a bisect range and its products one
+    contiguous slice. A trigram index over the tokens finds substring matches
+    and typo candidates (verified by edit distance); those only run for terms
+    with fewer prefix matches than the result limit.
+
+    Every query term must match a token of the name, or the whole query must
+    be a substring of the name, as the plain substring scan this replaced
+    found ("ji wa" or "a" in "Balaji Wafers"); the token index narrows those
+    down too. Results are ranked by the summed term scores (exact > prefix >
+    substring > fuzzy), then shorter names. Recent queries are answered from
+    an LRU cache; rebuild() swaps in a new catalog and drops the cache.
+    """
+
+    def __init__(self, names=(), cache_size=1024):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.rebuild(names)
+
+    def rebuild(self, names):
+        names = list(names)
+        postings = {}
+        for product_id, name in enumerate(names):
+            for token in set(normalize(name).split()):
+                postings.setdefault(token, []).append(product_id)
+        tokens = sorted(postings)
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[t]) for t in tokens])
+        flat = np.fromiter((p for t in tokens for p in postings[t]), dtype=np.int32, count=int(offsets[-1]))
+        grams = {}
+        for token_id, token in enumerate(tokens):
+            for gram in trigrams(token):
+                grams.setdefault(gram, []).append(token_id)
+        index = {
+            "names": names,
+            "texts": [normalize(name) for name in names],
+            # Every token followed by a newline, to find substrings and suffixes of all tokens in one scan
+            "token_text": "".join(t + "\n" for t in tokens),
+            "token_starts": np.concatenate([[0], np.cumsum([len(t) + 1 for t in tokens])]).astype(np.int64),
+            "name_lengths": np.array([len(n) for n in names], dtype=np.float32),
+            "tokens": tokens,
+            "token_lengths": np.array([len(t) for t in tokens], dtype=np.int32),
+            "offsets": offsets,
+            "postings": flat,
+            "grams": {gram: np.array(ids, dtype=np.int32) for gram, ids in grams.items()},
+        }
+        with self._lock:
+            self._index = index
+            self._cache.clear()
+
+    def __len__(self):
+        return len(self._index["names"])
+
+    def _term_scores(self, index, term, scores, limit):
+        """Best match score of `term` against each product's tokens, written into `scores`."""
+        tokens, offsets, postings = index["tokens"], index["offsets"], index["postings"]
+        lo = bisect_left(tokens, term)
+        hi = bisect_left(tokens, term + "\uffff", lo)
+        if hi > lo:
+            scores[postings[offsets[lo]:offsets[hi]]] = PREFIX
+            if tokens[lo] == term:
+                scores[postings[offsets[lo]:offsets[lo + 1]]] = EXACT
+        if offsets[hi] - offsets[lo] >= limit or len(term) < 3:
+            return
+        # Few prefix matches: add tokens containing the term, then ones a typo or two away
+        seen = set(range(lo, hi))
+        edits = max_edits(term)
+        grams = index["grams"]
+        inner = trigrams(term, padded=False)
+        if all(g in grams for g in inner):
+            # Tokens containing the term have every trigram of it
+            counts = np.bincount(np.concatenate([grams[g] for g in inner]), minlength=len(tokens))
+            candidates = np.flatnonzero(counts == len(inner))
+        else:
+            candidates = np.empty(0, dtype=np.int64)
+        for token_id in candidates.tolist():
+            if token_id not in seen and term in tokens[token_id]:
+                seen.add(token_id)
+                span = postings[offsets[token_id]:offsets[token_id + 1]]
+                scores[span] = np.maximum(scores[span], SUBSTRING)
+        padded = [grams[g] for g in trigrams(term) if g in grams]
+        if not edits or not padded or np.count_nonzero(scores) >= limit:
+            return
+        counts = np.bincount(np.concatenate(padded), minlength=len(tokens))
+        # q-gram lemma: an edit changes at most 3 of the term's padded trigrams, a swap 4;
+        # and it changes the length by at most one
+        needed = max(1, len(trigrams(term)) - 4 * edits)
+        candidates = np.flatnonzero((counts >= needed) & (np.abs(index["token_lengths"] - len(term)) <= edits))
+        if len(candidates) > MAX_FUZZY_CANDIDATES:
+            candidates = candidates[np.argsort(-counts[candidates], kind="stable")[:MAX_FUZZY_CANDIDATES]]
+        for token_id in candidates.tolist():
+            if token_id in seen:
+                continue
+            distance = edit_distance(term, tokens[token_id], edits)
+            if distance <= edits:
+                span = postings[offsets[token_id]:offsets[token_id + 1]]
+                scores[span] = np.maximum(scores[span], FUZZY - FUZZY_PENALTY * (distance - 1))
+
+    def _phrase_hits(self, index, terms):
+        """Ids of the products whose normalized name contains the terms as one substring."""
+        tokens, offsets, postings = index["tokens"], index["offsets"], index["postings"]
+
+        def products_of(needle):
+            # Products of every token containing `needle` (a term, or a term + "\n" for a suffix)
+            found = np.fromiter((m.start() for m in re.finditer(re.escape(needle), index["token_text"])),
+                                dtype=np.int64)
+            hits = np.zeros(len(tokens), dtype=bool)
+            hits[np.searchsorted(index["token_starts"], found, side="right") - 1] = True
+            return postings[np.repeat(hits, np.diff(offsets))]
+
+        if len(terms) == 1:
+            # Inside a token: one scan over the unique tokens (far fewer than names)
+            return products_of(terms[0])
+        # Across tokens: the first term ends a token of the name, the last one starts one and the
+        # ones between are whole tokens; the smallest of those product lists is checked against the name
+        candidates = products_of(terms[0] + "\n")
+        lo = bisect_left(tokens, terms[-1])
+        hi = bisect_left(tokens, terms[-1] + "\uffff", lo)
+        if offsets[hi] - offsets[lo] < len(candidates):
+            candidates = postings[offsets[lo]:offsets[hi]]
+        for term in terms[1:-1]:
+            i = bisect_left(tokens, term)
+            if i == len(tokens) or tokens[i] != term:
+                return np.empty(0, dtype=np.int32)
+            if offsets[i + 1] - offsets[i] < len(candidates):
+                candidates = postings[offsets[i]:offsets[i + 1]]
+        phrase, texts = " ".join(terms), index["texts"]
+        return np.array([i for i in np.unique(candidates).tolist() if phrase in texts[i]], dtype=np.int32)
+
+    def _search(self, index, terms, limit):
+        n = len(index["names"])
+        total = np.zeros(n, dtype=np.float32)
+        matched = np.ones(n, dtype=bool)
+        scores = np.empty(n, dtype=np.float32)
+        for term in terms:
+            scores.fill(0)
+            self._term_scores(index, term, scores, limit)
+            matched &= scores > 0
+            total += scores
+        if len(terms) > 1 or len(terms[0]) < 3:
+            # Term matching needs each term at a token start (or 3+ characters to find it inside one);
+            # a query across words or of one or two letters is matched as a substring of the name too
+            phrase = np.zeros(n, dtype=bool)
+            phrase[self._phrase_hits(index, terms)] = True
+            total[phrase & ~matched] = SUBSTRING * len(terms)
+            matched |= phrase
+        hits = np.flatnonzero(matched)
+        if not len(hits):
+            return []
+        # Higher score first, then shorter names (closer to what was typed)
+        rank = total[hits] * 1000 - index["name_lengths"][hits]
+        if len(hits) > limit:
+            top = np.argpartition(-rank, limit)[:limit]
+            hits, rank = hits[top], rank[top]
+        order = np.argsort(-rank, kind="stable")
+        return [index["names"][i] for i in hits[order].tolist()]
+
+    def search(self, query, limit=20):
+        """Names matching every term of `query`, best first, at most `limit`."""
+        terms = normalize(query).split()
+        if limit <= 0:
+            return []
+        if not terms:
+            # Only punctuation (e.g. "&"): nothing to index it by, scan the names as typed
+            query = query.lower().strip()
+            if not query:
+                return []
+            names = self._index["names"]
+            return sorted((n for n in names if query in n.lower()), key=len)[:limit]
+        key = (" ".join(terms), limit)
+        with self._lock:
+            index = self._index
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return list(cached)
+            self.misses += 1
+        results = self._search(index, terms, limit)
+        with self._lock:
+            # Skip storing if the catalog was rebuilt meanwhile
+            if index is self._index:
+                self._cache[key] = tuple(results)
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return results
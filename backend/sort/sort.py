@@ -19,16 +19,10 @@ from __future__ import print_function
 
 import os
 import numpy as np
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from skimage import io
 
 import glob
 import time
 import argparse
-from filterpy.kalman import KalmanFilter
 
 np.random.seed(0)
 
@@ -100,6 +94,8 @@ class KalmanBoxTracker(object):
     """
     Initialises a tracker using initial bounding box.
     """
+    # filterpy (and the matplotlib it imports) costs ~1s, only load it when Sort is used
+    from filterpy.kalman import KalmanFilter
     #define constant velocity model
     self.kf = KalmanFilter(dim_x=7, dim_z=4) 
     self.kf.F = np.array([[1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],  [0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]])
@@ -170,30 +166,21 @@ def associate_detections_to_trackers(detections,trackers,iou_threshold = 0.3):
       matched_indices = linear_assignment(-iou_matrix)
   else:
     matched_indices = np.empty(shape=(0,2))
+  matched_indices = np.asarray(matched_indices, dtype=int).reshape(-1, 2)
 
-  unmatched_detections = []
-  for d, det in enumerate(detections):
-    if(d not in matched_indices[:,0]):
-      unmatched_detections.append(d)
-  unmatched_trackers = []
-  for t, trk in enumerate(trackers):
-    if(t not in matched_indices[:,1]):
-      unmatched_trackers.append(t)
+  # boolean masks instead of per-element membership tests
+  det_unmatched = np.ones(len(detections), dtype=bool)
+  det_unmatched[matched_indices[:,0]] = False
+  trk_unmatched = np.ones(len(trackers), dtype=bool)
+  trk_unmatched[matched_indices[:,1]] = False
 
   #filter out matched with low IOU
-  matches = []
-  for m in matched_indices:
-    if(iou_matrix[m[0], m[1]]<iou_threshold):
-      unmatched_detections.append(m[0])
-      unmatched_trackers.append(m[1])
-    else:
-      matches.append(m.reshape(1,2))
-  if(len(matches)==0):
-    matches = np.empty((0,2),dtype=int)
-  else:
-    matches = np.concatenate(matches,axis=0)
+  low_iou = iou_matrix[matched_indices[:,0], matched_indices[:,1]] < iou_threshold
+  unmatched_detections = np.concatenate((np.flatnonzero(det_unmatched), matched_indices[low_iou,0]))
+  unmatched_trackers = np.concatenate((np.flatnonzero(trk_unmatched), matched_indices[low_iou,1]))
+  matches = matched_indices[~low_iou]
 
-  return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+  return matches, unmatched_detections, unmatched_trackers
 
 
 class Sort(object):
@@ -252,6 +239,157 @@ class Sort(object):
       return np.concatenate(ret)
     return np.empty((0,5))
 
+  def get_tracks(self):
+    """
+    Returns (ids, states, time_since_update) for every live track, where states
+    is an (N,7) array of Kalman states [x,y,s,r,vx,vy,vs] and ids match the
+    object IDs returned by update().
+    """
+    ids = np.array([trk.id+1 for trk in self.trackers], dtype=int)
+    states = np.array([trk.kf.x[:, 0] for trk in self.trackers]).reshape(-1, 7)
+    since_update = np.array([trk.time_since_update for trk in self.trackers], dtype=int)
+    return ids, states, since_update
+
+# Constant velocity model shared by every track of VectorizedSort, identical to
+# the per-track KalmanFilter setup in KalmanBoxTracker
+KF_F = np.array([[1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],  [0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]], dtype=float)
+KF_H = np.array([[1,0,0,0,0,0,0],[0,1,0,0,0,0,0],[0,0,1,0,0,0,0],[0,0,0,1,0,0,0]], dtype=float)
+KF_R = np.diag([1., 1., 10., 10.])
+KF_Q = np.diag([1., 1., 1., 1., 0.01, 0.01, 0.0001])
+KF_P0 = np.diag([10., 10., 10., 10., 10000., 10000., 10000.])
+KF_I = np.eye(7)
+
+
+def convert_bboxes_to_z(bboxes):
+  """
+  Batched convert_bbox_to_z: (N,4+) boxes [x1,y1,x2,y2] to (N,4) [x,y,s,r]
+  """
+  w = bboxes[:, 2] - bboxes[:, 0]
+  h = bboxes[:, 3] - bboxes[:, 1]
+  return np.stack([bboxes[:, 0] + w/2., bboxes[:, 1] + h/2., w * h, w / h], axis=1)
+
+
+def convert_x_to_bboxes(x):
+  """
+  Batched convert_x_to_bbox: (N,7) states to (N,4) boxes [x1,y1,x2,y2]
+  """
+  w = np.sqrt(x[:, 2] * x[:, 3])
+  h = x[:, 2] / w
+  return np.stack([x[:, 0]-w/2., x[:, 1]-h/2., x[:, 0]+w/2., x[:, 1]+h/2.], axis=1)
+
+
+class VectorizedSort(object):
+  """
+  Drop-in replacement for Sort that keeps every track in stacked arrays
+  (struct of arrays) instead of one KalmanBoxTracker/KalmanFilter per track,
+  so predict and update run as single batched operations for all tracks.
+  Track ids come from the same counter as KalmanBoxTracker.
+  """
+  def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3):
+    """
+    Sets key parameters for SORT
+    """
+    self.max_age = max_age
+    self.min_hits = min_hits
+    self.iou_threshold = iou_threshold
+    self.frame_count = 0
+    self.x = np.empty((0, 7))
+    self.P = np.empty((0, 7, 7))
+    self.ids = np.empty(0, dtype=int)
+    self.time_since_update = np.empty(0, dtype=int)
+    self.hits = np.empty(0, dtype=int)
+    self.hit_streak = np.empty(0, dtype=int)
+    self.age = np.empty(0, dtype=int)
+
+  def __len__(self):
+    return len(self.ids)
+
+  def _keep(self, mask):
+    self.x, self.P, self.ids = self.x[mask], self.P[mask], self.ids[mask]
+    self.time_since_update, self.hits = self.time_since_update[mask], self.hits[mask]
+    self.hit_streak, self.age = self.hit_streak[mask], self.age[mask]
+
+  def _predict(self):
+    self.x[(self.x[:, 6] + self.x[:, 2]) <= 0, 6] = 0.
+    self.x = self.x @ KF_F.T
+    self.P = KF_F @ self.P @ KF_F.T + KF_Q
+    self.age += 1
+    self.hit_streak[self.time_since_update > 0] = 0
+    self.time_since_update += 1
+    return convert_x_to_bboxes(self.x)
+
+  def _update(self, idx, bboxes):
+    z = convert_bboxes_to_z(bboxes)
+    P = self.P[idx]
+    y = z - self.x[idx, :4]
+    PHT = P[:, :, :4]
+    S = P[:, :4, :4] + KF_R
+    K = PHT @ np.linalg.inv(S)
+    self.x[idx] += (K @ y[:, :, None])[:, :, 0]
+    I_KH = KF_I - K @ KF_H
+    self.P[idx] = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ KF_R @ K.transpose(0, 2, 1)
+    self.time_since_update[idx] = 0
+    self.hits[idx] += 1
+    self.hit_streak[idx] += 1
+
+  def _create(self, bboxes):
+    n = len(bboxes)
+    x = np.zeros((n, 7))
+    x[:, :4] = convert_bboxes_to_z(bboxes)
+    ids = np.arange(KalmanBoxTracker.count, KalmanBoxTracker.count + n)
+    KalmanBoxTracker.count += n
+    zeros = np.zeros(n, dtype=int)
+    self.x = np.concatenate((self.x, x))
+    self.P = np.concatenate((self.P, np.broadcast_to(KF_P0, (n, 7, 7))))
+    self.ids = np.concatenate((self.ids, ids))
+    self.time_since_update = np.concatenate((self.time_since_update, zeros))
+    self.hits = np.concatenate((self.hits, zeros))
+    self.hit_streak = np.concatenate((self.hit_streak, zeros))
+    self.age = np.concatenate((self.age, zeros))
+
+  def update(self, dets=np.empty((0, 5))):
+    """
+    Same contract as Sort.update():
+      dets - a numpy array of detections in the format [[x1,y1,x2,y2,score],[x1,y1,x2,y2,score],...]
+    Returns the a similar array, where the last column is the object ID.
+    """
+    self.frame_count += 1
+    dets = np.asarray(dets, dtype=float).reshape(-1, 5)
+    # get predicted locations from existing trackers.
+    trks = self._predict()
+    valid = ~np.any(np.isnan(trks), axis=1)
+    if not valid.all():
+      self._keep(valid)
+      trks = trks[valid]
+    matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.iou_threshold)
+
+    # update matched trackers with assigned detections
+    if len(matched):
+      self._update(matched[:, 1], dets[matched[:, 0], :4])
+
+    # create and initialise new trackers for unmatched detections
+    if len(unmatched_dets):
+      self._create(dets[np.asarray(unmatched_dets, dtype=int), :4])
+
+    boxes = convert_x_to_bboxes(self.x)
+    out = (self.time_since_update < 1) & ((self.hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits))
+    # reversed to match the order Sort returns its tracks in
+    ret = np.concatenate((boxes[out], (self.ids[out] + 1)[:, None]), axis=1)[::-1]
+
+    # remove dead tracklet
+    alive = self.time_since_update <= self.max_age
+    if not alive.all():
+      self._keep(alive)
+    if len(ret) > 0:
+      return ret
+    return np.empty((0,5))
+
+  def get_tracks(self):
+    """
+    Returns (ids, states, time_since_update) for every live track, as Sort.get_tracks().
+    """
+    return self.ids + 1, self.x.copy(), self.time_since_update.copy()
+
 def parse_args():
     """Parse input arguments."""
     parser = argparse.ArgumentParser(description='SORT demo')
@@ -272,6 +410,13 @@ if __name__ == '__main__':
   # all train
   args = parse_args()
   display = args.display
+  if(display):
+    # plotting is only needed by the demo, keep it out of library imports
+    import matplotlib
+    matplotlib.use('TkAgg')
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+    from skimage import io
   phase = args.phase
   total_time = 0.0
   total_frames = 0
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+_tmp = tempfile.mkdtemp()
+# No config.json, no camera, no model and memory-only carts: only the routes are under test
+os.environ.update({
+    "SMART_TROLLEY_CONFIG": os.path.join(_tmp, "config.json"),
+    "SMART_TROLLEY_SOURCE": f"images:{_tmp}",
+    "SMART_TROLLEY_MODEL": os.path.join(_tmp, "missing.pt"),
+    "SMART_TROLLEY_CART_DURABILITY": "off",
+})
+
+import app  # noqa: E402
+
+
+class DefaultCartRoutesTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_scoped_urls_of_the_default_cart_are_not_redirected(self):
+        base = f"/carts/{app.DEFAULT_CART_ID}"
+        for path in ("", "/prompt", "/checkout"):
+            self.assertEqual(self.client.get(base + path).status_code, 200, path)
+        name = next(iter(app.products))
+        self.assertEqual(self.client.post(base + "/add", json={"name": name}).status_code, 200)
+        self.assertEqual(self.client.post(base + "/update/0", json={"action": "increment"}).status_code, 200)
+        self.assertEqual(self.client.post(base + "/remove/0").status_code, 200)
+        self.assertEqual(self.client.post(base + "/clear").status_code, 200)
+        events = self.client.get(base + "/events", buffered=False)
+        self.assertEqual(events.status_code, 200)
+        events.close()
+
+    def test_legacy_urls_still_serve_the_default_cart(self):
+        self.assertEqual(self.client.get("/cart").status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
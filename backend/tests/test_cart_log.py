@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cart_log import CartLog  # noqa: E402
+from cart_store import CartStore  # noqa: E402
+
+PRODUCT = {"price": 10, "description": "test"}
+
+
+class CartLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def open_store(self):
+        # compact_bytes=1: every commit is followed by a compaction
+        log = CartLog(self.tmp.name, durability="sync", compact_bytes=1)
+        self.addCleanup(log.close)
+        return CartStore(log=log), log
+
+    def test_cleared_cart_keeps_item_ids_across_restarts(self):
+        store, log = self.open_store()
+        cart = store.get("t1")
+        old_ids = [cart.add_product(name, PRODUCT)[0]["id"] for name in ("a", "b")]
+        cart.clear()
+        log.close()
+        for _ in range(2):
+            store, log = self.open_store()
+            log.close()
+        store, log = self.open_store()
+        item, created = store.get("t1").add_product("c", PRODUCT)
+        self.assertTrue(created)
+        self.assertGreater(item["id"], max(old_ids))
+
+    def test_wait_raises_for_records_not_written_before_close(self):
+        store, log = self.open_store()
+        log.close()
+        seq = log.append("t1", {"items": [], "next_id": 1})
+        with self.assertRaises(OSError):
+            log.wait(seq, timeout=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cart_store import CartStore  # noqa: E402
+
+PRODUCT = {"price": 10, "description": "test"}
+
+
+class CartStoreTest(unittest.TestCase):
+    def test_reads_never_create_carts(self):
+        store = CartStore()
+        self.assertIsNone(store.find("t1"))
+        self.assertIsNone(store.wait_for("t1", timeout=0))
+        self.assertEqual(len(store), 0)
+
+    def test_cart_ids_are_matched_whole(self):
+        self.assertTrue(CartStore.valid_id("t1"))
+        for cart_id in ("t1\n", "", "a/b", "x" * 65):
+            self.assertFalse(CartStore.valid_id(cart_id), repr(cart_id))
+        with self.assertRaises(ValueError):
+            CartStore().get("t1\n")
+
+    def test_wait_for_returns_the_cart_once_created(self):
+        store = CartStore()
+        timer = threading.Timer(0.05, store.get, args=("t1",))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        cart = store.wait_for("t1", timeout=5)
+        self.assertIs(cart, store.find("t1"))
+
+    def test_prompts_sent_on_an_event_stream_are_not_polled_again(self):
+        cart = CartStore().get("t1")
+        cart.add_detection("a", PRODUCT)
+        self.assertEqual(cart.pop_prompt()["action"], "add")
+        cart.add_detection("a", PRODUCT)
+        events = cart.events_since(0, timeout=0)
+        self.assertIn("prompt", [event_type for _, event_type, _ in events])
+        self.assertIsNone(cart.pop_prompt())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+import unittest
+
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, backend_dir)
+
+from search import SearchIndex  # noqa: E402
+
+with open(os.path.join(backend_dir, 'products.json'), 'r') as f:
+    PRODUCTS = list(json.load(f))
+
+
+def substring_scan(query):
+    """/search before the index: every name containing the query."""
+    query = query.lower().strip()
+    return [name for name in PRODUCTS if query in name.lower()]
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex(PRODUCTS)
+
+    def assertFindsScanResults(self, query):
+        found = set(self.index.search(query, limit=len(PRODUCTS)))
+        missing = set(substring_scan(query)) - found
+        self.assertFalse(missing, f"{query!r} lost {sorted(missing)}")
+
+    def test_substrings_across_word_boundaries(self):
+        self.assertIn("Balaji Wafers Masala Masti", self.index.search("ji wa"))
+        self.assertFindsScanResults("ji wa")
+        self.assertFindsScanResults("amul dark")
+
+    def test_one_and_two_letter_queries_match_inside_words(self):
+        self.assertIn("Balaji Wafers Masala Masti", self.index.search("a", limit=len(PRODUCTS)))
+        for query in ("a", "e", "la", "fe"):
+            self.assertFindsScanResults(query)
+
+    def test_every_substring_of_every_name_finds_the_scan_results(self):
+        for name in PRODUCTS:
+            text = name.lower()
+            for size in range(1, 7):
+                for start in range(len(text) - size + 1):
+                    query = text[start:start + size]
+                    if query.strip():
+                        self.assertFindsScanResults(query)
+
+    def test_typos_and_ranking(self):
+        self.assertEqual(self.index.search("ratlami")[0], "Balaji Ratlami Sev")
+        self.assertIn("Balaji Wafers Masala Masti", self.index.search("blaaji"))
+
+
+if __name__ == "__main__":
+    unittest.main()
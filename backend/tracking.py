@@ -0,0 +1,112 @@
+from collections import Counter
+
+import numpy as np
+
+from sort.sort import VectorizedSort, iou_batch
+
+EMPTY_DETS = np.empty((0, 5))
+
+
+def states_to_boxes(states, frames_ahead=0):
+    """
+    [x1,y1,x2,y2] boxes for (N,7) SORT Kalman states [x,y,s,r,vx,vy,vs],
+    extrapolated `frames_ahead` frames with the constant velocity model.
+    """
+    states = np.asarray(states, dtype=float).reshape(-1, 7)
+    x = states[:, 0] + states[:, 4] * frames_ahead
+    y = states[:, 1] + states[:, 5] * frames_ahead
+    s = np.maximum(states[:, 2] + states[:, 6] * frames_ahead, 1e-6)
+    w = np.sqrt(s * states[:, 3])
+    h = s / np.maximum(w, 1e-6)
+    return np.stack([x - w / 2., y - h / 2., x + w / 2., y + h / 2.], axis=1)
+
+
+class ProductTracker:
+    """
+    Counts products per SORT track instead of per detection.
+
+    The tracker is stepped once per captured frame: frames that skipped
+    inference only advance the Kalman prediction, so tracks survive frame_skip
+    and inference stalls. Every matched detection votes for its class on the
+    track, and a track is reported exactly once, when it has been matched
+    `min_hits` times, under its majority class.
+    """
+
+    def __init__(self, max_age=20, min_hits=3, iou_threshold=0.3):
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.iou_threshold = iou_threshold
+        self.reset()
+
+    def reset(self):
+        self.sort = VectorizedSort(max_age=self.max_age, min_hits=self.min_hits, iou_threshold=self.iou_threshold)
+        self.votes = {}       # track id -> Counter of class ids
+        self.counted = set()  # track ids already reported
+        self.last_frame = None
+
+    @property
+    def pending(self):
+        """True while some track has votes but is not confirmed yet."""
+        return any(track_id not in self.counted for track_id in self.votes)
+
+    def update(self, dets, cls_ids, frame_index, vote=True):
+        """
+        Params:
+          dets - (N,6) detections [x1,y1,x2,y2,score,cls] of frame `frame_index`
+          cls_ids - (N,) integer class ids of dets
+          vote - False for detections reused from an earlier frame (motion
+                 gating): they keep the tracks alive but neither vote nor
+                 confirm, so a static scene is not counted again
+        Returns (confirmed, tracks):
+          confirmed - [(track_id, class_id, score)] for tracks confirmed by this frame
+          tracks - tracks matched on this frame, for drawing:
+                   {"frame", "ids", "states", "class_ids", "scores"}
+        """
+        dets = np.asarray(dets, dtype=float).reshape(-1, 6)
+        steps = 1 if self.last_frame is None else max(1, frame_index - self.last_frame)
+        for _ in range(steps - 1):
+            self.sort.update(EMPTY_DETS)
+        self.sort.update(dets[:, :5])
+        self.last_frame = frame_index
+
+        all_ids, states, since_update = self.sort.get_tracks()
+        matched = since_update == 0
+        ids, states = all_ids[matched], states[matched]
+
+        track_cls = np.full(len(ids), -1, dtype=int)
+        track_scores = np.zeros(len(ids))
+        if len(ids) and len(dets):
+            iou = iou_batch(states_to_boxes(states), dets[:, :4])
+            best = iou.argmax(axis=1)
+            good = iou[np.arange(len(ids)), best] >= self.iou_threshold
+            track_cls[good] = np.asarray(cls_ids)[best[good]]
+            track_scores[good] = dets[best[good], 4]
+
+        confirmed = []
+        for track_id, cls_id, score in zip(ids.tolist(), track_cls.tolist(), track_scores.tolist()):
+            if cls_id < 0 or not vote:
+                continue
+            votes = self.votes.setdefault(track_id, Counter())
+            votes[cls_id] += 1
+            if track_id not in self.counted and sum(votes.values()) >= self.min_hits:
+                self.counted.add(track_id)
+                confirmed.append((track_id, votes.most_common(1)[0][0], score))
+
+        # Forget tracks SORT has dropped
+        alive = set(all_ids.tolist())
+        for track_id in list(self.votes):
+            if track_id not in alive:
+                del self.votes[track_id]
+                self.counted.discard(track_id)
+
+        # Tracks without votes yet (seen only on reused results) are not drawn
+        labelled = (track_cls >= 0) & np.array([i in self.votes for i in ids.tolist()], dtype=bool)
+        labels = np.array([self.votes[i].most_common(1)[0][0] for i in ids[labelled].tolist()], dtype=int)
+        tracks = {
+            "frame": frame_index,
+            "ids": ids[labelled],
+            "states": states[labelled],
+            "class_ids": labels,
+            "scores": track_scores[labelled],
+        }
+        return confirmed, tracks
@@ -19,18 +19,18 @@ document.addEventListener('DOMContentLoaded', () => {
     const stopCameraBtn = document.getElementById('stop-camera');
     const checkoutBtn = document.getElementById('checkout-btn');
     const checkoutLoading = document.getElementById('checkout-loading');
+    // Every cart route is scoped to this page's trolley
+    const cartBase = `/carts/${encodeURIComponent(document.body.dataset.cartId || 'default')}`;
 
     let currentItem = null;
     let cameraRunning = false;
-    let videoFeedErrors = 0;
-    let cartErrors = 0;
-    const maxErrors = 3;
     const beep = new Audio('/static/beep.mp3');
-    let cartPollInterval = null;
+    let cartEvents = null;
     let lastCartErrorTime = 0;
     let localCart = [];
     let lastAddedItemId = null;
     let lastRenderTime = 0;
+    let pendingRender = null;
     const renderDebounceMs = 100;
 
     // Theme toggle
@@ -95,12 +95,14 @@ document.addEventListener('DOMContentLoaded', () => {
                 startCameraBtn.disabled = false;
                 startCameraBtn.innerHTML = 'Start Camera';
                 if (data.success) {
-                    toastr.success('Camera started');
+                    if (data.status && data.status.state !== 'open') {
+                        // The source keeps connecting in the background, see /camera/status
+                        toastr.info('Camera starting, waiting for the video source...');
+                    } else {
+                        toastr.success('Camera started');
+                    }
                     setWebcamFeedWithRetry();
                     cameraRunning = true;
-                    videoFeedErrors = 0;
-                    cartErrors = 0;
-                    startCartPolling();
                     setTimeout(() => {
                         if (!webcamFeed.complete || webcamFeed.naturalWidth === 0) {
                             console.warn('Camera feed still loading after 4 seconds, but continuing...');
@@ -135,7 +137,6 @@ document.addEventListener('DOMContentLoaded', () => {
                     webcamPlaceholder.classList.remove('hidden');
                     scanEffect.classList.add('hidden');
                     cameraRunning = false;
-                    stopCartPolling();
                 } else {
                     toastr.error('Failed to stop camera');
                 }
@@ -150,7 +151,6 @@ document.addEventListener('DOMContentLoaded', () => {
                 webcamPlaceholder.classList.remove('hidden');
                 scanEffect.classList.add('hidden');
                 cameraRunning = false;
-                stopCartPolling();
             });
     });
 
@@ -164,27 +164,56 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
-    // Cart polling
-    function startCartPolling() {
-        if (!cartPollInterval) {
-            cartPollInterval = setInterval(() => updateCart(), 2000); // Reduced to 2 seconds
+    // Cart events: the server pushes cart changes and detection prompts as they happen.
+    // EventSource reconnects on its own and resumes from the last event id it saw.
+    function connectCartEvents() {
+        if (cartEvents) {
+            return;
         }
+        cartEvents = new EventSource(`${cartBase}/events`);
+        cartEvents.addEventListener('cart', (e) => {
+            const data = JSON.parse(e.data);
+            localCart = data.cart;
+            renderCart(localCart, lastAddedItemId);
+            lastAddedItemId = null;
+            if (cartItemCount) {
+                cartItemCount.textContent = data.item_count;
+            }
+        });
+        cartEvents.addEventListener('prompt', (e) => handlePrompt(JSON.parse(e.data)));
+        cartEvents.onerror = () => {
+            console.warn('Cart event stream interrupted, browser will reconnect');
+        };
     }
-    function stopCartPolling() {
-        if (cartPollInterval) {
-            clearInterval(cartPollInterval);
-            cartPollInterval = null;
+
+    function handlePrompt(promptData) {
+        if (promptData.action === 'add') {
+            toastr.success(`${promptData.item.name} added to cart!`);
+            beep.play().catch(() => console.log('Beep sound failed'));
+            const existingItem = localCart.find(item => item.name === promptData.item.name);
+            if (!existingItem) {
+                localCart.push(promptData.item);
+                lastAddedItemId = promptData.item.id;
+                renderCart(localCart, lastAddedItemId);
+            }
+        } else if (promptData.action === 'prompt') {
+            currentItem = promptData.item;
+            modalProductName.textContent = `${promptData.item.name} is already in your cart. What would you like to do?`;
+            duplicateModal.classList.remove('hidden');
+            beep.play().catch(() => console.log('Beep sound failed'));
         }
     }
 
     // Render cart UI with animation only for new item
     function renderCart(cartData, newItemId = null) {
-        const now = Date.now();
-        if (now - lastRenderTime < renderDebounceMs) {
-            console.log('Debouncing renderCart call');
+        // Coalesce bursts of renders, but always render the latest state
+        const wait = renderDebounceMs - (Date.now() - lastRenderTime);
+        clearTimeout(pendingRender);
+        if (wait > 0) {
+            pendingRender = setTimeout(() => renderCart(cartData, newItemId), wait);
             return;
         }
-        lastRenderTime = now;
+        lastRenderTime = Date.now();
         console.log('Rendering cart with items:', cartData.length, 'newItemId:', newItemId);
         cartItems.innerHTML = '';
         cartData.forEach(item => {
@@ -214,50 +243,11 @@ document.addEventListener('DOMContentLoaded', () => {
         console.log('Cart rendered, animated item:', newItemId);
     }
 
-    async function updateCart(skipVideoFeed = false, retries = 3) {
-        if (!cameraRunning && !skipVideoFeed) {
-            stopCartPolling();
-            return;
-        }
-        if (cartErrors >= maxErrors) {
-            return;
-        }
+    // One-off cart fetch, used when the event stream is not connected yet
+    async function updateCart(retries = 3) {
         for (let attempt = 0; attempt <= retries; attempt++) {
             try {
-                // Prioritize prompt fetch when camera is running
-                if (cameraRunning && !skipVideoFeed) {
-                    try {
-                        const promptStart = performance.now();
-                        const promptResponse = await fetchWithTimeout('/prompt', {}, 5000); // 5 second timeout for prompt
-                        const promptData = await promptResponse.json();
-                        console.log(`Prompt fetch took ${(performance.now() - promptStart).toFixed(2)}ms`);
-                        if (promptData.action === 'add') {
-                            toastr.success(`${promptData.item.name} added to cart!`);
-                            beep.play().catch(() => console.log('Beep sound failed'));
-                            const existingItem = localCart.find(item => item.name === promptData.item.name);
-                            if (!existingItem) {
-                                localCart.push(promptData.item);
-                                lastAddedItemId = promptData.item.id;
-                                renderCart(localCart, lastAddedItemId);
-                            }
-                        } else if (promptData.action === 'prompt') {
-                            currentItem = promptData.item;
-                            modalProductName.textContent = `${promptData.item.name} is already in your cart. What would you like to do?`;
-                            duplicateModal.classList.remove('hidden');
-                            beep.play().catch(() => console.log('Beep sound failed'));
-                        }
-                        videoFeedErrors = 0;
-                    } catch (error) {
-                        console.error('Prompt fetch error:', error.message);
-                        videoFeedErrors++;
-                        if (videoFeedErrors >= maxErrors) {
-                            toastr.error('Prompt feed unavailable. Pausing cart updates.');
-                            stopCartPolling();
-                        }
-                    }
-                }
-
-                const cartResponse = await fetchWithTimeout('/cart', {}, 10000); // 10 second timeout for cart
+                const cartResponse = await fetchWithTimeout(cartBase, {}, 10000); // 10 second timeout for cart
                 const data = await cartResponse.json();
                 console.log('Cart data:', data);
                 localCart = data.cart;
@@ -265,32 +255,33 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (cartItemCount) {
                     cartItemCount.textContent = data.item_count;
                 }
-                cartErrors = 0;
                 return;
             } catch (error) {
                 console.error('Cart update error (attempt ' + (attempt + 1) + '):', error.message);
                 if (attempt === retries) {
-                    cartErrors++;
                     const now = Date.now();
                     if (now - lastCartErrorTime > 20000) {
                         toastr.error('Failed to update cart');
                         lastCartErrorTime = now;
                     }
-                    if (cartErrors >= maxErrors) {
-                        toastr.error('Too many cart update failures. Pausing updates.');
-                        stopCartPolling();
-                        renderCart(localCart);
-                    }
+                    renderCart(localCart);
                 }
             }
         }
     }
 
+    // After a cart action the server pushes the new cart; only fetch it without a stream
+    function syncCart() {
+        if (!cartEvents) {
+            updateCart();
+        }
+    }
+
     // Quantity controls
     cartItems.addEventListener('click', (e) => {
         const id = parseInt(e.target.dataset.id);
         if (e.target.classList.contains('increment')) {
-            fetchWithTimeout(`/cart/update/${id}`, {
+            fetchWithTimeout(`${cartBase}/update/${id}`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ action: 'increment' })
@@ -302,7 +293,7 @@ document.addEventListener('DOMContentLoaded', () => {
                             item.id === id ? { ...item, quantity: item.quantity + 1 } : item
                         );
                         renderCart(localCart);
-                        updateCart();
+                        syncCart();
                     } else {
                         toastr.error('Failed to increase quantity');
                     }
@@ -312,7 +303,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     renderCart(localCart);
                 });
         } else if (e.target.classList.contains('decrement')) {
-            fetchWithTimeout(`/cart/update/${id}`, {
+            fetchWithTimeout(`${cartBase}/update/${id}`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ action: 'decrement' })
@@ -324,7 +315,7 @@ document.addEventListener('DOMContentLoaded', () => {
                             item.id === id && item.quantity > 1 ? { ...item, quantity: item.quantity - 1 } : item
                         );
                         renderCart(localCart);
-                        updateCart();
+                        syncCart();
                     } else {
                         toastr.error('Failed to decrease quantity');
                     }
@@ -334,7 +325,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     renderCart(localCart);
                 });
         } else if (e.target.classList.contains('remove-item')) {
-            fetchWithTimeout(`/cart/remove/${id}`, { method: 'POST' })
+            fetchWithTimeout(`${cartBase}/remove/${id}`, { method: 'POST' })
                 .then(response => response.json())
                 .then(data => {
                     if (data.success) {
@@ -348,14 +339,14 @@ document.addEventListener('DOMContentLoaded', () => {
                     toastr.success('Item removed');
                     localCart = localCart.filter(item => item.id !== id);
                     renderCart(localCart);
-                    updateCart();
+                    syncCart();
                 });
         }
     });
 
     // Modal actions
     modalIncrement.addEventListener('click', () => {
-        fetchWithTimeout(`/cart/update/${currentItem.id}`, {
+        fetchWithTimeout(`${cartBase}/update/${currentItem.id}`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ action: 'increment' })
@@ -366,7 +357,7 @@ document.addEventListener('DOMContentLoaded', () => {
             );
             renderCart(localCart);
             duplicateModal.classList.add('hidden');
-            updateCart();
+            syncCart();
         }).catch(error => {
             console.error('Modal increment error:', error.message);
             toastr.error('Error increasing quantity');
@@ -374,7 +365,7 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
     modalRemove.addEventListener('click', () => {
-        fetchWithTimeout(`/cart/remove/${currentItem.id}`, { method: 'POST' })
+        fetchWithTimeout(`${cartBase}/remove/${currentItem.id}`, { method: 'POST' })
             .then(() => {
                 console.log('Server confirmed modal item removal');
             }).catch(error => {
@@ -384,7 +375,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 localCart = localCart.filter(item => item.id !== currentItem.id);
                 renderCart(localCart);
                 duplicateModal.classList.add('hidden');
-                updateCart();
+                syncCart();
             });
     });
     modalCancel.addEventListener('click', () => {
@@ -393,14 +384,14 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Clear cart
     clearCartBtn.addEventListener('click', () => {
-        fetchWithTimeout('/cart/clear', { method: 'POST' })
+        fetchWithTimeout(`${cartBase}/clear`, { method: 'POST' })
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
                     toastr.success('Cart cleared');
                     localCart = [];
                     renderCart(localCart);
-                    updateCart(true);
+                    syncCart();
                 } else {
                     toastr.error('Failed to clear cart');
                 }
@@ -416,7 +407,7 @@ document.addEventListener('DOMContentLoaded', () => {
     checkoutBtn.addEventListener('click', (e) => {
         checkoutLoading.classList.remove('hidden');
         checkoutBtn.querySelector('span:first-child').classList.add('opacity-0');
-        window.location.href = '/checkout';
+        window.location.href = `${cartBase}/checkout`;
         setTimeout(() => {
             checkoutLoading.classList.add('hidden');
             checkoutBtn.querySelector('span:first-child').classList.remove('opacity-0');
@@ -456,7 +447,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     div.addEventListener('click', () => {
                         div.classList.add('animate-pulse');
                         setTimeout(() => div.classList.remove('animate-pulse'), 300);
-                        fetchWithTimeout('/cart/add', {
+                        fetchWithTimeout(`${cartBase}/add`, {
                             method: 'POST',
                             headers: { 'Content-Type': 'application/json' },
                             body: JSON.stringify({ name: result.name })
@@ -518,7 +509,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const item = e.target.closest('.touch-swipe');
             if (item) {
                 const id = parseInt(item.dataset.id);
-                fetchWithTimeout(`/cart/remove/${id}`, { method: 'POST' })
+                fetchWithTimeout(`${cartBase}/remove/${id}`, { method: 'POST' })
                     .then(() => {
                         console.log('Server confirmed swipe item removal');
                     }).catch(error => {
@@ -527,12 +518,16 @@ document.addEventListener('DOMContentLoaded', () => {
                         toastr.success('Item removed');
                         localCart = localCart.filter(item => item.id !== id);
                         renderCart(localCart);
-                        updateCart();
+                        syncCart();
                     });
             }
         }
     });
 
-    // Initial cart update on page load
-    updateCart(true);
+    // Live cart updates for as long as the page is open
+    if (window.EventSource) {
+        connectCartEvents();
+    } else {
+        updateCart();
+    }
 });
\ No newline at end of file
@@ -1,47 +1,215 @@
+"""
+Convert the Roboflow COCO export of the dataset to YOLO label files.
+
+    python yolo/coco_to_yolo.py                  # every split of data.yaml
+    python yolo/coco_to_yolo.py --split val --force
+    python yolo/coco_to_yolo.py --coco annotations.coco.json --images images/ --labels labels/
+
+Each split directory of data.yaml (e.g. "SmartCart - Custom Dataset/train")
+holds the split's COCO file (_annotations.coco.json or annotations.coco.json)
+and gets a labels/ directory next to images/. The older single-file layout
+(annotations.coco.json, images/ and labels/ at the dataset root) is converted
+when no split has a COCO file.
+
+Images and categories are indexed by id once, so conversion is linear in the
+number of annotations. With ijson installed, the annotation file is streamed
+instead of loaded whole. Every label file is written in one go (overwriting,
+never appending) by a pool of threads, and only when its contents changed:
+a manifest in the labels directory keeps a digest per label file, and a
+split whose COCO file is unchanged since the last run is skipped entirely.
+Label files of images that left the dataset are removed.
+"""
+import argparse
+import hashlib
 import json
 import os
-from tqdm import tqdm # type: ignore
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+try:
+    import ijson  # streaming JSON parser, optional
+except ImportError:
+    ijson = None
 
-# 🔹 Paths (Update these if needed)
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-COCO_JSON_PATH = os.path.join(project_root, 'SmartCart - Custom Dataset', 'annotations.coco.json')
-IMAGES_DIR = os.path.join(project_root, 'SmartCart - Custom Dataset', 'images')
-YOLO_LABELS_DIR = os.path.join(project_root, 'SmartCart - Custom Dataset', 'labels')
-
-# ✅ Create YOLO labels folder if it doesn’t exist
-os.makedirs(YOLO_LABELS_DIR, exist_ok=True)
-
-# 🔹 Load COCO JSON
-with open(COCO_JSON_PATH, "r", encoding="utf-8") as f:
-    coco_data = json.load(f)
-
-# 🔹 Map category IDs to YOLO class indices
-category_map = {cat["id"]: i for i, cat in enumerate(coco_data["categories"])}
-
-# 🔹 Convert COCO Annotations to YOLO Format
-for annotation in tqdm(coco_data["annotations"], desc="Converting COCO to YOLO"):
-    image_id = annotation["image_id"]
-    category_id = annotation["category_id"]
-    bbox = annotation["bbox"]  # COCO format: [x, y, width, height]
-
-    # Find corresponding image filename
-    image_info = next(img for img in coco_data["images"] if img["id"] == image_id)
-    image_filename = image_info["file_name"]
-    image_width, image_height = image_info["width"], image_info["height"]
-
-    # Convert COCO bbox format → YOLO format
-    x, y, w, h = bbox
-    x_center = (x + w / 2) / image_width
-    y_center = (y + h / 2) / image_height
-    w /= image_width
-    h /= image_height
-
-    # YOLO Label Format: <class_id> <x_center> <y_center> <width> <height>
-    yolo_label = f"{category_map[category_id]} {x_center} {y_center} {w} {h}\n"
-
-    # Save label file (one .txt per image)
-    label_filename = os.path.join(YOLO_LABELS_DIR, image_filename.replace(".jpg", ".txt"))
-    with open(label_filename, "a") as label_file:
-        label_file.write(yolo_label)
-
-print("✅ COCO to YOLO conversion completed! YOLO labels saved in:", YOLO_LABELS_DIR)
+yolo_dir = os.path.join(project_root, 'yolo')
+DATA_YAML = os.path.join(yolo_dir, 'data.yaml')
+DATASET_DIR = os.path.join(project_root, 'SmartCart - Custom Dataset')
+COCO_NAMES = ('_annotations.coco.json', 'annotations.coco.json')
+SPLITS = ('train', 'val', 'test')
+MANIFEST = '.coco_to_yolo.json'
+WORKERS = min(32, (os.cpu_count() or 1) * 4)  # label writes are small file I/O, threads overlap it
+
+
+def read_array(path, key):
+    """A top-level array of a JSON file, parsed only up to its end."""
+    with open(path, 'rb') as f:
+        return next(ijson.items(f, key, use_float=True), [])
+
+
+def stream_items(path, prefix):
+    with open(path, 'rb') as f:
+        yield from ijson.items(f, prefix, use_float=True)
+
+
+def read_coco(path):
+    """
+    (images {id: (file_name, width, height)}, category ids in file order, annotations iterable)
+    of a COCO file; streamed when ijson is available.
+    """
+    if ijson is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        images, categories, annotations = data['images'], data['categories'], data['annotations']
+    else:
+        # Only the annotations are streamed over the whole file. Exports list images and
+        # categories before them, so those two reads stop near the start of the file.
+        images, categories = read_array(path, 'images'), read_array(path, 'categories')
+        annotations = stream_items(path, 'annotations.item')
+    images = {img['id']: (img['file_name'], img['width'], img['height']) for img in images}
+    category_ids = [cat['id'] for cat in categories]
+    return images, category_ids, annotations
+
+
+def yolo_labels(images, category_ids, annotations):
+    """Label file text per image file name, plus the number of annotations skipped."""
+    # YOLO class index = position of the category in the COCO file, as data.yaml lists them
+    category_map = {cat_id: i for i, cat_id in enumerate(category_ids)}
+    lines = defaultdict(list)
+    skipped = 0
+    for annotation in annotations:
+        image = images.get(annotation['image_id'])
+        cls = category_map.get(annotation['category_id'])
+        x, y, w, h = annotation['bbox']  # COCO: top-left corner, width, height in pixels
+        if image is None or cls is None or w <= 0 or h <= 0:
+            skipped += 1
+            continue
+        _, width, height = image
+        # YOLO: <class> <x_center> <y_center> <width> <height>, normalized to the image size
+        lines[annotation['image_id']].append(
+            f"{cls} {(x + w / 2) / width:.6f} {(y + h / 2) / height:.6f} {w / width:.6f} {h / height:.6f}\n")
+    # Every image gets a label file; an empty one marks a background image
+    labels = {file_name: "".join(lines.get(image_id, ())) for image_id, (file_name, _, _) in images.items()}
+    return labels, skipped
+
+
+def label_path(labels_dir, file_name):
+    return os.path.join(labels_dir, os.path.splitext(file_name)[0] + '.txt')
+
+
+def digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def write_label(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def convert(coco_path, labels_dir, workers=WORKERS, force=False):
+    """Write the YOLO labels of one COCO file into labels_dir; returns a summary dict."""
+    start = time.perf_counter()
+    manifest_path = os.path.join(labels_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    stamp = source_stamp(coco_path)
+    if not force and manifest.get('source') == stamp:
+        return {'coco': coco_path, 'up_to_date': True, 'seconds': round(time.perf_counter() - start, 3)}
+
+    images, category_ids, annotations = read_coco(coco_path)
+    labels, skipped = yolo_labels(images, category_ids, annotations)
+    old = manifest.get('labels', {})
+    new = {file_name: digest(text) for file_name, text in labels.items()}
+    changed = [(label_path(labels_dir, name), labels[name]) for name, d in new.items()
+               if force or old.get(name) != d or not os.path.exists(label_path(labels_dir, name))]
+    removed = [label_path(labels_dir, name) for name in old.keys() - new.keys()]
+
+    for directory in {os.path.dirname(path) for path, _ in changed} | {labels_dir}:
+        os.makedirs(directory, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda item: write_label(*item), changed, chunksize=64))
+    for path in removed:
+        if os.path.exists(path):
+            os.remove(path)
+    # Written last: an interrupted run leaves the old manifest, so the next one redoes the work
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump({'source': stamp, 'labels': new}, f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return {'coco': coco_path, 'up_to_date': False, 'images': len(images), 'classes': len(category_ids),
+            'written': len(changed), 'removed': len(removed), 'skipped_annotations': skipped,
+            'seconds': round(time.perf_counter() - start, 3)}
+
+
+def find_coco(directory):
+    for name in COCO_NAMES:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def split_jobs(data_yaml, splits):
+    """(split, COCO file, labels dir) for each split of data.yaml that has a COCO file."""
+    with open(data_yaml, 'r') as f:
+        data = yaml.safe_load(f)
+    base = os.path.dirname(os.path.abspath(data_yaml))
+    jobs = []
+    for split in splits:
+        if not data.get(split):
+            continue
+        images_dir = os.path.normpath(os.path.join(base, data[split]))
+        split_dir = os.path.dirname(images_dir)
+        coco_path = find_coco(split_dir) or find_coco(images_dir)
+        if coco_path is None:
+            print(f"⚠️ No COCO annotations for split {split} in {split_dir}")
+            continue
+        jobs.append((split, coco_path, os.path.join(split_dir, 'labels')))
+    return jobs, len(data.get('names', []))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=DATA_YAML, help="data.yaml with the train/val/test image directories")
+    parser.add_argument("--split", choices=SPLITS, action="append", help="Only these splits (default: all)")
+    parser.add_argument("--coco", help="Convert this one COCO file instead of the data.yaml splits")
+    parser.add_argument("--labels", help="Labels directory for --coco (default: labels/ next to it)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Threads writing label files")
+    parser.add_argument("--force", action="store_true", help="Rewrite every label file")
+    args = parser.parse_args()
+
+    if args.coco:
+        jobs, nc = [("custom", args.coco, args.labels or os.path.join(os.path.dirname(args.coco), 'labels'))], None
+    else:
+        jobs, nc = split_jobs(args.data, args.split or SPLITS)
+        legacy = os.path.join(DATASET_DIR, 'annotations.coco.json')
+        if not jobs and os.path.exists(legacy):
+            jobs = [("all", legacy, os.path.join(DATASET_DIR, 'labels'))]
+    if not jobs:
+        print("❌ No COCO Annotations Found!")
+        return
+
+    for split, coco_path, labels_dir in jobs:
+        result = convert(coco_path, labels_dir, workers=args.workers, force=args.force)
+        if result['up_to_date']:
+            print(f"{split}: up to date ({coco_path} unchanged)")
+            continue
+        print(f"{split}: {result['images']} images, {result['written']} label file(s) written, "
+              f"{result['removed']} removed, {result['skipped_annotations']} annotation(s) skipped "
+              f"in {result['seconds']:.2f}s -> {labels_dir}")
+        if nc is not None and result['classes'] != nc:
+            print(f"⚠️ {coco_path} has {result['classes']} categories but data.yaml has nc: {nc}")
+    print("✅ COCO to YOLO conversion completed!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,271 @@
-from ultralytics import YOLO
-import cv2
-import glob
+"""
+Headless batch inference over image directories, image files and videos.
+
+    python yolo/dataset_inference.py "SmartCart - Custom Dataset/test/images" -o test.jsonl
+    python yolo/dataset_inference.py new_photos/ -o prelabels.jsonl --coco prelabels.coco.json --conf 0.25
+    python yolo/dataset_inference.py aisle.mp4 --video-stride 10 --backend onnx
+
+Images are decoded ahead of the model on a pool of threads and run through
+the detector in batches (the app's inference backends, see backend/inference.py;
+--processes spreads batches over worker processes, see inference_pool.py).
+Predictions are appended to a JSONL file, one line per image or video frame,
+flushed after every batch. Re-running the same command resumes: inputs already
+in the output are skipped. --coco also writes the predictions as a COCO file
+(e.g. to import as pre-labels into Roboflow) once the run completes.
+"""
+import argparse
+import json
 import os
-import random
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import cv2
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-model_path = os.path.join(project_root, 'yolo', 'best.pt')
+sys.path.insert(0, os.path.join(project_root, 'backend'))
+
+from inference import BACKENDS, load_detector  # noqa: E402
+from pipeline import latency_summary  # noqa: E402
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+
+def list_inputs(paths, recursive=True):
+    """
+    (key, kind, path) per input, in a stable order: kind is "image" or "video".
+    Keys are relative to their input directory, prefixed with the directory's
+    name when several inputs are given (a/img1.jpg, b/img1.jpg). Raises
+    ValueError if two inputs still get the same key.
+    """
+    inputs = []
+    for path in paths:
+        label = os.path.basename(os.path.normpath(path)) if len(paths) > 1 else ""
+        if os.path.isdir(path):
+            walker = os.walk(path) if recursive else [(path, [], sorted(os.listdir(path)))]
+            for root, dirs, files in walker:
+                dirs.sort()
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    kind = input_kind(name)
+                    if kind:
+                        inputs.append((os.path.join(label, os.path.relpath(full, path)), kind, full))
+        elif input_kind(path):
+            inputs.append((os.path.basename(path), input_kind(path), path))
+        else:
+            print(f"⚠️ Skipping {path}: not a directory, image or video")
+    seen = {}
+    for key, _, path in inputs:
+        if key in seen:
+            raise ValueError(f"{seen[key]} and {path} would both be recorded as {key!r}; "
+                             f"run them separately or rename one")
+        seen[key] = path
+    return inputs
+
+
+def input_kind(name):
+    ext = os.path.splitext(name)[1].lower()
+    return "image" if ext in IMAGE_EXTENSIONS else "video" if ext in VIDEO_EXTENSIONS else None
+
+
+def completed_keys(output):
+    """Keys already in the JSONL output; a torn last line (interrupted write) is cut off."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, 'rb+') as f:
+        good = 0
+        for line in f:
+            try:
+                done.add(json.loads(line)["image"])
+            except (ValueError, KeyError):
+                break
+            good += len(line)
+        f.truncate(good)
+    return done
+
+
+def decoded(inputs, done, threads, prefetch, video_stride):
+    """
+    (key, frame or None) in input order. Images are decoded on `threads`
+    background threads, at most `prefetch` ahead of the consumer; video
+    frames are read on the producer thread (a video decodes sequentially).
+    """
+    pending = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(key, future):
+        while not stop.is_set():
+            try:
+                pending.put((key, future), timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(pool):
+        try:
+            for key, kind, path in inputs:
+                if kind == "image":
+                    if key not in done and not put(key, pool.submit(cv2.imread, path)):
+                        return
+                    continue
+                capture = cv2.VideoCapture(path)
+                index = 0
+                # grab() skips frames without decoding them
+                while capture.grab():
+                    frame_key = f"{key}#{index}"
+                    if index % video_stride == 0 and frame_key not in done:
+                        future = Future()
+                        ok, frame = capture.retrieve()
+                        future.set_result(frame if ok else None)
+                        if not put(frame_key, future):
+                            capture.release()
+                            return
+                    index += 1
+                capture.release()
+        finally:
+            put(None, None)
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="decode") as pool:
+        producer = threading.Thread(target=produce, args=(pool,), name="decode-producer", daemon=True)
+        producer.start()
+        try:
+            while True:
+                key, future = pending.get()
+                if key is None:
+                    return
+                yield key, future.result()
+        finally:
+            # Stop the producer before the pool shuts down under it
+            stop.set()
+            producer.join()
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 
-# Load the trained YOLO model
-model = YOLO(model_path)
+def prediction(key, frame, dets, names):
+    h, w = frame.shape[:2]
+    return {
+        "image": key,
+        "width": w,
+        "height": h,
+        "detections": [{
+            "bbox": [round(v, 2) for v in box],
+            "conf": round(conf, 4),
+            "class": int(cls),
+            "name": names.get(int(cls), str(int(cls))),
+        } for box, conf, cls in zip(dets[:, :4].tolist(), dets[:, 4].tolist(), dets[:, 5].tolist())],
+    }
 
-# Get all test images
-image_paths = glob.glob(os.path.join("test", "images", "*.jpg"))  # Modify if images have different extensions
 
-if not image_paths:
-    print("❌ No Test Images Found!")
-    exit()
+def write_coco(jsonl_path, coco_path, names):
+    """COCO file of every prediction in the JSONL output (bbox as [x, y, w, h], score kept)."""
+    images, annotations = [], []
+    with open(jsonl_path, 'r') as f:
+        for image_id, line in enumerate(f, 1):
+            record = json.loads(line)
+            images.append({"id": image_id, "file_name": record["image"],
+                           "width": record["width"], "height": record["height"]})
+            for det in record["detections"]:
+                x1, y1, x2, y2 = det["bbox"]
+                annotations.append({"id": len(annotations) + 1, "image_id": image_id, "category_id": det["class"],
+                                    "bbox": [x1, y1, round(x2 - x1, 2), round(y2 - y1, 2)],
+                                    "area": round((x2 - x1) * (y2 - y1), 2), "iscrowd": 0, "score": det["conf"]})
+    categories = [{"id": i, "name": name} for i, name in sorted(names.items())]
+    with open(coco_path + ".tmp", 'w') as f:
+        json.dump({"images": images, "annotations": annotations, "categories": categories}, f)
+    os.replace(coco_path + ".tmp", coco_path)
+    return len(images), len(annotations)
 
-# Define a fixed output directory
-output_dir = os.path.join("runs", "detect", "predict")
-os.makedirs(output_dir, exist_ok=True)
 
-for image_path in image_paths:
-    # Run inference on the selected image
-    result = model.predict(source=image_path, save=True, conf=0.5, line_width=2, save_txt=True, project="runs/detect", name="predict", exist_ok=True)
-    
-    output_image_path = os.path.join(output_dir, os.path.basename(image_path))
-    
-    if not os.path.exists(output_image_path):
-        print(f"⚠️ Could Not Find Processed Image: {output_image_path}")
-        continue
-    
-    image = cv2.imread(output_image_path)
-    if image is None:
-        print(f"⚠️ Could Not Load Image: {output_image_path}")
-        continue
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Image directories, image files or videos")
+    parser.add_argument("-o", "--output", default="predictions.jsonl", help="JSONL output (appended to, resumable)")
+    parser.add_argument("--coco", default=None, help="Also write a COCO file of all predictions at the end")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="torch")
+    parser.add_argument("--model", default=None, help="Model path; default best.pt or its export for the backend")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--conf", type=float, default=0.5)
+    parser.add_argument("--batch", type=int, default=8, help="Images per inference call")
+    parser.add_argument("--processes", type=int, default=0, help="Inference worker processes (0: in this process)")
+    parser.add_argument("--threads", type=int, default=min(8, os.cpu_count() or 1), help="Image decoding threads")
+    parser.add_argument("--prefetch", type=int, default=64, help="Images decoded ahead of inference")
+    parser.add_argument("--video-stride", type=int, default=1, help="Use every Nth video frame")
+    parser.add_argument("--no-recursive", action="store_true", help="Don't descend into subdirectories")
+    args = parser.parse_args()
 
-    cv2.imshow("YOLO Inference Results", image)
-    key = cv2.waitKey(0) & 0xFF  # Wait for key press
-    
-    if key == ord('e'):  # Press 'E' to exit
-        break
+    try:
+        inputs = list_inputs(args.inputs, recursive=not args.no_recursive)
+    except ValueError as e:
+        parser.error(str(e))
 
-cv2.destroyAllWindows()
-print("✅ Inference Complete. Check The Output In 'runs/detect/predict'")
+    path = args.model or os.path.join(project_root, 'yolo', BACKENDS[args.backend])
+    if args.processes:
+        from inference_pool import InferencePool
+        detector = InferencePool(args.backend, path, args.device, args.imgsz, args.conf, workers=args.processes)
+    else:
+        detector = load_detector(args.backend, path, args.device, args.imgsz, args.conf)
+    names = detector.names if isinstance(detector.names, dict) else dict(enumerate(detector.names))
 
+    done = completed_keys(args.output)
+    images = sum(kind == "image" for _, kind, _ in inputs)
+    print(f"{images} image(s) and {len(inputs) - images} video(s), {len(done)} already in {args.output}")
 
+    count = detections = failures = 0
+    interrupted = False
+    batch_times = []
+    start = time.perf_counter()
+    try:
+        with open(args.output, 'a') as out:
+            for batch in batches(decoded(inputs, done, args.threads, args.prefetch, max(1, args.video_stride)),
+                                 args.batch):
+                unreadable = [key for key, frame in batch if frame is None]
+                for key in unreadable:
+                    print(f"⚠️ Could Not Load Image: {key}")
+                failures += len(unreadable)
+                batch = [(key, frame) for key, frame in batch if frame is not None]
+                if not batch:
+                    continue
+                t0 = time.perf_counter()
+                results = detector.predict([frame for _, frame in batch])
+                batch_times.append((time.perf_counter() - t0) / len(batch))
+                for (key, frame), dets in zip(batch, results):
+                    out.write(json.dumps(prediction(key, frame, dets, names)) + "\n")
+                    detections += len(dets)
+                out.flush()
+                count += len(batch)
+                elapsed = time.perf_counter() - start
+                print(f"\r{count} image(s), {count / elapsed:.1f} images/s", end="", flush=True)
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\nInterrupted; run the same command again to resume")
+    finally:
+        if hasattr(detector, "close"):
+            detector.close()
+    elapsed = time.perf_counter() - start
+    per_image = latency_summary(batch_times)
+    print(f"\n✅ {count} image(s) in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.1f} images/s), "
+          f"{detections} detection(s), {failures} unreadable, inference "
+          f"p50 {per_image.get('p50_ms', 0):.1f} ms/image -> {args.output}")
+    if args.coco and not interrupted:
+        n_images, n_annotations = write_coco(args.output, args.coco, names)
+        print(f"COCO file with {n_images} image(s) and {n_annotations} annotation(s) -> {args.coco}")
 
 
+if __name__ == "__main__":
+    main()
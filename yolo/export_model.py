@@ -0,0 +1,68 @@
+"""
+Export yolo/best.pt to an optimized CPU graph for the app's inference backends.
+
+    python yolo/export_model.py --format onnx
+    python yolo/export_model.py --format openvino --benchmark
+
+Then start the app with "inference_backend" set in backend/config.json, or
+SMART_TROLLEY_BACKEND=onnx|openvino.
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(project_root, 'backend'))
+
+from inference import load_detector  # noqa: E402
+
+model_path = os.path.join(project_root, 'yolo', 'best.pt')
+image_path = os.path.join(project_root, 'yolo', 'Maggi.jpg')
+
+
+def time_backend(backend, path, frame, imgsz, conf, runs):
+    detector = load_detector(backend, path, "cpu", imgsz, conf)
+    dets = detector.predict([frame])[0]  # warm-up
+    start = time.perf_counter()
+    for _ in range(runs):
+        detector.predict([frame])
+    return (time.perf_counter() - start) / runs, dets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--imgsz", type=int, default=512, help="Input size, must match the app's imgsz")
+    parser.add_argument("--half", action="store_true", help="FP16 weights (OpenVINO)")
+    parser.add_argument("--int8", action="store_true", help="INT8 post-training quantization (OpenVINO, needs data.yaml)")
+    parser.add_argument("--benchmark", action="store_true", help="Compare the export with best.pt on Maggi.jpg")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--conf", type=float, default=0.5)
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    model = YOLO(model_path)
+    export_args = {"format": args.format, "imgsz": args.imgsz}
+    if args.format == "onnx":
+        export_args.update(simplify=True, opset=12)
+    else:
+        export_args.update(half=args.half, int8=args.int8)
+        if args.int8:
+            export_args["data"] = os.path.join(project_root, 'yolo', 'data.yaml')
+    exported = model.export(**export_args)
+    print(f"Exported {args.format} model to: {exported}")
+
+    if args.benchmark:
+        frame = cv2.imread(image_path)
+        torch_time, torch_dets = time_backend("torch", model_path, frame, args.imgsz, args.conf, args.runs)
+        export_time, export_dets = time_backend(args.format, str(exported), frame, args.imgsz, args.conf, args.runs)
+        print(f"torch:        {torch_time * 1000:.1f} ms/frame, {len(torch_dets)} detection(s)")
+        print(f"{args.format + ':':<13} {export_time * 1000:.1f} ms/frame, {len(export_dets)} detection(s)")
+        print(f"Speed-up: {torch_time / export_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()